@@ -6,6 +6,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from forms import LoginForm
 from routes import init_routes
+from commands import init_commands
 from config import DevelopmentConfig, ProductionConfig
 from dotenv import load_dotenv
 import os
@@ -37,6 +38,9 @@ def load_user(user_id):
 # Initialize routes
 init_routes(app)
 
+# Register CLI commands
+init_commands(app)
+
 # Load environment variables from .env file
 load_dotenv()
 
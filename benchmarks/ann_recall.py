@@ -0,0 +1,88 @@
+# benchmarks/ann_recall.py
+"""Recall@k and latency of the IVF knowledge index against exact search.
+
+Usage:
+    python benchmarks/ann_recall.py --n 200000 --dim 1536 --nlist 256,1024 --nprobe 1,4,8,16,32
+    python benchmarks/ann_recall.py --from-db   # use the embeddings stored in the app database
+
+Pick the smallest nprobe whose recall is acceptable and set KNOWLEDGE_INDEX_NLIST /
+KNOWLEDGE_INDEX_NPROBE accordingly.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ann_index import IVFIndex  # noqa: E402
+from utils.vector_index import VectorIndex  # noqa: E402
+
+def synthetic_embeddings(n, dim, clusters, rng):
+    """Unit vectors drawn around random topic centres, roughly how text embeddings cluster."""
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + 1.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def database_embeddings():
+    from app import app
+    from utils.embeddings import embedding_model, load_knowledge_matrix
+    with app.app_context():
+        _, matrix = load_knowledge_matrix(embedding_model())
+    if not len(matrix):
+        sys.exit('No embeddings stored for the configured EMBEDDING_MODEL.')
+    return matrix
+
+def make_queries(vectors, count, rng):
+    """Perturbed copies of stored vectors, standing in for student questions."""
+    picks = vectors[rng.choice(len(vectors), count, replace=len(vectors) < count)]
+    queries = picks + 0.3 * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def timed_search(index, queries, k, **kwargs):
+    started = time.perf_counter()
+    results = [[item_id for item_id, _ in index.search(query, k, **kwargs)] for query in queries]
+    return results, (time.perf_counter() - started) * 1000 / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n', type=int, default=100000, help='synthetic vectors to index')
+    parser.add_argument('--dim', type=int, default=384, help='synthetic vector dimension')
+    parser.add_argument('--clusters', type=int, default=500, help='synthetic topic count')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nlist', default='256', help='comma-separated list counts to try')
+    parser.add_argument('--nprobe', default='1,2,4,8,16,32', help='comma-separated probe counts to try')
+    parser.add_argument('--from-db', action='store_true', help='benchmark the stored knowledge embeddings')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = database_embeddings() if args.from_db else synthetic_embeddings(args.n, args.dim, args.clusters, rng)
+    ids = np.arange(len(vectors))
+    queries = make_queries(vectors, args.queries, rng)
+    print(f'{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}')
+
+    exact = VectorIndex()
+    exact.build(ids, vectors)
+    truth, exact_ms = timed_search(exact, queries, args.k)
+    print(f'exact: {exact_ms:.2f} ms/query')
+
+    print(f"{'nlist':>6} {'nprobe':>6} {'recall@k':>9} {'ms/query':>9} {'speedup':>8}")
+    for nlist in (int(value) for value in args.nlist.split(',')):
+        index = IVFIndex(nlist=nlist, seed=args.seed)
+        started = time.perf_counter()
+        index.build(ids, vectors)
+        print(f'{nlist:>6}  (trained in {time.perf_counter() - started:.1f}s)')
+        for nprobe in (int(value) for value in args.nprobe.split(',')):
+            if nprobe > nlist:
+                continue
+            found, ivf_ms = timed_search(index, queries, args.k, nprobe=nprobe)
+            recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)])
+            print(f'{nlist:>6} {nprobe:>6} {recall:>9.3f} {ivf_ms:>9.2f} {exact_ms / ivf_ms:>7.1f}x')
+
+if __name__ == '__main__':
+    main()
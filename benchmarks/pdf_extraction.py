@@ -0,0 +1,105 @@
+# benchmarks/pdf_extraction.py
+"""Throughput of PDF text extraction, single process against the process pool.
+
+Usage:
+    python benchmarks/pdf_extraction.py --pages 100,250,500 --workers 1,2,4,8
+    python benchmarks/pdf_extraction.py --file uploads/textbook.pdf --workers 1,4
+
+Without --file a synthetic textbook (dense text pages) is generated for each page
+count. Pick PDF_EXTRACT_WORKERS and PDF_PARALLEL_MIN_PAGES from where the pool
+starts to pay for its start-up cost.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.document_processor import DocumentProcessor  # noqa: E402
+
+WORDS = ('loop variable function return value list index string integer class object method '
+         'argument parameter recursion iterate dictionary key tuple module import exception').split()
+
+def synthetic_textbook(path, pages, lines_per_page=45, seed=0):
+    """Write a PDF of `pages` pages of random prose in Helvetica."""
+    rng = random.Random(seed)
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for _ in range(pages):
+        lines = ['BT /F1 10 Tf 12 TL 50 760 Td']
+        for _ in range(lines_per_page):
+            lines.append(f"({' '.join(rng.choice(WORDS) for _ in range(12))}) '")
+        lines.append('ET')
+        stream = '\n'.join(lines).encode()
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects)))
+        kids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), pages)
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b'%010d 00000 n \n' % offset)
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+def quadratic_baseline(path):
+    """The previous implementation: one page at a time, growing the text with +=."""
+    from PyPDF2 import PdfReader
+    text = ""
+    for page in PdfReader(path).pages:
+        text += page.extract_text() + "\n"
+    return text
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def benchmark(path, workers_list):
+    from PyPDF2 import PdfReader
+    pages = len(PdfReader(path).pages)
+    baseline, elapsed = timed(quadratic_baseline, path)
+    print(f"  {'baseline':>10}  {elapsed:7.2f} s  {pages / elapsed:7.1f} pages/s")
+    for workers in workers_list:
+        if workers > 1:
+            # Warm the pool so process start-up is not charged to the timed run
+            DocumentProcessor.process_path(path, workers=workers, parallel_min_pages=1)
+        (text, _), elapsed = timed(DocumentProcessor.process_path, path, workers=workers,
+                                   parallel_min_pages=1)
+        match = 'ok' if text == baseline else 'MISMATCH'
+        print(f"  {f'{workers} workers':>10}  {elapsed:7.2f} s  {pages / elapsed:7.1f} pages/s  {match}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', default='100,250,500', help='comma-separated synthetic page counts')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated pool sizes to try')
+    parser.add_argument('--file', help='benchmark an existing PDF instead of synthetic ones')
+    args = parser.parse_args()
+    workers_list = [int(value) for value in args.workers.split(',')]
+
+    if args.file:
+        print(args.file)
+        benchmark(args.file, workers_list)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in (int(value) for value in args.pages.split(',')):
+            path = os.path.join(directory, f'textbook-{pages}.pdf')
+            synthetic_textbook(path, pages)
+            print(f"{pages} pages ({os.path.getsize(path) / 2**20:.1f} MiB)")
+            benchmark(path, workers_list)
+
+if __name__ == '__main__':
+    main()
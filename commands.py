@@ -0,0 +1,458 @@
+# commands.py
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, inspect, select, text, update
+from werkzeug.utils import secure_filename
+from models import (db, Conversation, KnowledgeBaseEntry, KnowledgeChunk, KnowledgeEmbedding, Message, ReadingLevel,
+                    StudentProfile, TopicProficiency, User, UserRole)
+from utils.analytics import rebuild_rollups
+from utils.chunking import chunk_text
+from utils.feedback import normalize_topic
+from utils.jobs import run_pending, worker_name
+from utils.tokens import count_text_tokens
+from utils.embeddings import (create_embeddings, embedding_model, embedding_text, index_path, index_type,
+                              pack_embedding, rebuild_knowledge_index, text_hash, update_entry_embedding)
+
+@click.command('migrate-embeddings')
+@click.option('--batch-size', default=500, show_default=True, help='Entries converted per transaction.')
+@click.option('--model', default=None, help='Model that produced the legacy JSON embeddings (defaults to EMBEDDING_MODEL).')
+@click.option('--keep-legacy-column', is_flag=True, help='Leave knowledge_base.embedding in place after converting.')
+@with_appcontext
+def migrate_embeddings(batch_size, model, keep_legacy_column):
+    """Convert legacy JSON embeddings into packed rows in knowledge_embeddings.
+
+    An entry short enough to be a single chunk keeps its existing vector. Longer
+    entries are left unchunked for `flask chunk-knowledge` to split and re-embed.
+    """
+    db.create_all()
+    model = model or embedding_model()
+    max_tokens = current_app.config.get('KNOWLEDGE_CHUNK_TOKENS', 400)
+
+    columns = {column['name'] for column in inspect(db.engine).get_columns('knowledge_base')}
+    if 'embedding' not in columns:
+        click.echo('Nothing to migrate: knowledge_base.embedding does not exist.')
+        return
+
+    converted = skipped = oversized = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            text('SELECT id, content, embedding FROM knowledge_base '
+                 'WHERE id > :last_id AND embedding IS NOT NULL '
+                 'ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': batch_size}
+        ).all()
+        if not rows:
+            break
+
+        already_chunked = {entry_id for (entry_id,) in db.session.query(KnowledgeChunk.entry_id).filter(
+            KnowledgeChunk.entry_id.in_([row.id for row in rows])
+        )}
+
+        for entry_id, content, raw in rows:
+            # SQLite hands back the JSON text, PostgreSQL an already decoded list
+            embedding = json.loads(raw) if isinstance(raw, str) else raw
+            if not embedding or entry_id in already_chunked:
+                skipped += 1
+                continue
+
+            chunks = chunk_text(content, max_tokens=max_tokens, overlap=0, model=model)
+            if len(chunks) != 1:
+                oversized += 1
+                continue
+
+            vector, dimension, dtype = pack_embedding(embedding)
+            chunk = KnowledgeChunk(
+                entry_id=entry_id,
+                chunk_index=0,
+                content=chunks[0].content,
+                token_count=chunks[0].token_count
+            )
+            chunk.embeddings.append(KnowledgeEmbedding(model=model, dimension=dimension, dtype=dtype, vector=vector))
+            db.session.add(chunk)
+            converted += 1
+
+        db.session.commit()
+        last_id = rows[-1].id
+        click.echo(f'Converted {converted} embeddings (through entry {last_id})...')
+
+    if not keep_legacy_column:
+        db.session.execute(text('ALTER TABLE knowledge_base DROP COLUMN embedding'))
+        db.session.commit()
+        click.echo('Dropped legacy knowledge_base.embedding column.')
+        if db.engine.dialect.name == 'sqlite':
+            click.echo('Run VACUUM on the database file to reclaim the freed space.')
+
+    click.echo(f'Done: {converted} converted, {skipped} skipped, {oversized} need `flask chunk-knowledge`.')
+
+@click.command('chunk-knowledge')
+@click.option('--all', 'rechunk_all', is_flag=True, help='Re-chunk every entry, not only entries without chunks.')
+@with_appcontext
+def chunk_knowledge(rechunk_all):
+    """Split knowledge base entries into chunks and embed each chunk."""
+    query = db.session.query(KnowledgeBaseEntry.id).order_by(KnowledgeBaseEntry.id)
+    if not rechunk_all:
+        query = query.filter(~KnowledgeBaseEntry.chunks.any())
+    entry_ids = [entry_id for (entry_id,) in query]
+
+    for done, entry_id in enumerate(entry_ids, start=1):
+        entry = db.session.get(KnowledgeBaseEntry, entry_id)
+        update_entry_embedding(entry)
+        click.echo(f'[{done}/{len(entry_ids)}] {entry.title}: {len(entry.chunks)} chunks')
+        db.session.expunge_all()
+
+@click.command('reembed')
+@click.option('--model', default=None, help='Embedding model to generate vectors with (defaults to EMBEDDING_MODEL).')
+@click.option('--batch-size', default=256, show_default=True, help='Chunks sent per embeddings.create call.')
+@click.option('--concurrency', default=4, show_default=True, help='Batches in flight at once.')
+@click.option('--missing-only', is_flag=True, help='Only embed chunks that have no vector for the model yet.')
+@click.option('--checkpoint', 'checkpoint_path', default=None, type=click.Path(dir_okay=False),
+              help='Progress file (defaults to <instance>/reembed-<model>.json).')
+@click.option('--restart', is_flag=True, help='Ignore any saved checkpoint and start from the first chunk.')
+@with_appcontext
+def reembed(model, batch_size, concurrency, missing_only, checkpoint_path, restart):
+    """Re-embed knowledge chunks in concurrent batches, resuming from a checkpoint.
+
+    Batches are written in id order as they complete, so the checkpoint always marks
+    a prefix of chunks that is fully embedded. The checkpoint is removed once the
+    run finishes.
+    """
+    model = model or embedding_model()
+    if not checkpoint_path:
+        os.makedirs(current_app.instance_path, exist_ok=True)
+        checkpoint_path = os.path.join(current_app.instance_path, f'reembed-{secure_filename(model)}.json')
+
+    last_id = 0
+    if not restart and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            saved = json.load(f)
+        if saved.get('model') == model:
+            last_id = saved['last_chunk_id']
+            click.echo(f'Resuming after chunk {last_id}.')
+
+    query = db.session.query(KnowledgeChunk.id, KnowledgeChunk.content, KnowledgeBaseEntry.title)\
+        .join(KnowledgeChunk.entry)\
+        .order_by(KnowledgeChunk.id)
+    if missing_only:
+        query = query.filter(~KnowledgeChunk.embeddings.any(KnowledgeEmbedding.model == model))
+
+    def batches(cursor):
+        # Keyset pagination keeps memory flat however large the table is
+        while True:
+            rows = query.filter(KnowledgeChunk.id > cursor).limit(batch_size).all()
+            if not rows:
+                return
+            cursor = rows[-1].id
+            yield rows
+
+    def write(rows, embeddings):
+        chunk_ids = [row.id for row in rows]
+        db.session.execute(KnowledgeEmbedding.__table__.delete().where(
+            KnowledgeEmbedding.chunk_id.in_(chunk_ids),
+            KnowledgeEmbedding.model == model
+        ))
+        payload = []
+        for chunk_id, embedding in zip(chunk_ids, embeddings):
+            vector, dimension, dtype = pack_embedding(embedding)
+            payload.append({'chunk_id': chunk_id, 'model': model, 'dimension': dimension, 'dtype': dtype, 'vector': vector})
+        db.session.execute(KnowledgeEmbedding.__table__.insert(), payload)
+        # Chunks written before content hashes existed become reusable for dedup
+        db.session.execute(update(KnowledgeChunk), [
+            {'id': row.id, 'content_hash': text_hash(embedding_text(row.title, row.content))} for row in rows
+        ])
+        db.session.commit()
+
+        tmp_path = checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'model': model, 'last_chunk_id': chunk_ids[-1]}, f)
+        os.replace(tmp_path, checkpoint_path)
+        return chunk_ids[-1]
+
+    progress = {'embedded': 0, 'last_id': last_id}
+    started = time.monotonic()
+
+    def drain_oldest():
+        rows, future = pending.popleft()
+        progress['last_id'] = write(rows, future.result())
+        progress['embedded'] += len(rows)
+        rate = progress['embedded'] / (time.monotonic() - started)
+        click.echo(f"{progress['embedded']} chunks embedded through chunk {progress['last_id']} ({rate:.1f} chunks/s)")
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    pending = deque()
+    try:
+        for rows in batches(last_id):
+            texts = [embedding_text(row.title, row.content) for row in rows]
+            pending.append((rows, pool.submit(create_embeddings, texts, model, batch_size)))
+            # Always write the oldest batch first so the checkpoint only moves forward
+            while len(pending) >= concurrency or (pending and pending[0][1].done()):
+                drain_oldest()
+        while pending:
+            drain_oldest()
+    except Exception as e:
+        pool.shutdown(wait=True, cancel_futures=True)
+        db.session.rollback()
+        raise click.ClickException(
+            f"Stopped after chunk {progress['last_id']}: {e}. Rerun to resume from the checkpoint."
+        )
+    pool.shutdown()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elapsed = time.monotonic() - started
+    rate = progress['embedded'] / elapsed if elapsed else 0.0
+    click.echo(f"Done: {progress['embedded']} chunks embedded with {model} in {elapsed:.1f}s ({rate:.1f} chunks/s).")
+
+@click.command('build-knowledge-index')
+@click.option('--model', default=None, help='Embedding model to index (defaults to EMBEDDING_MODEL).')
+@with_appcontext
+def build_knowledge_index(model):
+    """Retrain and persist the IVF knowledge index from the embeddings table."""
+    if index_type() != 'ivf':
+        click.echo("KNOWLEDGE_INDEX is 'exact'; workers build that index in memory, nothing to persist.")
+        return
+    started = time.monotonic()
+    index = rebuild_knowledge_index(model)
+    click.echo(f'Indexed {len(index)} chunks into {index_path(model or embedding_model())} '
+               f'in {time.monotonic() - started:.1f}s.')
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db():
+    """Create missing tables, columns and indexes introduced since the database was created.
+
+    db.create_all() never alters existing tables, so new nullable columns are added
+    here with ALTER TABLE and new indexes are created on their own. Safe to run
+    repeatedly.
+    """
+    db.create_all()
+    inspector = inspect(db.engine)
+    added = 0
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                click.echo(f'Skipping {table.name}.{column.name}: NOT NULL without a server default.')
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            click.echo(f'Added {table.name}.{column.name}')
+            added += 1
+    db.session.commit()
+
+    created = 0
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                click.echo(f'Created index {index.name}')
+                created += 1
+    click.echo(f'Done: {added} columns added, {created} indexes created.')
+
+@click.command('backfill-token-counts')
+@click.option('--batch-size', default=1000, show_default=True, help='Messages updated per transaction.')
+@with_appcontext
+def backfill_token_counts(batch_size):
+    """Store token counts for messages saved before messages.token_count existed."""
+    started = time.monotonic()
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Message.id, Message.message_content)\
+            .filter(Message.id > last_id, Message.token_count.is_(None))\
+            .order_by(Message.id)\
+            .limit(batch_size)\
+            .all()
+        if not rows:
+            break
+        db.session.execute(update(Message), [
+            {'id': row.id, 'token_count': count_text_tokens(row.message_content)} for row in rows
+        ])
+        db.session.commit()
+        last_id = rows[-1].id
+        updated += len(rows)
+        click.echo(f'{updated} messages counted (through message {last_id})...')
+
+    click.echo(f'Done: {updated} messages counted in {time.monotonic() - started:.1f}s.')
+
+@click.command('backfill-conversation-stats')
+@click.option('--batch-size', default=500, show_default=True, help='Conversations updated per transaction.')
+@with_appcontext
+def backfill_conversation_stats(batch_size):
+    """Fill in title, last_message_at and message_count for conversations that predate them."""
+    messages = Message.__table__
+    first_message = select(messages.c.message_content)\
+        .where(messages.c.conversation_id == Conversation.id)\
+        .order_by(messages.c.timestamp, messages.c.id)\
+        .limit(1)\
+        .scalar_subquery()
+    started = time.monotonic()
+    updated = 0
+    last_id = 0
+    while True:
+        ids = [row.id for row in db.session.query(Conversation.id)
+               .filter(Conversation.id > last_id, Conversation.message_count.is_(None) | Conversation.last_message_at.is_(None))
+               .order_by(Conversation.id)
+               .limit(batch_size)]
+        if not ids:
+            break
+        # One correlated UPDATE per batch; the aggregates run in the database
+        db.session.execute(update(Conversation).where(Conversation.id.in_(ids)).values(
+            message_count=select(func.count(messages.c.id))
+                .where(messages.c.conversation_id == Conversation.id).scalar_subquery(),
+            last_message_at=func.coalesce(
+                select(func.max(messages.c.timestamp))
+                    .where(messages.c.conversation_id == Conversation.id).scalar_subquery(),
+                Conversation.created_at
+            ),
+            title=func.coalesce(Conversation.title, func.substr(first_message, 1, 30, type_=db.String) + '...')
+        ), execution_options={'synchronize_session': False})
+        db.session.commit()
+        last_id = ids[-1]
+        updated += len(ids)
+        click.echo(f'{updated} conversations updated (through conversation {last_id})...')
+
+    click.echo(f'Done: {updated} conversations updated in {time.monotonic() - started:.1f}s.')
+
+@click.command('repair-student-profiles')
+@click.option('--assign-teacher', default=None, help='Username of a teacher to own students that have no teacher yet.')
+@with_appcontext
+def repair_student_profiles(assign_teacher):
+    """Create missing student profiles and optionally assign unowned students to a teacher.
+
+    The admin dashboard only lists students whose profile names the teacher, so
+    run this once with --assign-teacher after upgrading a database whose
+    students were created before profiles recorded their teacher.
+    """
+    teacher = None
+    if assign_teacher:
+        teacher = User.query.filter_by(username=assign_teacher, role=UserRole.TEACHER).first()
+        if teacher is None:
+            raise click.ClickException(f'No teacher named {assign_teacher}.')
+
+    missing = db.session.query(User.id)\
+        .outerjoin(StudentProfile, StudentProfile.user_id == User.id)\
+        .filter(User.role == UserRole.STUDENT, StudentProfile.user_id.is_(None))\
+        .all()
+    db.session.add_all([StudentProfile(
+        user_id=user_id,
+        teacher_id=teacher.id if teacher else None,
+        daily_question_limit=20,
+        questions_asked_today=0,
+        skill_level='beginner',
+        reading_level=ReadingLevel.G6
+    ) for (user_id,) in missing])
+
+    assigned = 0
+    if teacher:
+        assigned = db.session.query(StudentProfile)\
+            .filter(StudentProfile.teacher_id.is_(None))\
+            .update({StudentProfile.teacher_id: teacher.id}, synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Done: {len(missing)} profiles created, {assigned} students assigned to {assign_teacher or "no one"}.')
+
+@click.command('backfill-topic-proficiency')
+@click.option('--batch-size', default=500, show_default=True, help='Student profiles read per transaction.')
+@with_appcontext
+def backfill_topic_proficiency(batch_size):
+    """Copy per-topic counts from the legacy student_profiles.topic_proficiency JSON into topic_proficiencies.
+
+    Topics that already have a row are left alone, so the command can be re-run.
+    """
+    started = time.monotonic()
+    copied = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(StudentProfile.user_id, StudentProfile.topic_proficiency)\
+            .filter(StudentProfile.user_id > last_id)\
+            .order_by(StudentProfile.user_id)\
+            .limit(batch_size)\
+            .all()
+        if not rows:
+            break
+        last_id = rows[-1].user_id
+        existing = set(db.session.query(TopicProficiency.user_id, TopicProficiency.topic)
+                       .filter(TopicProficiency.user_id.in_([row.user_id for row in rows])))
+        for user_id, legacy in rows:
+            for topic, counts in (legacy or {}).items():
+                topic = normalize_topic(topic)
+                if not topic or (user_id, topic) in existing or not isinstance(counts, dict):
+                    continue
+                db.session.add(TopicProficiency(user_id=user_id, topic=topic,
+                                                attempts=int(counts.get('attempts', 0)),
+                                                successes=int(counts.get('successes', 0))))
+                existing.add((user_id, topic))
+                copied += 1
+        db.session.commit()
+        click.echo(f'{copied} topics copied (through student {last_id})...')
+
+    click.echo(f'Done: {copied} topics copied in {time.monotonic() - started:.1f}s.')
+
+@click.command('backfill-analytics')
+@click.option('--since', default=None, help='First day to rebuild (YYYY-MM-DD); all history by default.')
+@click.option('--until', default=None, help='Last day to rebuild (YYYY-MM-DD); today by default.')
+@with_appcontext
+def backfill_analytics(since, until):
+    """Rebuild the daily analytics rollups from messages, conversations and feedback events.
+
+    Turns and feedback are counted into the rollups as they are saved; run this
+    once after upgrading, or for a range of days whose rollups need repairing.
+    Replies saved before the answering model was recorded count as 'unknown'.
+    """
+    try:
+        start = date.fromisoformat(since) if since else None
+        end = date.fromisoformat(until) if until else None
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    started = time.monotonic()
+    written = rebuild_rollups(start, end)
+    click.echo(f'Done: {written} student-days rebuilt in {time.monotonic() - started:.1f}s.')
+
+@click.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty instead of polling for new jobs.')
+@click.option('--poll-interval', default=None, type=float, help='Seconds to wait when idle (defaults to WORKER_POLL_INTERVAL).')
+@with_appcontext
+def worker(burst, poll_interval):
+    """Run background jobs (knowledge base ingestion, conversation summaries) from the jobs table."""
+    # Imported for the job handlers they register
+    import utils.chat  # noqa: F401
+    import utils.ingest  # noqa: F401
+
+    poll_interval = poll_interval or current_app.config.get('WORKER_POLL_INTERVAL', 2.0)
+    name = worker_name()
+    click.echo(f'Worker {name} started.')
+    try:
+        while True:
+            ran = run_pending(name)
+            if ran:
+                click.echo(f'Ran {ran} jobs.')
+            if burst:
+                break
+            db.session.remove()
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        click.echo('Worker stopped.')
+
+def init_commands(app):
+    app.cli.add_command(migrate_embeddings)
+    app.cli.add_command(chunk_knowledge)
+    app.cli.add_command(reembed)
+    app.cli.add_command(build_knowledge_index)
+    app.cli.add_command(upgrade_db)
+    app.cli.add_command(backfill_token_counts)
+    app.cli.add_command(backfill_conversation_stats)
+    app.cli.add_command(repair_student_profiles)
+    app.cli.add_command(backfill_topic_proficiency)
+    app.cli.add_command(backfill_analytics)
+    app.cli.add_command(worker)
@@ -5,6 +5,91 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'your_secret_key')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Embeddings are stored as packed binary vectors tagged with the model that produced them
+    EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'text-embedding-ada-002')
+    EMBEDDING_DTYPE = os.environ.get('EMBEDDING_DTYPE', 'float32')  # 'float32' or 'float16'
+
+    # Knowledge base documents are split into overlapping, token-bounded chunks before embedding
+    KNOWLEDGE_CHUNK_TOKENS = int(os.environ.get('KNOWLEDGE_CHUNK_TOKENS', 400))
+    KNOWLEDGE_CHUNK_OVERLAP = int(os.environ.get('KNOWLEDGE_CHUNK_OVERLAP', 50))
+
+    # Retrieval index: 'exact' scans every chunk, 'ivf' probes the nearest KNOWLEDGE_INDEX_NPROBE
+    # of KNOWLEDGE_INDEX_NLIST clusters (see benchmarks/ann_recall.py for picking values)
+    KNOWLEDGE_INDEX = os.environ.get('KNOWLEDGE_INDEX', 'exact')
+    KNOWLEDGE_INDEX_NLIST = int(os.environ.get('KNOWLEDGE_INDEX_NLIST', 256))
+    KNOWLEDGE_INDEX_NPROBE = int(os.environ.get('KNOWLEDGE_INDEX_NPROBE', 8))
+    KNOWLEDGE_INDEX_PATH = os.environ.get('KNOWLEDGE_INDEX_PATH')  # Defaults to instance/knowledge-index-<model>.npz
+
+    # Query-embedding cache: in-memory LRU per worker, optionally backed by the embedding_cache table
+    EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', 2048))
+    EMBEDDING_CACHE_PERSIST = os.environ.get('EMBEDDING_CACHE_PERSIST', 'false').lower() == 'true'
+
+    # LLM gateway (utils/llm.py): one pooled client per worker, timeouts in seconds, jittered retries
+    # for 429/5xx. LLM_BACKEND=fake serves deterministic offline replies for tests and benchmarks.
+    LLM_BACKEND = os.environ.get('LLM_BACKEND', 'openai')
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 30))
+    LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', 5))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+    LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', 0.5))
+    LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', 8))
+    LLM_FAKE_LATENCY = float(os.environ.get('LLM_FAKE_LATENCY', 0))
+    LLM_FAKE_TOKEN_LATENCY = float(os.environ.get('LLM_FAKE_TOKEN_LATENCY', 0))
+
+    # Pre-LLM stages of a turn run concurrently; retrieval is skipped if it takes longer than this
+    PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', 8))
+    RETRIEVAL_TIMEOUT = float(os.environ.get('RETRIEVAL_TIMEOUT', 3))
+
+    # Socratic base prompt: an active PromptCustomization row named 'socratic' overrides the file.
+    # Compiled variants are rebuilt when either changes, checked every PROMPT_REFRESH_INTERVAL seconds.
+    SOCRATIC_PROMPT_PATH = os.environ.get('SOCRATIC_PROMPT_PATH', 'socratic_prompt.md')
+    PROMPT_REFRESH_INTERVAL = float(os.environ.get('PROMPT_REFRESH_INTERVAL', 5))
+
+    # Opt-in semantic cache of replies to the first question of a conversation, partitioned by
+    # model, skill level and reading level. TTL is in seconds; a lookup scores at most
+    # RESPONSE_CACHE_PARTITION_SIZE entries, the newest of its partition.
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+    RESPONSE_CACHE_THRESHOLD = float(os.environ.get('RESPONSE_CACHE_THRESHOLD', 0.95))
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 7 * 24 * 3600))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 5000))
+    RESPONSE_CACHE_PARTITION_SIZE = int(os.environ.get('RESPONSE_CACHE_PARTITION_SIZE', 500))
+
+    # Background jobs (`flask worker`): failed attempts retry after JOB_RETRY_DELAY * 2^n seconds
+    # (jittered); a job locked longer than JOB_LOCK_TIMEOUT is assumed orphaned and re-run.
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 30))
+    JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))
+    WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 2))
+
+    # Document text extraction: PDFs of at least PDF_PARALLEL_MIN_PAGES pages are split across
+    # PDF_EXTRACT_WORKERS processes. Extraction keeps what it has read once either budget runs out.
+    PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', os.cpu_count() or 1))
+    PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 64))
+    DOCUMENT_MAX_PAGES = int(os.environ.get('DOCUMENT_MAX_PAGES', 1000))
+    DOCUMENT_EXTRACT_TIMEOUT = float(os.environ.get('DOCUMENT_EXTRACT_TIMEOUT', 300))
+
+    # Token budget for conversation history; older turns are folded into a rolling summary
+    CONVERSATION_CONTEXT_TOKENS = int(os.environ.get('CONVERSATION_CONTEXT_TOKENS', 3000))
+
+    # Conversations per page of the chat sidebar, and messages per page of an open conversation
+    CONVERSATIONS_PAGE_SIZE = int(os.environ.get('CONVERSATIONS_PAGE_SIZE', 20))
+    MESSAGES_PAGE_SIZE = int(os.environ.get('MESSAGES_PAGE_SIZE', 50))
+
+    # Students per page of the admin dashboard
+    STUDENTS_PAGE_SIZE = int(os.environ.get('STUDENTS_PAGE_SIZE', 25))
+
+    # Student history pages: HISTORY_PAGE_SIZE conversations per page, read from the
+    # database HISTORY_FETCH_SIZE at a time while the page streams
+    HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 20))
+    HISTORY_FETCH_SIZE = int(os.environ.get('HISTORY_FETCH_SIZE', 5))
+
+    # Days covered by the admin analytics reports when no range is given
+    ANALYTICS_DEFAULT_DAYS = int(os.environ.get('ANALYTICS_DEFAULT_DAYS', 30))
+
+    # Roster CSV import: rows are inserted IMPORT_BATCH_SIZE at a time and their passwords
+    # hashed across PASSWORD_HASH_WORKERS processes (1 hashes in the request process)
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///your_database.db'
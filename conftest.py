@@ -1,8 +1,10 @@
 # conftest.py
 
 import pytest
+from flask import g
+from werkzeug.security import generate_password_hash
 from app import app as flask_app
-from models import db
+from models import db, StudentProfile, User, UserRole
 from config import TestingConfig
 
 @pytest.fixture
@@ -25,3 +27,31 @@ def client(app):
 @pytest.fixture
 def runner(app):
     return app.test_cli_runner()
+
+@pytest.fixture
+def make_user(app):
+    """Create and commit a user; keyword arguments set User columns.
+
+    Pass profile (a dict of StudentProfile columns, possibly empty) to give the
+    user a student profile as well. The daily limit defaults to 20.
+    """
+    def make(username, role=UserRole.STUDENT, profile=None, **fields):
+        user = User(username=username, email=f'{username}@example.com',
+                    password_hash=generate_password_hash('password123'), role=role, **fields)
+        db.session.add(user)
+        db.session.flush()
+        if profile is not None:
+            db.session.add(StudentProfile(user_id=user.id, **{'daily_question_limit': 20, **profile}))
+        db.session.commit()
+        return user
+    return make
+
+@pytest.fixture
+def login(client):
+    """Log the test client in as a user (or user id)."""
+    def log_in(user):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(getattr(user, 'id', user))
+        # Requests share the fixture's app context, so drop the user Flask-Login cached on g
+        g.pop('_login_user', None)
+    return log_in
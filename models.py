@@ -4,6 +4,7 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date, timezone
 from enum import Enum
 from flask_login import UserMixin
+from sqlalchemy import and_, bindparam, case, func, or_, update
 
 db = SQLAlchemy()
 
@@ -18,30 +19,79 @@ class SenderType(str, Enum):
     AI_TUTOR = 'ai_tutor'
     TEACHER = 'teacher'
 
+class JobStatus(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
 # Add this mixin class for shared functionality
 class QuestionLimitMixin:
     daily_question_limit = db.Column(db.Integer, nullable=False)
     questions_asked_today = db.Column(db.Integer, default=0)
     last_question_reset = db.Column(db.Date, default=date.today)
 
+    def questions_left(self):
+        """Questions remaining today, counting a stale day as already reset. Read-only."""
+        if self.last_question_reset is None or self.last_question_reset < date.today():
+            return self.daily_question_limit or 0
+        return max((self.daily_question_limit or 0) - (self.questions_asked_today or 0), 0)
+
+    @classmethod
+    def questions_left_expression(cls):
+        """questions_left as a SQL expression, for sorting. Today is read each time the statement runs."""
+        today = bindparam('today', callable_=date.today, type_=db.Date, unique=True)
+        asked = func.coalesce(cls.questions_asked_today, 0)
+        return case(
+            (or_(cls.last_question_reset.is_(None), cls.last_question_reset < today), cls.daily_question_limit),
+            (asked >= cls.daily_question_limit, 0),
+            else_=cls.daily_question_limit - asked
+        )
+
     def can_ask_question(self):
         """Check if user can ask more questions today."""
-        today = date.today()
-        
-        if self.last_question_reset < today:
-            self.questions_asked_today = 0
-            self.last_question_reset = today
-            db.session.commit()
-            
-        return self.questions_asked_today < self.daily_question_limit
-    
+        return self.questions_left() > 0
+
+    def _key(self):
+        return [column == getattr(self, column.key) for column in self.__mapper__.primary_key]
+
     def increment_question_count(self):
-        """Increment the questions asked counter."""
-        if self.can_ask_question():
-            self.questions_asked_today += 1
-            db.session.commit()
-            return True
-        return False
+        """Use up one of today's questions. Returns False, changing nothing, when none are left.
+
+        One conditional UPDATE both resets a stale day and takes the question, so
+        concurrent requests (in any process) cannot be admitted past the limit.
+        Commits, so the question stays taken while the caller waits on the model.
+        """
+        cls = type(self)
+        today = date.today()
+        stale = or_(cls.last_question_reset.is_(None), cls.last_question_reset < today)
+        result = db.session.execute(
+            update(cls)
+            .where(*self._key())
+            .where(or_(
+                and_(stale, cls.daily_question_limit > 0),
+                func.coalesce(cls.questions_asked_today, 0) < cls.daily_question_limit
+            ))
+            .values(
+                questions_asked_today=case((stale, 1), else_=func.coalesce(cls.questions_asked_today, 0) + 1),
+                last_question_reset=today
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def refund_question(self):
+        """Give back a question taken today for a turn that failed before the student got an answer."""
+        cls = type(self)
+        db.session.execute(
+            update(cls)
+            .where(*self._key())
+            .where(cls.last_question_reset == date.today(), cls.questions_asked_today > 0)
+            .values(questions_asked_today=cls.questions_asked_today - 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
 
 # Add this at the top with other enums
 class ReadingLevel(str, Enum):
@@ -62,7 +112,13 @@ class ReadingLevel(str, Enum):
 # User model
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
-    
+    __table_args__ = (
+        db.Index('ix_users_role', 'role'),
+        # Case-insensitive duplicate checks in the roster import
+        db.Index('ix_users_email_lower', db.text('lower(email)')),
+        db.Index('ix_users_username_lower', db.text('lower(username)')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -115,6 +171,9 @@ class User(db.Model, UserMixin):
 # StudentProfile model
 class StudentProfile(db.Model, QuestionLimitMixin):
     __tablename__ = 'student_profiles'
+    __table_args__ = (
+        db.Index('ix_student_profiles_teacher', 'teacher_id'),
+    )
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -141,20 +200,64 @@ class StudentProfile(db.Model, QuestionLimitMixin):
     user = db.relationship('User', back_populates='student_profile', foreign_keys=[user_id])
     teacher = db.relationship('User', back_populates='students', foreign_keys=[teacher_id])
 
+    # (level, minimum success rate, minimum run of understood answers), highest level first
+    SKILL_LEVELS = (('advanced', 0.8, 5), ('intermediate', 0.6, 3))
+
     def update_skill_level(self):
         """Update skill level based on performance metrics"""
         success_rate = self.successful_interactions / max(self.total_questions, 1)
         
-        if success_rate >= 0.8 and self.consecutive_successes >= 5:
-            self.skill_level = 'advanced'
-        elif success_rate >= 0.6 and self.consecutive_successes >= 3:
-            self.skill_level = 'intermediate'
+        for level, min_rate, min_streak in self.SKILL_LEVELS:
+            if success_rate >= min_rate and self.consecutive_successes >= min_streak:
+                self.skill_level = level
+                break
         else:
             self.skill_level = 'beginner'
 
+    @classmethod
+    def skill_level_expression(cls, successes, total, streak):
+        """update_skill_level as a SQL expression over (new) column values, for use in an UPDATE."""
+        # successes / total >= rate without dividing; total is at least 1 after the increment
+        return case(*[
+            (and_(successes * 1.0 >= min_rate * total, streak >= min_streak), level)
+            for level, min_rate, min_streak in cls.SKILL_LEVELS
+        ], else_='beginner')
+
     def __repr__(self):
         return f'<StudentProfile {self.user.username}>'
 
+# FeedbackEvent model: append-only log of the understood / still confused buttons
+class FeedbackEvent(db.Model):
+    __tablename__ = 'feedback_events'
+    __table_args__ = (
+        db.Index('ix_feedback_events_user_id', 'user_id', 'id'),
+        db.Index('ix_feedback_events_created', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    message_id = db.Column(db.Integer, nullable=True)  # Not a foreign key: events outlive deleted chats
+    topic = db.Column(db.String(64), nullable=True)
+    understood = db.Column(db.Boolean, nullable=False)
+    helpful = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f'<FeedbackEvent {self.id} by User {self.user_id}>'
+
+# TopicProficiency model: per-student, per-topic counts, incremented in place as feedback arrives
+class TopicProficiency(db.Model):
+    __tablename__ = 'topic_proficiencies'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    topic = db.Column(db.String(64), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    successes = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f'<TopicProficiency {self.topic} for User {self.user_id}: {self.successes}/{self.attempts}>'
+
 # TeacherProfile model
 class TeacherProfile(db.Model, QuestionLimitMixin):
     __tablename__ = 'teacher_profiles'
@@ -175,11 +278,24 @@ class TeacherProfile(db.Model, QuestionLimitMixin):
 # Conversation model
 class Conversation(db.Model):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        # Serves the sidebar's keyset pagination: newest activity first, per user
+        db.Index('ix_conversations_user_recent', 'user_id', 'last_message_at', 'id'),
+        # A student's conversations by start or last change (history pages, admin views)
+        db.Index('ix_conversations_user_created', 'user_id', 'created_at'),
+        db.Index('ix_conversations_user_updated', 'user_id', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    summary = db.Column(db.Text, nullable=True)  # Rolling summary of turns that fell out of the context window
+    summary_through_id = db.Column(db.Integer, nullable=True)  # Last message id folded into summary
+    # Denormalized for the sidebar, maintained when messages are saved
+    title = db.Column(db.String(64), nullable=True)
+    last_message_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=True)
+    message_count = db.Column(db.Integer, default=0, nullable=True)
 
     # Update relationships
     user = db.relationship('User', backref='conversations')
@@ -195,12 +311,20 @@ class Conversation(db.Model):
 # Message model
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Serves get_conversation's pages and build_history's messages after the summary, by id
+        db.Index('ix_messages_conversation_id', 'conversation_id', 'id'),
+        # Serves Conversation.messages, which is ordered by timestamp
+        db.Index('ix_messages_conversation_timestamp', 'conversation_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
     sender_type = db.Column(db.Enum(SenderType, native_enum=False), nullable=False)
     sender_id = db.Column(db.Integer, nullable=True)  # Null if sender is AI tutor
     message_content = db.Column(db.Text, nullable=False)
+    token_count = db.Column(db.Integer, nullable=True)  # Tokens in message_content, set on insert
+    model = db.Column(db.String(64), nullable=True)  # Model that answered the turn; 'cache' for cached replies
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
 
     # Relationships
@@ -251,6 +375,9 @@ class PromptCustomization(db.Model):
 # AuditLog model
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('ix_audit_logs_user_timestamp', 'user_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -275,7 +402,217 @@ class KnowledgeBaseEntry(db.Model):
     entry_type = db.Column(db.String(50), nullable=False, default='text')  # 'text' or 'document'
     document_path = db.Column(db.String(512))  # S3 or file system path
     document_type = db.Column(db.String(50))  # 'pdf', 'docx', etc.
-    embedding = db.Column(db.JSON)  # Store vector embeddings
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, onupdate=lambda: datetime.now(timezone.utc))
 
+    # Relationships
+    chunks = db.relationship(
+        'KnowledgeChunk',
+        back_populates='entry',
+        order_by='KnowledgeChunk.chunk_index',
+        cascade='all, delete-orphan'
+    )
+    document = db.relationship(
+        'KnowledgeDocument',
+        back_populates='entry',
+        uselist=False,
+        cascade='all, delete-orphan'
+    )
+
+    def __repr__(self):
+        return f'<KnowledgeBaseEntry {self.title}>'
+
+# DocumentBlob model: an uploaded file stored once under its content hash
+class DocumentBlob(db.Model):
+    __tablename__ = 'document_blobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    document_type = db.Column(db.String(50), nullable=False)
+    path = db.Column(db.String(512), nullable=False)
+    extracted_text = db.Column(db.Text)  # Filled by the first complete extraction, reused by later uploads
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # KnowledgeDocument rows using the file
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Relationships
+    documents = db.relationship('KnowledgeDocument', back_populates='blob')
+
+    def __repr__(self):
+        return f'<DocumentBlob {self.sha256[:12]}.{self.document_type}>'
+
+# KnowledgeDocument model: maps a document entry to its blob and the filename it was uploaded as
+class KnowledgeDocument(db.Model):
+    __tablename__ = 'knowledge_documents'
+
+    entry_id = db.Column(db.Integer, db.ForeignKey('knowledge_base.id', ondelete='CASCADE'), primary_key=True)
+    blob_id = db.Column(db.Integer, db.ForeignKey('document_blobs.id'), nullable=False, index=True)
+    filename = db.Column(db.String(256), nullable=False)
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Relationships
+    entry = db.relationship('KnowledgeBaseEntry', back_populates='document')
+    blob = db.relationship('DocumentBlob', back_populates='documents')
+
+    def __repr__(self):
+        return f'<KnowledgeDocument {self.filename} for Entry {self.entry_id}>'
+
+# KnowledgeChunk model: token-bounded slice of an entry's content, the unit of retrieval
+class KnowledgeChunk(db.Model):
+    __tablename__ = 'knowledge_chunks'
+    __table_args__ = (
+        db.UniqueConstraint('entry_id', 'chunk_index', name='uq_knowledge_chunk_entry_index'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('knowledge_base.id', ondelete='CASCADE'), nullable=False, index=True)
+    chunk_index = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    token_count = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), index=True)  # sha256 of the embedded text, for reusing embeddings
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Relationships
+    entry = db.relationship('KnowledgeBaseEntry', back_populates='chunks')
+    embeddings = db.relationship(
+        'KnowledgeEmbedding',
+        back_populates='chunk',
+        cascade='all, delete-orphan'
+    )
+
+    def __repr__(self):
+        return f'<KnowledgeChunk {self.chunk_index} of Entry {self.entry_id}>'
+
+# KnowledgeEmbedding model: packed binary vectors, one row per chunk and embedding model
+class KnowledgeEmbedding(db.Model):
+    __tablename__ = 'knowledge_embeddings'
+    __table_args__ = (
+        db.UniqueConstraint('chunk_id', 'model', name='uq_knowledge_embedding_chunk_model'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    chunk_id = db.Column(db.Integer, db.ForeignKey('knowledge_chunks.id', ondelete='CASCADE'), nullable=False, index=True)
+    model = db.Column(db.String(64), nullable=False)
+    dimension = db.Column(db.Integer, nullable=False)
+    dtype = db.Column(db.String(16), nullable=False, default='float32')  # 'float32' or 'float16'
+    vector = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Relationships
+    chunk = db.relationship('KnowledgeChunk', back_populates='embeddings')
+
+    def __repr__(self):
+        return f'<KnowledgeEmbedding {self.model} for Chunk {self.chunk_id}>'
+
+# EmbeddingCacheEntry model: persistent tier of the query-embedding cache
+class EmbeddingCacheEntry(db.Model):
+    __tablename__ = 'embedding_cache'
+
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of model + normalized text
+    model = db.Column(db.String(64), nullable=False)
+    dimension = db.Column(db.Integer, nullable=False)
+    dtype = db.Column(db.String(16), nullable=False, default='float32')
+    vector = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f'<EmbeddingCacheEntry {self.key[:12]} ({self.model})>'
+
+# ResponseCacheEntry model
+class ResponseCacheEntry(db.Model):
+    __tablename__ = 'response_cache'
+    __table_args__ = (
+        db.Index('ix_response_cache_partition', 'model', 'skill_level', 'reading_level', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    model = db.Column(db.String(64), nullable=False)
+    skill_level = db.Column(db.String(20), nullable=False)
+    reading_level = db.Column(db.String(8), nullable=False)
+    question = db.Column(db.Text, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    dimension = db.Column(db.Integer, nullable=False)
+    dtype = db.Column(db.String(16), nullable=False, default='float32')
+    vector = db.Column(db.LargeBinary, nullable=False)  # Unit-normalized question embedding
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    last_hit_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ResponseCacheEntry {self.id} ({self.model}, {self.skill_level}, {self.reading_level})>'
+
+# Job model: durable background work picked up by `flask worker`
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_claim', 'status', 'run_after', 'id'),
+        db.Index('ix_jobs_lock', 'status', 'locked_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Enum(JobStatus, native_enum=False), nullable=False, default=JobStatus.QUEUED)
+    entry_id = db.Column(db.Integer, db.ForeignKey('knowledge_base.id', ondelete='SET NULL'), index=True)
+    payload = db.Column(db.JSON, default=dict)
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # 0.0 - 1.0
+    message = db.Column(db.String(256))  # Latest progress note
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status.value,
+            'entry_id': self.entry_id,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status.value}>'
+
+# StudentDailyStats model: one row per student per UTC day, incremented as turns and feedback are saved
+class StudentDailyStats(db.Model):
+    __tablename__ = 'student_daily_stats'
+    __table_args__ = (
+        # Class-wide reports read a range of days across many students
+        db.Index('ix_student_daily_stats_day', 'day', 'user_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    questions = db.Column(db.Integer, nullable=False, default=0)
+    conversations = db.Column(db.Integer, nullable=False, default=0)  # Conversations started
+    tokens = db.Column(db.Integer, nullable=False, default=0)  # Message tokens sent to or received from a model
+    feedback = db.Column(db.Integer, nullable=False, default=0)
+    understood = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StudentDailyStats User {self.user_id} on {self.day}>'
+
+# StudentModelUsage model: replies and tokens per student, UTC day and model
+class StudentModelUsage(db.Model):
+    __tablename__ = 'student_model_usage'
+    __table_args__ = (
+        db.Index('ix_student_model_usage_day', 'day', 'user_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    model = db.Column(db.String(64), primary_key=True)
+    replies = db.Column(db.Integer, nullable=False, default=0)
+    tokens = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StudentModelUsage User {self.user_id} on {self.day} ({self.model})>'
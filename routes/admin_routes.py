@@ -1,9 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from models import Conversation, User, UserRole, StudentProfile, db
+from sqlalchemy import or_, select
+from sqlalchemy.orm import contains_eager
+from models import User, UserRole, StudentProfile, db
+from utils.analytics import report as analytics_report, report_range
+from utils.history import stream_history
+from utils.pagination import page_size
+from utils.roster_import import import_students
 from werkzeug.security import generate_password_hash
-from io import StringIO
-import csv
+from utils.embeddings import get_query_cache
+from utils.response_cache import ResponseCache, get_response_cache
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -14,23 +20,123 @@ def dashboard():
         flash('Access denied: You are not an admin.', 'danger')
         return redirect(url_for('auth.index'))
     
-    # Query all students with their profiles
-    students = User.query.filter_by(role=UserRole.STUDENT).all()
-    
-    # Ensure all students have profiles and skill levels
-    for student in students:
-        if not student.student_profile:
-            profile = StudentProfile(
-                user_id=student.id,
-                daily_question_limit=20,
-                questions_asked_today=0,
-                skill_level='beginner',  # Default skill level
-                reading_level='G6'  # Default to Grade 6
-            )
-            db.session.add(profile)
-    
-    db.session.commit()
-    return render_template('admin_dashboard.html', students=students)
+    # The student table is filled from /admin/students
+    return render_template('admin_dashboard.html')
+
+# Sortable columns of the student table
+STUDENT_SORTS = {
+    'id': User.id,
+    'first_name': User.first_name,
+    'last_name': User.last_name,
+    'email': User.email,
+    'skill_level': StudentProfile.skill_level,
+    'reading_level': StudentProfile.reading_level,
+    'questions_left': StudentProfile.questions_left_expression()
+}
+
+def student_row(student: User) -> dict:
+    profile = student.student_profile
+    reading_level = profile.reading_level.value if profile.reading_level else None
+    return {
+        'id': student.id,
+        'first_name': student.first_name,
+        'last_name': student.last_name,
+        'email': student.email,
+        'skill_level': profile.skill_level or 'beginner',
+        'reading_level': 'Kindergarten' if reading_level == 'K' else f'Grade {reading_level}' if reading_level else 'N/A',
+        'questions_left': profile.questions_left()
+    }
+
+def student_query(teacher_id: int, search: str = ''):
+    """A teacher's students joined to their profiles, optionally matching search on name or email."""
+    query = db.session.query(User)\
+        .join(User.student_profile)\
+        .filter(StudentProfile.teacher_id == teacher_id, User.role == UserRole.STUDENT)
+    if search:
+        pattern = f'%{search}%'
+        query = query.filter(or_(
+            User.first_name.ilike(pattern),
+            User.last_name.ilike(pattern),
+            User.email.ilike(pattern)
+        ))
+    return query
+
+def student_page(query, sort: str, descending: bool, page: int, per_page: int):
+    """One sorted page of a student_query, with the profiles loaded by the same join."""
+    column = STUDENT_SORTS[sort]
+    ordering = column.desc() if descending else column.asc()
+    return query.options(contains_eager(User.student_profile))\
+        .order_by(ordering, User.id)\
+        .offset((page - 1) * per_page)\
+        .limit(per_page)
+
+@admin_bp.route('/students')
+@login_required
+def list_students():
+    """One page of the current teacher's students, with their profiles, as JSON.
+
+    Query parameters: q (matches name or email), sort (a STUDENT_SORTS key),
+    order (asc or desc), page and per_page. Students and profiles come back in a
+    single joined query; the total is counted separately for the pager.
+    """
+    if current_user.role != UserRole.TEACHER:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    sort = request.args.get('sort', 'last_name')
+    if sort not in STUDENT_SORTS:
+        return jsonify({'error': f'Cannot sort by {sort}'}), 400
+    per_page = page_size(request.args.get('per_page', type=int), current_app.config.get('STUDENTS_PAGE_SIZE', 25))
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    query = student_query(current_user.id, request.args.get('q', '').strip())
+    total = query.order_by(None).count()
+    students = student_page(query, sort, request.args.get('order') == 'desc', page, per_page).all()
+
+    return jsonify({
+        'students': [student_row(student) for student in students],
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': -(-total // per_page)
+    })
+
+@admin_bp.route('/analytics/class')
+@login_required
+def class_analytics():
+    """Daily rollup report for all of the current teacher's students, with per-student totals.
+
+    Query parameters: start and end (YYYY-MM-DD, inclusive; the last
+    ANALYTICS_DEFAULT_DAYS days by default).
+    """
+    if current_user.role != UserRole.TEACHER:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    try:
+        start, end = report_range(request.args.get('start'), request.args.get('end'),
+                                  current_app.config.get('ANALYTICS_DEFAULT_DAYS', 30))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    students = select(StudentProfile.user_id).where(StudentProfile.teacher_id == current_user.id)
+    return jsonify(analytics_report(students, start, end, per_student=True))
+
+@admin_bp.route('/analytics/students/<int:student_id>')
+@login_required
+def student_analytics(student_id):
+    """Daily rollup report for one of the current teacher's students."""
+    if current_user.role != UserRole.TEACHER:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    profile = StudentProfile.query.filter_by(user_id=student_id, teacher_id=current_user.id).first()
+    if profile is None:
+        return jsonify({'error': 'Student not found'}), 404
+    try:
+        start, end = report_range(request.args.get('start'), request.args.get('end'),
+                                  current_app.config.get('ANALYTICS_DEFAULT_DAYS', 30))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(analytics_report([student_id], start, end))
 
 @admin_bp.route('/create_student', methods=['POST'])
 @login_required
@@ -56,6 +162,7 @@ def create_student():
         # Create associated student profile
         student_profile = StudentProfile(
             user_id=new_student.id,
+            teacher_id=current_user.id,
             daily_question_limit=20,
             questions_asked_today=0,
             reading_level='G6'  # Default to Grade 6
@@ -94,6 +201,7 @@ def edit_student(student_id):
             else:
                 profile = StudentProfile(
                     user_id=student.id,
+                    teacher_id=current_user.id,
                     skill_level=request.form['skill_level'],
                     reading_level=request.form['reading_level']
                 )
@@ -149,60 +257,22 @@ def bulk_create_students():
         return jsonify({'error': 'File must be CSV format'}), 400
 
     try:
-        # Read CSV file
-        stream = StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_reader = csv.reader(stream)
-        
-        success_count = 0
-        error_count = 0
-        errors = []
-
-        for row in csv_reader:
-            try:
-                if len(row) != 4:
-                    continue
-                
-                first_name, last_name, email, password = row
-                
-                # Create new student user
-                new_student = User(
-                    username=email,
-                    email=email,
-                    first_name=first_name,
-                    last_name=last_name,
-                    password_hash=generate_password_hash(password),
-                    role=UserRole.STUDENT
-                )
-
-                db.session.add(new_student)
-                db.session.flush()
-
-                # Create associated student profile
-                student_profile = StudentProfile(
-                    user_id=new_student.id,
-                    daily_question_limit=20,
-                    questions_asked_today=0
-                )
-                db.session.add(student_profile)
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                errors.append(f"Error with {email}: {str(e)}")
-                continue
-
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': f'Successfully created {success_count} students. {error_count} errors.',
-            'errors': errors
-        })
-
+        report = import_students(
+            file.stream,
+            current_user.id,
+            batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 500),
+            workers=current_app.config.get('PASSWORD_HASH_WORKERS', 1)
+        )
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+    report.update({
+        'success': True,
+        'message': f"Successfully created {report['created']} students. {report['failed']} errors."
+    })
+    return jsonify(report)
+
 @admin_bp.route('/adjust_questions/<int:student_id>/<action>', methods=['POST'])
 @login_required
 def adjust_questions(student_id, action):
@@ -242,11 +312,33 @@ def student_history(student_id):
         flash('Invalid student ID.', 'danger')
         return redirect(url_for('admin.dashboard'))
     
-    # Get all conversations for this student
-    conversations = Conversation.query.filter_by(
-        user_id=student.id
-    ).order_by(Conversation.created_at.desc()).all()
-    
-    return render_template('student_history.html', 
-                         student=student, 
-                         conversations=conversations)
\ No newline at end of file
+    # Conversations are fetched page by page while the response streams
+    return stream_history(student)
+
+@admin_bp.route('/cache_stats')
+@login_required
+def cache_stats():
+    if current_user.role != UserRole.TEACHER:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    # Counters are per worker process
+    response_cache = get_response_cache()
+    return jsonify({
+        'embedding_cache': get_query_cache().stats(),
+        'response_cache': response_cache.stats() if response_cache else {'enabled': False}
+    })
+
+@admin_bp.route('/response_cache/flush', methods=['POST'])
+@login_required
+def flush_response_cache():
+    if current_user.role != UserRole.TEACHER:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    try:
+        # Flush even when the cache is switched off so stale replies never come back
+        flushed = (get_response_cache() or ResponseCache()).flush()
+        return jsonify({'success': True, 'flushed': flushed})
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error flushing response cache: {str(e)}")
+        return jsonify({'error': 'Failed to flush response cache'}), 500
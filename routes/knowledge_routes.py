@@ -1,7 +1,10 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app, send_file
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, send_file
 from flask_login import login_required, current_user
-from models import KnowledgeBaseEntry, UserRole, db
-from utils.embeddings import update_entry_embedding
+from models import Job, KnowledgeBaseEntry, KnowledgeDocument, UserRole, db
+from utils.blob_store import release_blob, store_upload
+from utils.embeddings import unindex_chunks
+from utils.ingest import INGEST_KNOWLEDGE
+from utils.jobs import enqueue
 from utils.document_processor import DocumentProcessor
 import os
 from werkzeug.utils import secure_filename
@@ -16,7 +19,12 @@ def list():
         return redirect(url_for('auth.index'))
     
     entries = KnowledgeBaseEntry.query.all()
-    return render_template('knowledge_list.html', entries=entries)
+
+    # Latest ingestion job per entry, for the status column
+    jobs = {}
+    for job in Job.query.filter(Job.entry_id.in_([entry.id for entry in entries])).order_by(Job.id):
+        jobs[job.entry_id] = job
+    return render_template('knowledge_list.html', entries=entries, jobs=jobs)
 
 @knowledge_bp.route('/add', methods=['POST'])
 @login_required
@@ -28,25 +36,21 @@ def add():
         if 'document' in request.files:
             file = request.files['document']
             if file and file.filename and DocumentProcessor.allowed_file(file.filename):
-                # Process document
-                content, doc_type = DocumentProcessor.process_document(file)
-                
-                # Save file
+                # Store the file under its content hash; text extraction happens in the worker
                 filename = secure_filename(file.filename)
-                # Ensure upload directory exists
-                os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                
+                document_type = filename.rsplit('.', 1)[1].lower()
+                blob = store_upload(file, document_type)
+
                 entry = KnowledgeBaseEntry(
                     title=request.form['title'],
-                    content=content,
+                    content=blob.extracted_text or '',
                     category=request.form['category'],
                     tags=request.form['tags'].split(',') if request.form.get('tags') else [],
                     entry_type='document',
-                    document_path=file_path,
-                    document_type=doc_type
+                    document_path=blob.path,
+                    document_type=document_type
                 )
+                entry.document = KnowledgeDocument(blob=blob, filename=filename, uploaded_by=current_user.id)
             else:
                 flash('Invalid file type or no file provided', 'danger')
                 return redirect(url_for('knowledge.list'))
@@ -63,11 +67,13 @@ def add():
         db.session.add(entry)
         db.session.flush()
         
-        # Create and store embedding
-        update_entry_embedding(entry)
-        
+        # Chunking and embedding run in the background worker (`flask worker`)
+        job = enqueue(INGEST_KNOWLEDGE, entry_id=entry.id)
         db.session.commit()
-        flash('Knowledge base entry added successfully', 'success')
+
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': True, 'entry_id': entry.id, 'job_id': job.id}), 202
+        flash('Knowledge base entry queued for processing', 'success')
         return redirect(url_for('knowledge.list'))
     except Exception as e:
         db.session.rollback()
@@ -82,8 +88,14 @@ def delete(entry_id):
     
     try:
         entry = KnowledgeBaseEntry.query.get_or_404(entry_id)
+        chunk_ids = [chunk.id for chunk in entry.chunks]
+        blob_id = entry.document.blob_id if entry.document else None
         db.session.delete(entry)
         db.session.commit()
+        unindex_chunks(chunk_ids)
+        if blob_id is not None:
+            # Other entries may share the file; it is removed with its last reference
+            release_blob(blob_id)
         flash('Knowledge base entry deleted successfully', 'success')
     except Exception as e:
         db.session.rollback()
@@ -91,6 +103,17 @@ def delete(entry_id):
     
     return redirect(url_for('knowledge.list'))
 
+@knowledge_bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    if current_user.role != UserRole.TEACHER:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 # Add download route for documents
 @knowledge_bp.route('/download/<int:entry_id>')
 @login_required
@@ -107,5 +130,5 @@ def download(entry_id):
     return send_file(
         entry.document_path,
         as_attachment=True,
-        download_name=os.path.basename(entry.document_path)
+        download_name=entry.document.filename if entry.document else os.path.basename(entry.document_path)
     )
\ No newline at end of file
@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, flash, redirect, url_for
+from flask import Blueprint, flash, redirect, url_for
 from flask_login import login_required, current_user
-from models import User, UserRole, Conversation
+from models import User, UserRole
+from utils.history import stream_history
 
 student_bp = Blueprint('student', __name__, url_prefix='/student')
 
@@ -17,11 +18,5 @@ def history(student_id):
         flash('Invalid student ID.', 'danger')
         return redirect(url_for('admin.dashboard'))
     
-    # Get all conversations for this student
-    conversations = Conversation.query.filter_by(
-        user_id=student.id
-    ).order_by(Conversation.created_at.desc()).all()
-    
-    return render_template('student_history.html', 
-                         student=student, 
-                         conversations=conversations)
\ No newline at end of file
+    # Conversations are fetched page by page while the response streams
+    return stream_history(student)
\ No newline at end of file
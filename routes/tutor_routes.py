@@ -1,16 +1,24 @@
-from flask import Blueprint, current_app, render_template, request, jsonify, send_from_directory
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, send_from_directory, stream_with_context
 from flask_login import login_required, current_user
 from models import Conversation, Message, SenderType, StudentProfile, TeacherProfile, UserRole, db
-from datetime import datetime, timezone
-from openai import OpenAI
+from datetime import datetime
 import os
-from utils.embeddings import find_relevant_knowledge
-from utils.adaptive_prompt import AdaptivePromptManager
+from utils.embeddings import embed_query, find_relevant_knowledge
+from utils.prompt_registry import socratic_prompt
+from utils.response_cache import get_response_cache
+from utils.analytics import CACHED_MODEL, record_turn
+from utils.feedback import record_feedback
+from utils.chat import build_context, conversation_title, message_token_count, record_messages
+from utils.pagination import decode_cursor, encode_cursor, page_size
+from utils.llm import chat_completion, stream_chat_completion
+from utils.stages import stage_result, submit_stage
 from werkzeug.utils import secure_filename
 from enum import Enum
 from typing import Optional
 import base64
+import json
 from werkzeug.datastructures import FileStorage
+from sqlalchemy import and_, or_
 
 tutor_bp = Blueprint('tutor', __name__, url_prefix='/tutor')
 
@@ -82,22 +90,239 @@ def chat():
             db.session.add(profile)
             db.session.commit()
     
-    # Get user's chat history
-    conversations = Conversation.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Conversation.updated_at.desc()).all()
+    # Chat history is loaded page by page from /tutor/conversations
+    return render_template('tutor.html', messages=[])
+
+@tutor_bp.route('/conversations')
+@login_required
+def list_conversations():
+    """One page of the sidebar, most recent activity first.
+
+    Keyset pagination on (last_message_at, id): pass the returned next_cursor to
+    get the following page. Each page reads only the conversations it returns.
+    """
+    limit = page_size(request.args.get('limit', type=int), current_app.config.get('CONVERSATIONS_PAGE_SIZE', 20))
+    try:
+        cursor = decode_cursor(request.args.get('cursor'))
+        if cursor:
+            last_at, last_id = datetime.fromisoformat(cursor[0]), int(cursor[1])
+    except (ValueError, TypeError, IndexError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    query = db.session.query(
+        Conversation.id, Conversation.title, Conversation.created_at,
+        Conversation.last_message_at, Conversation.message_count
+    ).filter(Conversation.user_id == current_user.id)
+    if cursor:
+        query = query.filter(or_(
+            Conversation.last_message_at < last_at,
+            and_(Conversation.last_message_at == last_at, Conversation.id < last_id)
+        ))
+    rows = query.order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).limit(limit + 1).all()
+
+    page = rows[:limit]
+    return jsonify({
+        'conversations': [{
+            'id': row.id,
+            'title': row.title or "New Chat",
+            'date': row.created_at.strftime("%Y-%m-%d %H:%M"),
+            'message_count': row.message_count or 0
+        } for row in page],
+        'next_cursor': encode_cursor(page[-1].last_message_at, page[-1].id) if len(rows) > limit else None
+    })
+
+class FileUploadError(Exception):
+    """Raised when an attached file cannot be prepared for upload."""
+
+def student_profile() -> StudentProfile:
+    """The current user's student profile, created on first use."""
+    profile = current_user.student_profile
+    if not profile:
+        # Create profile if it doesn't exist
+        profile = StudentProfile(user_id=current_user.id)
+        db.session.add(profile)
+        db.session.commit()
+    return profile
+
+class QuestionLimitReached(Exception):
+    """Raised when a student has used all of today's questions."""
+
+def take_question() -> Optional[StudentProfile]:
+    """Claim one of the student's daily questions before anything is spent on the turn.
+
+    Returns the profile the question was taken from, for refund_question if the
+    turn fails before the student gets any reply; None for teachers, whose
+    TeacherProfile limit the tutor does not meter.
+    """
+    if current_user.role != UserRole.STUDENT:
+        return None
+    profile = student_profile()
+    if not profile.increment_question_count():
+        raise QuestionLimitReached()
+    return profile
+
+def question_limit_response():
+    return jsonify({
+        'error': "You've reached your daily question limit. Ask your teacher for more, or come back tomorrow.",
+        'limit_reached': True
+    }), 429
+
+def first_turn_cache(message: str, conversation_id, file: Optional[FileStorage]):
+    """Look up the opening question of a new conversation in the semantic response cache.
+
+    Returns (cached_reply, store). cached_reply is None on a miss, and store(reply)
+    caches a freshly generated reply; both are None when the cache is disabled or
+    the turn is not a plain-text first question.
+    """
+    cache = get_response_cache()
+    if cache is None or conversation_id or (file and file.filename) or not message.strip():
+        return None, None
+
+    profile = student_profile()
+    skill_level = profile.skill_level or 'beginner'
+    reading_level = str(getattr(profile.reading_level, 'value', profile.reading_level) or '')
+    model = select_model(None).value
+    try:
+        query_vector = embed_query(message)
+        cached_reply = cache.lookup(query_vector, model, skill_level, reading_level)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error reading response cache: {str(e)}")
+        return None, None
+
+    def store(reply: str) -> None:
+        try:
+            cache.store(message, query_vector, reply, model, skill_level, reading_level)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error writing response cache: {str(e)}")
+
+    return cached_reply, store
+
+def knowledge_context_for(message: str) -> str:
+    """Prompt section listing the knowledge base chunks most relevant to message."""
+    relevant_knowledge = find_relevant_knowledge(message)
+    knowledge_context = ""
+    if relevant_knowledge:
+        knowledge_context = "\n\nRelevant information from our knowledge base:\n"
+        for chunk in relevant_knowledge:
+            knowledge_context += f"- {chunk.entry.title}: {chunk.content}\n"
+    return knowledge_context
+
+def prepare_turn(message: str, conversation_id, file: Optional[FileStorage]):
+    """Build the model input for one student turn.
+
+    Returns (message, messages, model, conversation, file_path). The message gains
+    a reference to the attached file, and conversation is None for a new chat.
+
+    Retrieval (an embedding round trip plus the index search) runs on the stage pool
+    while this thread loads the profile, prompt and history, and is abandoned after
+    RETRIEVAL_TIMEOUT seconds so a slow embedding call cannot stall the turn.
+    """
+    # Start retrieval first: it is the slowest stage and needs nothing below
+    knowledge_future = submit_stage(knowledge_context_for, message)
+
+    # Get student profile for adaptive prompting
+    profile = student_profile()
+    
+    # Precompiled Socratic prompt for this profile; identical across turns, so it leads the request
+    system_prompt = socratic_prompt(profile)
     
-    chat_history = [{
-        'id': conv.id,
-        'title': conv.messages[0].message_content[:30] + "..." if conv.messages else "New Chat",
-        'date': conv.created_at.strftime("%Y-%m-%d %H:%M")
-    } for conv in conversations]
+    # Prompt then history: recent turns within the token budget, older ones summarized
+    conversation = None
+    if conversation_id:
+        conversation = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).first()
+    base_messages = build_context(conversation, system_prompt)
 
-    return render_template('tutor.html', chat_history=chat_history, messages=[])
+    # Find relevant knowledge base entries
+    knowledge_context = stage_result(
+        knowledge_future,
+        timeout=current_app.config.get('RETRIEVAL_TIMEOUT', 3.0),
+        default="",
+        name="knowledge retrieval"
+    )
+
+
+    # Handle file upload
+    file_path = None
+    if file and allowed_file(file.filename):
+        try:
+            filename = secure_filename(file.filename)
+            user_folder = str(current_user.id)
+            upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], user_folder)
+            os.makedirs(upload_dir, exist_ok=True)
+            
+            file_path = os.path.join(upload_dir, filename)
+            relative_path = f"{user_folder}/{filename}"
+            
+            # Update message with file reference
+            if message:
+                message += f"\n[Attached file: {relative_path}]"
+            else:
+                message = f"[Attached file: {relative_path}]"
+        except Exception as e:
+            print(f"Error handling file upload: {str(e)}")
+            raise FileUploadError(str(e))
+
+    # Select appropriate model
+    model = select_model(file)
+    print(f"Selected model: {model.value}")
+    
+    # Stable prefix first (prompt, then append-only history); per-turn knowledge goes last
+    if knowledge_context:
+        base_messages.append({"role": "system", "content": knowledge_context.strip()})
+
+    # Prepare final messages
+    messages = prepare_messages(message, file, base_messages)
+    return message, messages, model, conversation, file_path
+
+def save_turn(user_id: int, conversation: Optional[Conversation], message: str, ai_response: str,
+              file: Optional[FileStorage], file_path: Optional[str], model: Optional[str] = None) -> Message:
+    """Persist both sides of a turn, creating the conversation if needed, and count it in the analytics rollups.
+
+    Returns the saved tutor reply, whose id is what feedback on the turn refers to.
+    """
+    # Save the file only once the model has answered
+    if file_path:
+        file.save(file_path)
+
+    # Create new conversation if none exists
+    new_conversation = conversation is None
+    if new_conversation:
+        conversation = Conversation(user_id=user_id, title=conversation_title(message))
+        db.session.add(conversation)
+        db.session.flush()
+    
+    # Save messages to database
+    user_message = Message(
+        conversation_id=conversation.id,
+        sender_type=SenderType.STUDENT,
+        sender_id=user_id,
+        message_content=message,
+        token_count=message_token_count(message),
+        model=model
+    )
+    ai_message = Message(
+        conversation_id=conversation.id,
+        sender_type=SenderType.AI_TUTOR,
+        message_content=ai_response,
+        token_count=message_token_count(ai_response),
+        model=model
+    )
+    
+    db.session.add_all([user_message, ai_message])
+    db.session.flush()
+    record_messages(conversation.id, 2, message)
+    record_turn(user_id, model, new_conversation, (user_message.token_count or 0) + (ai_message.token_count or 0))
+    db.session.commit()
+    return ai_message
 
 @tutor_bp.route('/send_message', methods=['POST'])
 @login_required
 def send_message():
+    # The question is refunded on any failure before the model (or the cache) has answered
+    quota = None
+    answered = False
     try:
         message = request.form.get('message', '')
         conversation_id = request.form.get('conversation_id')
@@ -107,137 +332,54 @@ def send_message():
         print(f"Received message: {message}")
         print(f"Conversation ID: {conversation_id}")
         print(f"File: {file.filename if file else None}")
-        
-        # Get student profile for adaptive prompting
-        profile = current_user.student_profile
-        if not profile:
-            # Create profile if it doesn't exist
-            profile = StudentProfile(user_id=current_user.id)
-            db.session.add(profile)
-            db.session.commit()
-        
-        # Initialize adaptive prompt manager
-        prompt_manager = AdaptivePromptManager(profile)
-        
-        # Load and adapt the Socratic prompt
+
+        # Before the cache lookup: even that costs an embedding call
         try:
-            with open('socratic_prompt.md', 'r') as f:
-                base_prompt = f.read()
-            adapted_prompt = prompt_manager.generate_adaptive_prompt(base_prompt)
-        except Exception as e:
-            print(f"Error loading Socratic prompt: {str(e)}")
-            adapted_prompt = "You are a Socratic-style tutor specializing in Python programming."
-        
-        # Find relevant knowledge base entries
+            quota = take_question()
+        except QuestionLimitReached:
+            return question_limit_response()
+
+        # A near-identical opening question may already have an answer for this kind of student
+        cached_reply, cache_store = first_turn_cache(message, conversation_id, file)
+        if cached_reply is not None:
+            answered = True
+            reply = save_turn(current_user.id, None, message, cached_reply, None, None, CACHED_MODEL)
+            return jsonify({
+                'success': True,
+                'conversation_id': reply.conversation_id,
+                'cached': True,
+                'messages': [
+                    {'role': 'user', 'content': message},
+                    {'id': reply.id, 'role': 'assistant', 'content': cached_reply, 'model': select_model(None).value}
+                ]
+            })
+
         try:
-            relevant_knowledge = find_relevant_knowledge(message)
-            knowledge_context = ""
-            if relevant_knowledge:
-                knowledge_context = "\n\nRelevant information from our knowledge base:\n"
-                for entry in relevant_knowledge:
-                    knowledge_context += f"- {entry.title}: {entry.content}\n"
-        except Exception as e:
-            print(f"Error finding relevant knowledge: {str(e)}")
-            knowledge_context = ""
-        
-        # Combine prompts
-        combined_prompt = f"""{adapted_prompt}
-
-{knowledge_context}
-
-Remember:
-1. Always ask probing questions instead of giving direct answers
-2. Guide the student to discover the solution themselves
-3. If you have relevant knowledge base information, use it to form questions that lead the student to understand the concept
-4. Break down complex problems into smaller, manageable questions
-5. Validate student's correct thinking and gently correct misconceptions through questions"""
-
-        # Handle file upload
-        file_path = None
-        if file and allowed_file(file.filename):
-            try:
-                filename = secure_filename(file.filename)
-                user_folder = str(current_user.id)
-                upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], user_folder)
-                os.makedirs(upload_dir, exist_ok=True)
-                
-                file_path = os.path.join(upload_dir, filename)
-                relative_path = f"{user_folder}/{filename}"
-                
-                # Update message with file reference
-                if message:
-                    message += f"\n[Attached file: {relative_path}]"
-                else:
-                    message = f"[Attached file: {relative_path}]"
-            except Exception as e:
-                print(f"Error handling file upload: {str(e)}")
-                return jsonify({'error': 'Failed to process file upload'}), 500
-
-        # Select appropriate model
-        model = select_model(file)
-        print(f"Selected model: {model.value}")
-        
-        # Build base messages
-        base_messages = [{"role": "system", "content": combined_prompt}]
-        if conversation_id:
-            conversation = Conversation.query.get(conversation_id)
-            if conversation:
-                for msg in conversation.messages:
-                    role = "assistant" if msg.sender_type == SenderType.AI_TUTOR else "user"
-                    base_messages.append({
-                        "role": role,
-                        "content": msg.message_content
-                    })
-
-        # Prepare final messages
-        messages = prepare_messages(message, file, base_messages)
+            message, messages, model, conversation, file_path = prepare_turn(message, conversation_id, file)
+        except FileUploadError:
+            if quota:
+                quota.refund_question()
+            return jsonify({'error': 'Failed to process file upload'}), 500
 
         # Get OpenAI response
         try:
-            client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-            if not client.api_key:
-                raise ValueError("OpenAI API key not found")
-                
-            response = client.chat.completions.create(
+            ai_response = chat_completion(
+                messages,
                 model=model.value,
-                messages=messages,
                 max_tokens=500 if model == AIModel.GPT4_TURBO else None
             )
-            
-            # Save the file after successful API call
-            if file_path:
-                file.save(file_path)
-
-            ai_response = response.choices[0].message.content
-            
-            # Create new conversation if none exists
-            if not conversation_id:
-                conversation = Conversation(user_id=current_user.id)
-                db.session.add(conversation)
-                db.session.flush()
-            
-            # Save messages to database
-            user_message = Message(
-                conversation_id=conversation.id,
-                sender_type=SenderType.STUDENT,
-                sender_id=current_user.id,
-                message_content=message
-            )
-            ai_message = Message(
-                conversation_id=conversation.id,
-                sender_type=SenderType.AI_TUTOR,
-                message_content=ai_response
-            )
-            
-            db.session.add_all([user_message, ai_message])
-            db.session.commit()
+            answered = True
+            reply = save_turn(current_user.id, conversation, message, ai_response, file, file_path, model.value)
+            if cache_store:
+                cache_store(ai_response)
 
             return jsonify({
                 'success': True,
-                'conversation_id': conversation.id,
+                'conversation_id': reply.conversation_id,
                 'messages': [
                     {'role': 'user', 'content': message},
                     {
+                        'id': reply.id,
                         'role': 'assistant', 
                         'content': ai_response,
                         'model': model.value
@@ -246,29 +388,193 @@ Remember:
             })
 
         except Exception as e:
+            db.session.rollback()
             print(f"Error in OpenAI API call: {str(e)}")
+            if quota and not answered:
+                quota.refund_question()
             return jsonify({'error': f'OpenAI API error: {str(e)}'}), 500
 
     except Exception as e:
         db.session.rollback()
         print(f"Unexpected error in send_message: {str(e)}")
+        if quota and not answered:
+            quota.refund_question()
+        return jsonify({'error': 'Failed to process message'}), 500
+
+def _sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+@tutor_bp.route('/send_message_stream', methods=['POST'])
+@login_required
+def send_message_stream():
+    """Server-sent events variant of send_message that forwards tokens as they arrive.
+
+    Events are JSON objects with a type of 'start' (the stored user message),
+    'token', 'error' or 'done' (with the conversation id and the saved reply's
+    message id, for feedback). Both messages are saved
+    when the stream ends, including when the student aborts it part way through.
+    The question is refunded only if the stream ends before its first token.
+    """
+    quota = None
+    answered = False
+    try:
+        message = request.form.get('message', '')
+        conversation_id = request.form.get('conversation_id')
+        file = request.files.get('file')
+
+        try:
+            quota = take_question()
+        except QuestionLimitReached:
+            return question_limit_response()
+
+        cached_reply, cache_store = first_turn_cache(message, conversation_id, file)
+        if cached_reply is not None:
+            answered = True
+            reply = save_turn(current_user.id, None, message, cached_reply, None, None, CACHED_MODEL)
+            model_name = select_model(None).value
+            events = [
+                {'type': 'start', 'message': message, 'model': model_name},
+                {'type': 'token', 'content': cached_reply},
+                {'type': 'done', 'conversation_id': reply.conversation_id, 'message_id': reply.id,
+                 'model': model_name, 'cached': True}
+            ]
+            return Response(
+                "".join(_sse(event) for event in events),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache'}
+            )
+
+        try:
+            message, messages, model, conversation, file_path = prepare_turn(message, conversation_id, file)
+        except FileUploadError:
+            if quota:
+                quota.refund_question()
+            return jsonify({'error': 'Failed to process file upload'}), 500
+
+        try:
+            stream = stream_chat_completion(
+                messages,
+                model=model.value,
+                max_tokens=500 if model == AIModel.GPT4_TURBO else None
+            )
+        except Exception as e:
+            print(f"Error in OpenAI API call: {str(e)}")
+            if quota:
+                quota.refund_question()
+            return jsonify({'error': f'OpenAI API error: {str(e)}'}), 500
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Unexpected error in send_message_stream: {str(e)}")
+        if quota and not answered:
+            quota.refund_question()
         return jsonify({'error': 'Failed to process message'}), 500
 
+    # The request's session is gone by the time the body streams, so only carry ids across
+    user_id = current_user.id
+    conversation_id = conversation.id if conversation else None
+    quota_user_id = quota.user_id if quota else None
+
+    def refund():
+        if quota_user_id is None:
+            return
+        try:
+            db.session.get(StudentProfile, quota_user_id).refund_question()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error refunding question: {str(e)}")
+
+    def finish(parts):
+        if not parts:
+            return None
+        try:
+            existing = db.session.get(Conversation, conversation_id) if conversation_id else None
+            return save_turn(user_id, existing, message, "".join(parts), file, file_path, model.value)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error saving streamed messages: {str(e)}")
+            return None
+
+    def generate():
+        parts = []
+        yield _sse({'type': 'start', 'message': message, 'model': model.value})
+        try:
+            for delta in stream:
+                parts.append(delta)
+                yield _sse({'type': 'token', 'content': delta})
+        except GeneratorExit:
+            # The student navigated away or hit stop: keep what they already saw
+            stream.close()
+            if parts:
+                finish(parts)
+            else:
+                refund()
+            raise
+        except Exception as e:
+            print(f"Error in OpenAI stream: {str(e)}")
+            if not parts:
+                # Nothing reached the student, so the question is given back
+                refund()
+            yield _sse({'type': 'error', 'error': f'OpenAI API error: {str(e)}'})
+            completed = False
+        else:
+            completed = True
+
+        saved = finish(parts)
+        if saved is not None:
+            # Only complete replies are worth serving to the next student
+            if completed and cache_store:
+                cache_store("".join(parts))
+            yield _sse({'type': 'done', 'conversation_id': saved.conversation_id, 'message_id': saved.id,
+                        'model': model.value})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @tutor_bp.route('/get_conversation/<int:conversation_id>')
 @login_required
 def get_conversation(conversation_id):
-    conversation = Conversation.query.get_or_404(conversation_id)
-    
+    """The latest messages of a conversation, oldest first.
+
+    Returns at most MESSAGES_PAGE_SIZE messages and a `before` cursor; pass it
+    back as ?before= to get the page of messages preceding them. `before` is
+    null once the start of the conversation is reached.
+    """
+    owner_id = db.session.query(Conversation.user_id).filter_by(id=conversation_id).scalar()
+    if owner_id is None:
+        return jsonify({'error': 'Conversation not found'}), 404
+
     # Verify the conversation belongs to the current user
-    if conversation.user_id != current_user.id:
+    if owner_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
 
+    limit = page_size(request.args.get('limit', type=int), current_app.config.get('MESSAGES_PAGE_SIZE', 50))
+    try:
+        cursor = decode_cursor(request.args.get('before'))
+        before_id = int(cursor[0]) if cursor else None
+    except (ValueError, TypeError, IndexError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    query = db.session.query(Message.id, Message.sender_type, Message.message_content)\
+        .filter(Message.conversation_id == conversation_id)
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+    rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+
+    page = rows[:limit][::-1]
     messages = [{
-        'role': 'assistant' if msg.sender_type == SenderType.AI_TUTOR else 'user',
-        'content': msg.message_content
-    } for msg in conversation.messages]
+        'id': row.id,
+        'role': 'assistant' if row.sender_type == SenderType.AI_TUTOR else 'user',
+        'content': row.message_content
+    } for row in page]
 
-    return jsonify({'messages': messages})
+    return jsonify({
+        'messages': messages,
+        'before': encode_cursor(page[0].id) if len(rows) > limit else None
+    })
 
 @tutor_bp.route('/interaction_feedback', methods=['POST'])
 @login_required
@@ -276,39 +582,25 @@ def interaction_feedback():
     if current_user.role != UserRole.STUDENT:
         return jsonify({'error': 'Only students can provide interaction feedback'}), 403
         
-    data = request.json
+    data = request.json or {}
     message_id = data.get('message_id')
-    was_helpful = data.get('was_helpful', False)
-    understood_concept = data.get('understood_concept', False)
+    try:
+        # Replies the page has no id for send a blank one
+        message_id = int(message_id) if message_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid message id'}), 400
     
     try:
-        # Get the student profile
-        profile = current_user.student_profile
-        if not profile:
+        # Logged as an event; the profile and topic counters are incremented in place
+        recorded = record_feedback(
+            current_user.id,
+            understood=bool(data.get('understood_concept', False)),
+            helpful=bool(data.get('was_helpful', False)),
+            message_id=message_id,
+            topic=data.get('topic')
+        )
+        if not recorded:
             return jsonify({'error': 'Student profile not found'}), 404
-            
-        # Update metrics
-        profile.total_questions += 1
-        if understood_concept:
-            profile.successful_interactions += 1
-            profile.consecutive_successes += 1
-            profile.consecutive_failures = 0
-        else:
-            profile.consecutive_failures += 1
-            profile.consecutive_successes = 0
-            
-        # Update skill level based on new metrics
-        profile.update_skill_level()
-        
-        # Update topic proficiency if provided
-        topic = data.get('topic')
-        if topic:
-            current_proficiency = profile.topic_proficiency.get(topic, {})
-            current_proficiency['attempts'] = current_proficiency.get('attempts', 0) + 1
-            current_proficiency['successes'] = current_proficiency.get('successes', 0) + (1 if understood_concept else 0)
-            profile.topic_proficiency[topic] = current_proficiency
-            
-        db.session.commit()
         
         return jsonify({'success': True})
         
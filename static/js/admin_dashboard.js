@@ -62,7 +62,12 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                alert(data.message);
+                const rejected = data.errors.slice(0, 10)
+                    .map(e => `Line ${e.line}${e.email ? ` (${e.email})` : ''}: ${e.error}`);
+                if (data.errors.length > rejected.length) {
+                    rejected.push(`...and ${data.errors.length - rejected.length} more`);
+                }
+                alert([data.message, ...rejected].join('\n'));
                 location.reload();
             } else {
                 alert('Error: ' + data.error);
@@ -73,4 +78,154 @@ document.addEventListener('DOMContentLoaded', function() {
             alert('Error uploading file');
         });
     }
+
+    // Cached first-question answers go stale when the curriculum changes
+    document.getElementById('flush-response-cache-btn').addEventListener('click', function() {
+        if (!confirm('Clear all cached tutor answers?')) return;
+
+        fetch('/admin/response_cache/flush', { method: 'POST' })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                alert(`Cleared ${data.flushed} cached answers.`);
+            } else {
+                alert('Error: ' + data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Error clearing cached answers');
+        });
+    });
+
+    // Student table: sorting, search and paging happen on the server
+    const studentsBody = document.getElementById('students-body');
+    const studentsSummary = document.getElementById('students-summary');
+    const prevButton = document.getElementById('students-prev');
+    const nextButton = document.getElementById('students-next');
+    const searchInput = document.getElementById('student-search');
+    const tableState = { q: '', sort: 'last_name', order: 'asc', page: 1, pages: 1 };
+    let searchTimer = null;
+
+    function escapeHtml(value) {
+        const div = document.createElement('div');
+        div.textContent = value == null ? '' : value;
+        return div.innerHTML;
+    }
+
+    function studentRow(student) {
+        return `
+            <tr>
+                <td>${student.id}</td>
+                <td>${escapeHtml(student.first_name)}</td>
+                <td>${escapeHtml(student.last_name)}</td>
+                <td>${escapeHtml(student.email)}</td>
+                <td>
+                    <span class="skill-badge skill-${escapeHtml(student.skill_level)}">
+                        ${escapeHtml(student.skill_level.charAt(0).toUpperCase() + student.skill_level.slice(1))}
+                    </span>
+                </td>
+                <td>${escapeHtml(student.reading_level)}</td>
+                <td>${student.questions_left}</td>
+                <td>
+                    <a href="/student/history/${student.id}" class="btn btn-sm btn-outline-info">View History</a>
+                    <a href="/admin/edit_student/${student.id}" class="btn btn-sm btn-outline-primary">Edit</a>
+                    <form action="/admin/adjust_questions/${student.id}/add" method="POST" style="display: inline;">
+                        <button type="submit" class="btn btn-sm btn-outline-success">+5 Questions</button>
+                    </form>
+                    <form action="/admin/delete_student/${student.id}" method="POST" style="display: inline;">
+                        <button type="submit" class="btn btn-sm btn-outline-danger" onclick="return confirm('Are you sure you want to delete this student?')">Delete</button>
+                    </form>
+                </td>
+            </tr>
+        `;
+    }
+
+    function loadStudents() {
+        const params = new URLSearchParams({
+            q: tableState.q,
+            sort: tableState.sort,
+            order: tableState.order,
+            page: tableState.page
+        });
+        fetch(`/admin/students?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) throw new Error(data.error);
+            tableState.pages = Math.max(data.pages, 1);
+            studentsBody.innerHTML = data.students.map(studentRow).join('');
+            studentsSummary.textContent = `${data.total} students, page ${data.page} of ${tableState.pages}`;
+            prevButton.disabled = data.page <= 1;
+            nextButton.disabled = data.page >= tableState.pages;
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            studentsSummary.textContent = 'Error loading students';
+        });
+    }
+
+    document.querySelectorAll('#students-table th.sortable').forEach(header => {
+        header.addEventListener('click', function() {
+            const sort = this.dataset.sort;
+            tableState.order = tableState.sort === sort && tableState.order === 'asc' ? 'desc' : 'asc';
+            tableState.sort = sort;
+            tableState.page = 1;
+            loadStudents();
+        });
+    });
+
+    searchInput.addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            tableState.q = searchInput.value.trim();
+            tableState.page = 1;
+            loadStudents();
+        }, 300);
+    });
+
+    prevButton.addEventListener('click', function() {
+        if (tableState.page > 1) {
+            tableState.page--;
+            loadStudents();
+        }
+    });
+
+    nextButton.addEventListener('click', function() {
+        if (tableState.page < tableState.pages) {
+            tableState.page++;
+            loadStudents();
+        }
+    });
+
+    loadStudents();
+
+    // Class analytics come from the daily rollups, so this stays fast however long the history
+    function analyticsTile(label, value) {
+        return `
+            <div class="col">
+                <div class="h4 mb-0">${value == null ? '&ndash;' : escapeHtml(value)}</div>
+                <small class="text-muted">${label}</small>
+            </div>
+        `;
+    }
+
+    fetch('/admin/analytics/class')
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) throw new Error(data.error);
+        const totals = data.totals;
+        document.getElementById('analytics-totals').innerHTML = [
+            analyticsTile('Questions', totals.questions),
+            analyticsTile('Conversations', totals.conversations),
+            analyticsTile('Turns per conversation', totals.turns_per_conversation),
+            analyticsTile('Understood', totals.understood_rate == null ? null : `${Math.round(totals.understood_rate * 100)}%`),
+            analyticsTile('Tokens', totals.tokens)
+        ].join('');
+        const models = Object.entries(data.models).map(([model, usage]) => `${model}: ${usage.replies} replies`);
+        document.getElementById('analytics-models').textContent = models.length ? `Models: ${models.join(', ')}` : '';
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        document.getElementById('analytics-totals').textContent = 'Error loading class activity';
+    });
 }); 
\ No newline at end of file
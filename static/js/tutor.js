@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const fileInput = document.getElementById('file-input');
     const filePreview = document.getElementById('file-preview');
     let currentConversationId = null;
+    let activeStream = null;  // AbortController for the reply being streamed
 
     // Auto-resize input
     chatInput.addEventListener('input', function() {
@@ -65,34 +66,80 @@ Paste your code here
             formData.append('conversation_id', currentConversationId);
         }
         
+        if (activeStream) {
+            activeStream.abort();
+        }
+        const controller = new AbortController();
+        activeStream = controller;
+        let streamingDiv = null;
+        let reply = '';
+        let started = false;
+
         try {
-            const response = await fetch('/tutor/send_message', {
+            const response = await fetch('/tutor/send_message_stream', {
                 method: 'POST',
-                body: formData
+                body: formData,
+                signal: controller.signal
             });
 
-            const data = await response.json();
-            
             if (!response.ok) {
+                const data = await response.json();
                 throw new Error(data.error || 'Failed to send message');
             }
 
-            if (data.success) {
-                // Reset the form
-                chatInput.value = '';
-                chatInput.style.height = 'auto';  // Reset height
-                fileInput.value = '';  // Clear file input
-                filePreview.textContent = '';  // Clear file preview
-                filePreview.classList.remove('active');  // Hide preview container
-                
-                // Reset any active states
-                codeBtn.classList.remove('active');
-                
-                currentConversationId = data.conversation_id;
-                appendMessages(data.messages);
+            // Read server-sent events as they arrive and render tokens incrementally
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    if (!rawEvent.startsWith('data: ')) continue;
+                    const event = JSON.parse(rawEvent.slice(6));
+
+                    if (event.type === 'start') {
+                        started = true;
+                        // Reset the form
+                        chatInput.value = '';
+                        chatInput.style.height = 'auto';  // Reset height
+                        fileInput.value = '';  // Clear file input
+                        filePreview.textContent = '';  // Clear file preview
+                        filePreview.classList.remove('active');  // Hide preview container
+                        
+                        // Reset any active states
+                        codeBtn.classList.remove('active');
+
+                        appendMessages([{ role: 'user', content: event.message }]);
+                        streamingDiv = createStreamingMessage(event.model);
+                    } else if (event.type === 'token') {
+                        reply += event.content;
+                        streamingDiv.querySelector('.message-content').textContent = reply;
+                        chatMessages.scrollTop = chatMessages.scrollHeight;
+                    } else if (event.type === 'done') {
+                        currentConversationId = event.conversation_id;
+                        // The conversation moved to the top of the sidebar (or is new)
+                        reloadHistory();
+                        // Swap the plain-text preview for the fully rendered message
+                        streamingDiv.remove();
+                        streamingDiv = null;
+                        appendMessages([{ id: event.message_id, role: 'assistant', content: reply, model: event.model }]);
+                    } else if (event.type === 'error') {
+                        throw new Error(event.error);
+                    }
+                }
             }
         } catch (error) {
+            if (error.name === 'AbortError') return;
             console.error('Error:', error);
+            if (streamingDiv && !reply) {
+                streamingDiv.remove();
+            }
             // Create and show an error message to the user
             const errorDiv = document.createElement('div');
             errorDiv.className = 'alert alert-danger';
@@ -100,30 +147,137 @@ Paste your code here
             chatMessages.appendChild(errorDiv);
             
             // Don't reset the form on error so user can try again
-            chatInput.value = message;
+            if (!started) {
+                chatInput.value = message;
+            }
+        } finally {
+            if (activeStream === controller) {
+                activeStream = null;
+            }
+        }
+    });
+
+    function createStreamingMessage(model) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message assistant streaming';
+        messageDiv.innerHTML = `
+            <div class="model-indicator">${model || 'GPT-3.5'}</div>
+            <div class="message-content"></div>
+        `;
+        chatMessages.appendChild(messageDiv);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageDiv;
+    }
+
+    // Chat history sidebar, loaded a page at a time as it is scrolled
+    const chatHistory = document.getElementById('chat-history');
+    let historyCursor = null;
+    let historyExhausted = false;
+    let historyLoading = false;
+
+    async function loadHistoryPage() {
+        if (historyLoading || historyExhausted) return;
+        historyLoading = true;
+        try {
+            const params = new URLSearchParams();
+            if (historyCursor) params.set('cursor', historyCursor);
+            const response = await fetch(`/tutor/conversations?${params}`);
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Failed to load chat history');
+
+            data.conversations.forEach(chat => {
+                const item = document.createElement('div');
+                item.className = 'history-item';
+                item.dataset.conversationId = chat.id;
+                item.innerHTML = `
+                    <span class="history-title"></span>
+                    <span class="history-date"></span>
+                `;
+                item.querySelector('.history-title').textContent = chat.title;
+                item.querySelector('.history-date').textContent = chat.date;
+                chatHistory.appendChild(item);
+            });
+            historyCursor = data.next_cursor;
+            historyExhausted = !historyCursor;
+        } catch (error) {
+            console.error('Error:', error);
+        } finally {
+            historyLoading = false;
+        }
+        // Keep loading until the sidebar can scroll, so the scroll handler has something to react to
+        if (!historyExhausted && chatHistory.scrollHeight <= chatHistory.clientHeight) {
+            loadHistoryPage();
+        }
+    }
+
+    function reloadHistory() {
+        chatHistory.innerHTML = '';
+        historyCursor = null;
+        historyExhausted = false;
+        loadHistoryPage();
+    }
+
+    chatHistory.addEventListener('scroll', function() {
+        if (chatHistory.scrollTop + chatHistory.clientHeight >= chatHistory.scrollHeight - 100) {
+            loadHistoryPage();
+        }
+    });
+
+    // Messages of the open conversation, newest page first; older pages load on scroll-up
+    let olderCursor = null;
+    let olderLoading = false;
+
+    async function loadConversationPage(conversationId, before) {
+        const params = new URLSearchParams();
+        if (before) params.set('before', before);
+        const response = await fetch(`/tutor/get_conversation/${conversationId}?${params}`);
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || 'Failed to load conversation');
+        return data;
+    }
+
+    chatMessages.addEventListener('scroll', async function() {
+        if (chatMessages.scrollTop > 100 || !olderCursor || olderLoading || !currentConversationId) return;
+        olderLoading = true;
+        const conversationId = currentConversationId;
+        try {
+            const data = await loadConversationPage(conversationId, olderCursor);
+            // Ignore the page if another conversation was opened meanwhile
+            if (conversationId !== currentConversationId) return;
+            olderCursor = data.before;
+            appendMessages(data.messages, true);
+        } catch (error) {
+            console.error('Error:', error);
+        } finally {
+            olderLoading = false;
         }
     });
 
     // Handle chat history clicks
-    document.querySelectorAll('.history-item').forEach(item => {
-        item.addEventListener('click', async function() {
-            const conversationId = this.dataset.conversationId;
-            try {
-                const response = await fetch(`/tutor/get_conversation/${conversationId}`);
-                const data = await response.json();
-                currentConversationId = conversationId;
-                chatMessages.innerHTML = '';
-                appendMessages(data.messages);
-            } catch (error) {
-                console.error('Error:', error);
-                alert('Failed to load conversation. Please try again.');
-            }
-        });
+    chatHistory.addEventListener('click', async function(e) {
+        const item = e.target.closest('.history-item');
+        if (!item) return;
+        const conversationId = item.dataset.conversationId;
+        if (activeStream) activeStream.abort();
+        try {
+            const data = await loadConversationPage(conversationId);
+            currentConversationId = conversationId;
+            olderCursor = data.before;
+            chatMessages.innerHTML = '';
+            appendMessages(data.messages);
+        } catch (error) {
+            console.error('Error:', error);
+            alert('Failed to load conversation. Please try again.');
+        }
     });
 
+    loadHistoryPage();
+
     // Add new chat button handler
     document.getElementById('new-chat-btn').addEventListener('click', function() {
+        if (activeStream) activeStream.abort();
         currentConversationId = null;
+        olderCursor = null;
         chatMessages.innerHTML = '';
         chatInput.value = '';
     });
@@ -143,7 +297,8 @@ Paste your code here
         }
     });
 
-    function appendMessages(messages) {
+    function appendMessages(messages, prepend = false) {
+        const fragment = document.createDocumentFragment();
         messages.forEach(message => {
             const messageDiv = document.createElement('div');
             messageDiv.className = `message ${message.role}`;
@@ -196,7 +351,7 @@ Paste your code here
             let feedbackHtml = '';
             if (message.role === 'assistant') {
                 feedbackHtml = `
-                    <div class="feedback-buttons">
+                    <div class="feedback-buttons" data-message-id="${message.id || ''}">
                         <button class="btn btn-sm btn-outline-success feedback-btn" data-feedback="understood">
                             I understand ✓
                         </button>
@@ -214,17 +369,27 @@ Paste your code here
                 </div>
                 ${feedbackHtml}
             `;
-            chatMessages.appendChild(messageDiv);
+            fragment.appendChild(messageDiv);
         });
-        
-        // Scroll to bottom and initialize syntax highlighting
-        chatMessages.scrollTop = chatMessages.scrollHeight;
-        document.querySelectorAll('pre code').forEach((block) => {
+        const newDivs = Array.from(fragment.children);
+
+        if (prepend) {
+            // Older messages go above the current ones without moving what the student is reading
+            const previousHeight = chatMessages.scrollHeight;
+            chatMessages.insertBefore(fragment, chatMessages.firstChild);
+            chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+        } else {
+            chatMessages.appendChild(fragment);
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        }
+
+        // Initialize syntax highlighting on the new messages only
+        newDivs.forEach(div => div.querySelectorAll('pre code').forEach((block) => {
             hljs.highlightBlock(block);
-        });
+        }));
         
         // Add feedback button handlers
-        document.querySelectorAll('.feedback-btn').forEach(button => {
+        newDivs.forEach(div => div.querySelectorAll('.feedback-btn').forEach(button => {
             button.addEventListener('click', async function() {
                 const messageId = this.closest('.feedback-buttons').dataset.messageId;
                 const feedback = this.dataset.feedback;
@@ -256,7 +421,7 @@ Paste your code here
                     console.error('Error sending feedback:', error);
                 }
             });
-        });
+        }));
     }
 
     function detectTopic(content) {
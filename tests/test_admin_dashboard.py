@@ -0,0 +1,97 @@
+# tests/test_admin_dashboard.py
+from datetime import date, timedelta
+from sqlalchemy import event
+from models import db, StudentProfile, User, UserRole
+from commands import repair_student_profiles
+
+def test_students_are_scoped_searched_sorted_and_paged(app, client, make_user, login):
+    teacher = make_user('teacher1', UserRole.TEACHER)
+    other = make_user('teacher2', UserRole.TEACHER)
+    for username, first_name in (('s1', 'Grace'), ('s2', 'Alan'), ('s3', 'Barbara')):
+        make_user(username, first_name=first_name, profile={'teacher_id': teacher.id})
+    make_user('s4', first_name='Edsger', profile={'teacher_id': other.id})
+    login(teacher)
+
+    data = client.get('/admin/students', query_string={'sort': 'first_name', 'per_page': 2}).get_json()
+    assert [s['first_name'] for s in data['students']] == ['Alan', 'Barbara']
+    assert (data['total'], data['pages']) == (3, 2)
+
+    data = client.get('/admin/students', query_string={'sort': 'first_name', 'per_page': 2, 'page': 2}).get_json()
+    assert [s['first_name'] for s in data['students']] == ['Grace']
+
+    data = client.get('/admin/students', query_string={'sort': 'first_name', 'order': 'desc'}).get_json()
+    assert [s['first_name'] for s in data['students']] == ['Grace', 'Barbara', 'Alan']
+
+    data = client.get('/admin/students', query_string={'q': 'barb'}).get_json()
+    assert [s['email'] for s in data['students']] == ['s3@example.com']
+    assert data['students'][0]['questions_left'] == 20
+
+    assert client.get('/admin/students', query_string={'sort': 'password_hash'}).status_code == 400
+
+def test_questions_left_treats_a_stale_day_as_reset(app, client, make_user, login):
+    teacher = make_user('teacher1', UserRole.TEACHER)
+    yesterday = date.today() - timedelta(days=1)
+    for username, first_name, asked, reset in (('s1', 'Grace', 20, yesterday), ('s2', 'Alan', 15, date.today()),
+                                               ('s3', 'Barbara', 5, date.today())):
+        make_user(username, first_name=first_name, profile={
+            'teacher_id': teacher.id, 'questions_asked_today': asked, 'last_question_reset': reset
+        })
+    login(teacher)
+
+    data = client.get('/admin/students', query_string={'sort': 'questions_left'}).get_json()
+    # Grace used all of yesterday's questions; today she has the full 20
+    assert [(s['first_name'], s['questions_left']) for s in data['students']] == [
+        ('Alan', 5), ('Barbara', 15), ('Grace', 20)
+    ]
+
+def test_student_page_query_count_does_not_grow(app, client, make_user, login):
+    teacher = make_user('teacher1', UserRole.TEACHER)
+    for number in range(30):
+        make_user(f's{number}', first_name=f'Student {number}', profile={'teacher_id': teacher.id})
+    login(teacher)
+    client.get('/admin/students')  # Warm up the login and mapper configuration
+
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        data = client.get('/admin/students', query_string={'per_page': 30}).get_json()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    assert len(data['students']) == 30
+    # Loading the teacher, counting and one joined page of students with profiles
+    assert len([s for s in statements if 'student_profiles' in s]) == 2
+
+def test_dashboard_is_read_only_and_teacher_only(app, client, make_user, login):
+    teacher = make_user('teacher1', UserRole.TEACHER)
+    student = make_user('loose')
+    login(teacher)
+    assert client.get('/admin/dashboard').status_code == 200
+    assert db.session.get(StudentProfile, student.id) is None
+
+    login(student)
+    assert client.get('/admin/students').status_code == 403
+
+def test_create_student_records_the_teacher(app, client, make_user, login):
+    teacher = make_user('teacher1', UserRole.TEACHER)
+    login(teacher)
+    client.post('/admin/create_student', data={
+        'email': 'new@example.com', 'firstName': 'New', 'lastName': 'Student', 'password': 'password123'
+    })
+    student = User.query.filter_by(email='new@example.com').one()
+    assert student.student_profile.teacher_id == teacher.id
+
+def test_repair_student_profiles(app, runner, make_user):
+    teacher = make_user('teacher1', UserRole.TEACHER)
+    missing = make_user('loose')
+    unowned = make_user('unowned', first_name='Orphan', profile={})
+    db.session.commit()
+
+    result = runner.invoke(repair_student_profiles, ['--assign-teacher', 'teacher1'])
+    assert result.exit_code == 0, result.output
+    assert 'Done: 1 profiles created, 1 students assigned' in result.output
+    assert db.session.get(StudentProfile, missing.id).teacher_id == teacher.id
+    assert db.session.get(StudentProfile, unowned.id).teacher_id == teacher.id
+
+    assert runner.invoke(repair_student_profiles, ['--assign-teacher', 'nobody']).exit_code != 0
@@ -0,0 +1,71 @@
+# tests/test_analytics.py
+import pytest
+from models import db, StudentDailyStats, StudentModelUsage, UserRole
+from commands import backfill_analytics
+import routes.tutor_routes as tutor_routes
+from utils.llm import FakeBackend, set_backend
+
+@pytest.fixture
+def classroom(app, client, make_user, login, monkeypatch):
+    set_backend(FakeBackend())
+    # Stored counts let follow-up turns build their history without tiktoken's encoding files
+    monkeypatch.setattr(tutor_routes, 'message_token_count', lambda content: len(content.split()))
+    teacher = make_user('teacher1', UserRole.TEACHER).id
+    student = make_user('student1', profile={'teacher_id': teacher}).id
+
+    login(student)
+    first = client.post('/tutor/send_message', data={'message': 'What is a loop?'}).get_json()
+    client.post('/tutor/send_message', data={'message': 'Why use one?', 'conversation_id': first['conversation_id']})
+    client.post('/tutor/send_message', data={'message': 'What is a class?'})
+    for understood in (True, False):
+        client.post('/tutor/interaction_feedback', json={'understood_concept': understood, 'topic': 'loops'})
+    login(teacher)
+    yield teacher, student
+    set_backend(None)
+
+def _rollups():
+    return (
+        sorted((row.user_id, row.day, row.questions, row.conversations, row.tokens, row.feedback, row.understood)
+               for row in StudentDailyStats.query),
+        sorted((row.user_id, row.day, row.model, row.replies, row.tokens) for row in StudentModelUsage.query)
+    )
+
+def test_turns_and_feedback_update_the_rollups(app, client, classroom):
+    teacher, student = classroom
+    data = client.get('/admin/analytics/class').get_json()
+    totals = data['totals']
+    assert (totals['questions'], totals['conversations'], totals['turns_per_conversation']) == (3, 2, 1.5)
+    assert (totals['feedback'], totals['understood_rate']) == (2, 0.5)
+    assert totals['tokens'] > 0
+    assert data['models']['gpt-3.5-turbo']['replies'] == 3
+    assert len(data['days']) == 1
+    assert [(row['id'], row['questions']) for row in data['students']] == [(student, 3)]
+
+    assert client.get(f'/admin/analytics/students/{student}').get_json()['totals'] == totals
+
+def test_backfill_rebuilds_the_same_rollups(app, runner, classroom):
+    incremental = _rollups()
+    db.session.query(StudentDailyStats).delete()
+    db.session.query(StudentModelUsage).delete()
+    db.session.commit()
+
+    result = runner.invoke(backfill_analytics)
+    assert result.exit_code == 0, result.output
+    assert _rollups() == incremental
+
+    # Re-running replaces rather than adds
+    runner.invoke(backfill_analytics)
+    assert _rollups() == incremental
+
+def test_reports_are_scoped_and_validated(app, client, make_user, login, classroom):
+    teacher, student = classroom
+    other = make_user('student2', profile={}).id
+
+    assert client.get(f'/admin/analytics/students/{other}').status_code == 404
+    assert client.get('/admin/analytics/class', query_string={'start': '2024-02-01', 'end': '2024-01-01'}).status_code == 400
+    assert client.get('/admin/analytics/class', query_string={'start': '2020-01-01', 'end': '2024-01-01'}).status_code == 400
+    empty = client.get('/admin/analytics/class', query_string={'start': '2024-01-01', 'end': '2024-01-31'}).get_json()
+    assert (empty['totals']['questions'], empty['days'], empty['models']) == (0, [], {})
+
+    login(student)
+    assert client.get('/admin/analytics/class').status_code == 403
@@ -0,0 +1,71 @@
+# tests/test_ann_index.py
+import numpy as np
+from utils.ann_index import IVFIndex
+from utils.vector_index import VectorIndex
+
+def _clustered(n=4000, dim=32, clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.arange(n), vectors, vectors[rng.choice(n, 50, replace=False)]
+
+def _recall(index, exact, queries, k=5, **kwargs):
+    hits = 0
+    for query in queries:
+        truth = {item_id for item_id, _ in exact.search(query, k)}
+        hits += len(truth & {item_id for item_id, _ in index.search(query, k, **kwargs)})
+    return hits / (len(queries) * k)
+
+def test_ivf_recall_against_exact_search():
+    ids, vectors, queries = _clustered()
+    exact = VectorIndex()
+    exact.build(ids, vectors)
+    index = IVFIndex(nlist=32, nprobe=4)
+    index.build(ids, vectors)
+
+    assert _recall(index, exact, queries) >= 0.9
+    # Probing every list is an exhaustive search
+    assert _recall(index, exact, queries, nprobe=32) == 1.0
+
+def test_ivf_incremental_updates():
+    ids, vectors, _ = _clustered(n=500)
+    index = IVFIndex(nlist=8, nprobe=8)
+    index.build(ids[:400], vectors[:400])
+
+    for item_id, vector in zip(ids[400:], vectors[400:]):
+        index.upsert(int(item_id), vector)
+    assert len(index) == 500
+    assert index.search(vectors[450], 1)[0][0] == 450
+
+    assert index.remove(450)
+    assert not index.remove(450)
+    assert 450 not in index
+    assert index.search(vectors[450], 1)[0][0] != 450
+
+def test_untrained_index_is_exact_until_retrained():
+    ids, vectors, _ = _clustered(n=300)
+    index = IVFIndex(nlist=8)
+    for item_id, vector in zip(ids, vectors):
+        index.upsert(int(item_id), vector)
+    assert index.centroids is None
+    assert index.search(vectors[7], 1)[0][0] == 7
+    assert index.needs_retrain()
+
+    index.retrain()
+    assert index.centroids.shape == (8, 32)
+    assert len(index) == 300
+    assert not index.needs_retrain()
+
+def test_ivf_save_and_load_round_trip(tmp_path):
+    ids, vectors, queries = _clustered(n=600)
+    index = IVFIndex(nlist=16, nprobe=3)
+    index.build(ids, vectors)
+    path = str(tmp_path / 'index.npz')
+    index.save(path, model='test-model', last_embedding_id=42)
+
+    loaded, metadata = IVFIndex.load(path)
+    assert metadata == {'model': 'test-model', 'last_embedding_id': 42}
+    assert len(loaded) == 600 and loaded.nprobe == 3
+    for query in queries[:10]:
+        assert loaded.search(query, 5) == index.search(query, 5)
@@ -0,0 +1,127 @@
+# tests/test_blob_store.py
+import io
+import os
+import pytest
+from flask import g
+from models import db, DocumentBlob, KnowledgeBaseEntry, KnowledgeDocument, UserRole
+from utils.chunking import Chunk
+from utils.llm import FakeBackend, set_backend
+import utils.blob_store as blob_store
+import utils.embeddings as embeddings
+import utils.jobs as jobs
+
+@pytest.fixture
+def knowledge(app, monkeypatch, tmp_path):
+    set_backend(FakeBackend())
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    # Chunking needs tiktoken's encoding files; split on blank lines instead
+    monkeypatch.setattr(embeddings, 'split_entry', lambda entry: [
+        Chunk(index, piece, len(piece.split())) for index, piece in enumerate(entry.content.split('\n\n'))
+    ])
+    embedded = []
+    create_embeddings = embeddings.create_embeddings
+
+    def recording(texts, *args):
+        embedded.extend(texts)
+        return create_embeddings(texts, *args)
+
+    monkeypatch.setattr(embeddings, 'create_embeddings', recording)
+    yield embedded
+    set_backend(None)
+
+def _upload(client, filename, content):
+    response = client.post('/knowledge/add', headers={'Accept': 'application/json'}, data={
+        'title': 'Syllabus', 'category': 'course', 'entry_type': 'document',
+        'document': (io.BytesIO(content), filename)
+    }, content_type='multipart/form-data')
+    assert response.status_code == 202
+    jobs.run_pending('test-worker')
+    g.pop('_login_user', None)  # run_pending expunged the cached user
+    return response.get_json()['entry_id']
+
+def test_identical_uploads_share_one_blob(app, client, make_user, login, knowledge):
+    content = b'Week one covers loops.\n\nWeek two covers functions.'
+    login(make_user('teacher1', UserRole.TEACHER))
+    first = _upload(client, 'syllabus.txt', content)
+    assert len(knowledge) == 2
+
+    login(make_user('teacher2', UserRole.TEACHER))
+    second = _upload(client, 'handout.txt', content)
+    # Same text, same title: the stored embeddings are reused
+    assert len(knowledge) == 2
+
+    blob = DocumentBlob.query.one()
+    assert blob.extracted_text == content.decode()
+    assert blob.ref_count == 2
+    assert sorted(document.filename for document in KnowledgeDocument.query) == ['handout.txt', 'syllabus.txt']
+    assert db.session.get(KnowledgeBaseEntry, second).content == content.decode()
+    assert len(db.session.get(KnowledgeBaseEntry, second).chunks) == 2
+
+    # The file goes away with the last entry that refers to it
+    path = blob.path
+    client.post(f'/knowledge/delete/{first}')
+    assert os.path.exists(path)
+    g.pop('_login_user', None)
+    client.post(f'/knowledge/delete/{second}')
+    assert not os.path.exists(path)
+    assert DocumentBlob.query.count() == 0
+
+def test_concurrent_first_uploads_share_one_row(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    add_reference = blob_store._add_reference
+    raced = []
+
+    def late_reference(sha256):
+        # The first lookup misses, then another upload inserts the row before ours
+        if not raced:
+            raced.append(sha256)
+            db.session.add(DocumentBlob(sha256=sha256, size=5, document_type='txt',
+                                        path=blob_store.blob_path(sha256, 'txt'), ref_count=1))
+            db.session.commit()
+            return 0
+        return add_reference(sha256)
+
+    monkeypatch.setattr(blob_store, '_add_reference', late_reference)
+    blob = blob_store.store_upload(io.BytesIO(b'loops'), 'txt')
+    db.session.commit()
+    assert DocumentBlob.query.one() is blob
+    assert blob.ref_count == 2
+    assert open(blob.path, 'rb').read() == b'loops'
+
+def test_blob_is_removed_with_its_last_reference(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    blob = blob_store.store_upload(io.BytesIO(b'loops'), 'txt')
+    blob_store.store_upload(io.BytesIO(b'loops'), 'txt')
+    db.session.commit()
+    blob_id, path = blob.id, blob.path
+
+    assert blob_store.release_blob(blob_id) is None
+    assert os.path.exists(path)
+    assert blob_store.release_blob(blob_id) == path
+    assert not os.path.exists(path)
+    assert DocumentBlob.query.count() == 0
+    # A repeated release finds nothing left to drop
+    assert blob_store.release_blob(blob_id) is None
+
+def test_different_uploads_with_the_same_name_do_not_collide(app, client, make_user, login, knowledge):
+    login(make_user('teacher1', UserRole.TEACHER))
+    first = _upload(client, 'syllabus.txt', b'Loops repeat code.')
+    second = _upload(client, 'syllabus.txt', b'Functions group code.')
+
+    first_path = db.session.get(KnowledgeBaseEntry, first).document_path
+    second_path = db.session.get(KnowledgeBaseEntry, second).document_path
+    assert first_path != second_path
+    assert open(first_path).read() == 'Loops repeat code.'
+    assert open(second_path).read() == 'Functions group code.'
+
+def test_only_new_chunks_are_embedded(app, knowledge):
+    entry = KnowledgeBaseEntry(title='Notes', content='Loops repeat code.\n\nFunctions group code.',
+                               category='python', tags=[], entry_type='text')
+    db.session.add(entry)
+    db.session.flush()
+    embeddings.update_entry_embedding(entry)
+
+    entry.content = 'Loops repeat code.\n\nClasses bundle data.'
+    embeddings.update_entry_embedding(entry)
+    assert knowledge == ['Notes\nLoops repeat code.', 'Notes\nFunctions group code.', 'Notes\nClasses bundle data.']
+    assert [len(chunk.embeddings) for chunk in entry.chunks] == [1, 1]
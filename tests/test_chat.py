@@ -0,0 +1,156 @@
+# tests/test_chat.py
+import pytest
+from datetime import datetime, timedelta, timezone
+from models import Conversation, Job, JobStatus, Message, SenderType, db, User, UserRole
+from werkzeug.security import generate_password_hash
+import commands
+import utils.chat as chat
+import utils.jobs as jobs
+import utils.tokens as tokens
+from utils.llm import FakeBackend, set_backend
+
+def _conversation(turns):
+    user = User(
+        username='chatty',
+        email='chatty@example.com',
+        password_hash=generate_password_hash('password123'),
+        role=UserRole.STUDENT
+    )
+    db.session.add(user)
+    db.session.flush()
+    conversation = Conversation(user_id=user.id)
+    db.session.add(conversation)
+    db.session.flush()
+    start = datetime.now(timezone.utc)
+    for turn in range(turns):
+        db.session.add_all([
+            Message(conversation_id=conversation.id, sender_type=SenderType.STUDENT, sender_id=user.id,
+                    message_content=f'question {turn}', token_count=5, timestamp=start + timedelta(seconds=2 * turn)),
+            Message(conversation_id=conversation.id, sender_type=SenderType.AI_TUTOR,
+                    message_content=f'answer {turn}', token_count=5, timestamp=start + timedelta(seconds=2 * turn + 1))
+        ])
+    db.session.commit()
+    return conversation
+
+def test_context_fits_budget_without_summary(app, monkeypatch):
+    monkeypatch.setattr(chat, 'create_summary', lambda *args: 'should not be called')
+    conversation = _conversation(3)
+
+    messages = chat.build_context(conversation, 'system prompt', max_tokens=100)
+    assert [m['content'] for m in messages] == ['system prompt', 'question 0', 'answer 0', 'question 1',
+                                                'answer 1', 'question 2', 'answer 2']
+    assert conversation.summary is None
+
+def test_overflow_is_summarized_incrementally(app, monkeypatch):
+    calls = []
+
+    def fake_summary(messages, previous_summary=None):
+        calls.append(([m.message_content for m in messages], previous_summary))
+        return f'summary {len(calls)}'
+
+    monkeypatch.setattr(chat, 'create_summary', fake_summary)
+    conversation = _conversation(6)  # 12 messages of 10 prompt tokens each
+    conversation_id = conversation.id
+
+    messages = chat.build_context(conversation, 'system prompt', max_tokens=100)
+    # Trimmed to half the budget, starting on a student turn, without waiting for the summary
+    assert calls == []
+    assert [m['content'] for m in messages[1:]] == ['question 4', 'answer 4', 'question 5', 'answer 5']
+    # Later turns do not queue the same summary again
+    chat.build_context(conversation, 'system prompt', max_tokens=100)
+    assert Job.query.filter_by(kind=chat.SUMMARIZE_CONVERSATION).count() == 1
+
+    assert jobs.run_pending('test-worker') == 1
+    assert calls == [(['question 0', 'answer 0', 'question 1', 'answer 1',
+                       'question 2', 'answer 2', 'question 3', 'answer 3'], None)]
+    conversation = db.session.get(Conversation, conversation_id)  # run_pending expunged it
+    assert conversation.summary == 'summary 1'
+
+    # The next turn fits again, so nothing is re-summarized
+    messages = chat.build_context(conversation, 'system prompt', max_tokens=100)
+    assert messages[1]['content'] == 'Summary of the earlier conversation:\nsummary 1'
+    assert [m['content'] for m in messages[2:]] == ['question 4', 'answer 4', 'question 5', 'answer 5']
+    assert jobs.run_pending('test-worker') == 0
+
+    # Another overflow only sends the newly dropped messages plus the previous summary
+    start = conversation.messages[-1].timestamp
+    for turn in range(6, 10):
+        db.session.add_all([
+            Message(conversation_id=conversation.id, sender_type=SenderType.STUDENT,
+                    message_content=f'question {turn}', token_count=5, timestamp=start + timedelta(seconds=2 * turn)),
+            Message(conversation_id=conversation.id, sender_type=SenderType.AI_TUTOR,
+                    message_content=f'answer {turn}', token_count=5, timestamp=start + timedelta(seconds=2 * turn + 1))
+        ])
+    db.session.commit()
+    chat.build_context(conversation, 'system prompt', max_tokens=100)
+    assert jobs.run_pending('test-worker') == 1
+    assert len(calls) == 2
+    assert calls[1][1] == 'summary 1'
+    assert calls[1][0][0] == 'question 4'
+
+def test_summary_failure_still_truncates(app, monkeypatch):
+    def failing_summary(messages, previous_summary=None):
+        raise RuntimeError('API down')
+
+    monkeypatch.setattr(chat, 'create_summary', failing_summary)
+    monkeypatch.setitem(app.config, 'JOB_RETRY_DELAY', 0)
+    conversation_id = _conversation(6).id
+
+    messages = chat.build_context(db.session.get(Conversation, conversation_id), 'system prompt', max_tokens=100)
+    jobs.run_pending('test-worker')
+    assert Job.query.one().status == JobStatus.FAILED
+    conversation = db.session.get(Conversation, conversation_id)
+    assert conversation.summary is None and conversation.summary_through_id is None
+    assert [m['content'] for m in messages[1:]] == ['question 4', 'answer 4', 'question 5', 'answer 5']
+
+def test_turns_continue_without_the_tokenizer(app, client, make_user, login, monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise OSError('encoding files could not be downloaded')
+
+    monkeypatch.setattr(chat, 'count_text_tokens', unavailable)
+    monkeypatch.setattr(chat, 'get_encoding', unavailable)
+    set_backend(FakeBackend())
+    try:
+        login(make_user('student1'))
+        first = client.post('/tutor/send_message', data={'message': 'What is a loop?'})
+        assert first.status_code == 200, first.get_json()
+        conversation_id = first.get_json()['conversation_id']
+        second = client.post('/tutor/send_message', data={'message': 'Why use one?',
+                                                          'conversation_id': conversation_id})
+        assert second.status_code == 200, second.get_json()
+    finally:
+        set_backend(None)
+    assert [msg.token_count for msg in db.session.get(Conversation, conversation_id).messages] == [None] * 4
+
+    # Uncounted messages are sized from their length
+    assert chat.message_tokens(Message(sender_type=SenderType.STUDENT, message_content='x' * 40)) == 15
+
+def test_tokenizer_failure_is_not_retried(monkeypatch):
+    calls = []
+    def offline(model):
+        calls.append(model)
+        raise OSError('encoding files could not be downloaded')
+
+    monkeypatch.setattr(tokens.tiktoken, 'encoding_for_model', offline)
+    monkeypatch.setattr(tokens, '_unavailable', {})
+    tokens._load_encoding.cache_clear()
+    try:
+        for _ in range(3):
+            with pytest.raises(Exception):
+                tokens.count_text_tokens('hello', model='offline-model')
+    finally:
+        tokens._load_encoding.cache_clear()
+    assert calls == ['offline-model']
+
+def test_backfill_token_counts(app, runner, monkeypatch):
+    monkeypatch.setattr(commands, 'count_text_tokens', lambda text: len(text.split()))
+    conversation = _conversation(3)
+    for msg in conversation.messages[:4]:
+        msg.token_count = None
+    db.session.commit()
+
+    result = runner.invoke(args=['backfill-token-counts', '--batch-size', '3'])
+    assert result.exit_code == 0, result.output
+    assert 'Done: 4 messages counted' in result.output
+    db.session.expire_all()
+    assert [msg.token_count for msg in conversation.messages] == [2, 2, 2, 2, 5, 5]
@@ -0,0 +1,40 @@
+# tests/test_chunking.py
+import pytest
+from utils.chunking import chunk_text
+from utils.tokens import count_text_tokens, get_encoding
+
+def _tokenizer_available():
+    try:
+        get_encoding("text-embedding-ada-002")
+        return True
+    except Exception:
+        return False
+
+pytestmark = pytest.mark.skipif(not _tokenizer_available(), reason="tiktoken encoding files unavailable")
+
+TEXT = "\n\n".join(
+    f"Chapter {p}. " + " ".join(f"Sentence {p}.{i} explains how Python loops repeat work." for i in range(20))
+    for p in range(5)
+)
+
+def test_chunks_respect_token_budget():
+    chunks = chunk_text(TEXT, max_tokens=120, overlap=20)
+    assert len(chunks) > 1
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    assert all(chunk.token_count <= 120 for chunk in chunks)
+    assert all(count_text_tokens(chunk.content, "text-embedding-ada-002") <= 120 for chunk in chunks)
+
+def test_chunks_overlap_and_cover_text():
+    chunks = chunk_text(TEXT, max_tokens=120, overlap=20)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.content.split()[-1] in current.content
+    assert "Sentence 4.19" in chunks[-1].content
+
+def test_short_and_empty_text():
+    assert [chunk.content for chunk in chunk_text("What is a for loop?")] == ["What is a for loop?"]
+    assert chunk_text("") == []
+
+def test_unbroken_text_is_split_on_tokens():
+    chunks = chunk_text("x" * 20000, max_tokens=100, overlap=10)
+    assert len(chunks) > 1
+    assert all(chunk.token_count <= 100 for chunk in chunks)
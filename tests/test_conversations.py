@@ -0,0 +1,96 @@
+# tests/test_conversations.py
+from datetime import datetime, timedelta, timezone
+import pytest
+from models import db, Conversation, Message, SenderType
+from commands import backfill_conversation_stats
+import routes.tutor_routes as tutor_routes
+from utils.llm import FakeBackend, set_backend
+
+@pytest.fixture
+def student(make_user, login):
+    set_backend(FakeBackend())
+    user = make_user('student1')
+    login(user)
+    yield user
+    set_backend(None)
+
+def test_saved_turns_update_conversation_summary(app, client, student, monkeypatch):
+    # Stored counts let the follow-up turn build its history without tiktoken's encoding files
+    monkeypatch.setattr(tutor_routes, 'message_token_count', lambda content: len(content.split()))
+    first = client.post('/tutor/send_message', data={'message': 'How do while loops know when to stop?'}).get_json()
+    client.post('/tutor/send_message', data={'message': 'And for loops?', 'conversation_id': first['conversation_id']})
+
+    conversation = db.session.get(Conversation, first['conversation_id'])
+    db.session.refresh(conversation)
+    assert conversation.title == 'How do while loops know when t...'
+    assert conversation.message_count == 4
+    assert conversation.last_message_at is not None
+
+def test_sidebar_pages_through_conversations_by_recent_activity(app, client, student):
+    now = datetime.now(timezone.utc)
+    # Two conversations share a timestamp to exercise the id tie-break
+    for offset in (5, 1, 3, 3, 2):
+        db.session.add(Conversation(user_id=student.id, title=f'chat {offset}', message_count=2,
+                                    last_message_at=now - timedelta(minutes=offset)))
+    db.session.commit()
+
+    pages = []
+    cursor = None
+    while True:
+        data = client.get('/tutor/conversations', query_string={'limit': 2, 'cursor': cursor or ''}).get_json()
+        pages.append([chat['title'] for chat in data['conversations']])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert pages == [['chat 1', 'chat 2'], ['chat 3', 'chat 3'], ['chat 5']]
+
+    assert client.get('/tutor/conversations', query_string={'cursor': 'not-a-cursor'}).status_code == 400
+
+def test_backfill_conversation_stats(app, runner, student):
+    conversation = Conversation(user_id=student.id)
+    db.session.add(conversation)
+    db.session.flush()
+    # As left by upgrade-db: the new columns are NULL on existing rows
+    Conversation.query.filter_by(id=conversation.id).update({'last_message_at': None, 'message_count': None})
+    start = datetime(2024, 1, 1, 12, 0)
+    db.session.add_all([
+        Message(conversation_id=conversation.id, sender_type=SenderType.STUDENT, sender_id=student.id,
+                message_content='What is recursion, really?', timestamp=start),
+        Message(conversation_id=conversation.id, sender_type=SenderType.AI_TUTOR,
+                message_content='What happens when a function calls itself?', timestamp=start + timedelta(seconds=5))
+    ])
+    db.session.commit()
+
+    result = runner.invoke(backfill_conversation_stats)
+    assert result.exit_code == 0, result.output
+
+    db.session.refresh(conversation)
+    assert (conversation.title, conversation.message_count) == ('What is recursion, really?...', 2)
+    assert conversation.last_message_at == start + timedelta(seconds=5)
+
+def test_get_conversation_pages_backwards_from_latest(app, client, make_user, student):
+    conversation = Conversation(user_id=student.id)
+    db.session.add(conversation)
+    db.session.flush()
+    for number in range(1, 8):
+        db.session.add(Message(conversation_id=conversation.id, sender_type=SenderType.STUDENT,
+                               sender_id=student.id, message_content=f'message {number}'))
+    db.session.commit()
+
+    pages = []
+    before = None
+    while True:
+        data = client.get(f'/tutor/get_conversation/{conversation.id}',
+                          query_string={'limit': 3, 'before': before or ''}).get_json()
+        pages.append([message['content'][-1] for message in data['messages']])
+        before = data['before']
+        if before is None:
+            break
+    assert pages == [['5', '6', '7'], ['2', '3', '4'], ['1']]
+
+    other = make_user('student2')
+    theirs = Conversation(user_id=other.id)
+    db.session.add(theirs)
+    db.session.commit()
+    assert client.get(f'/tutor/get_conversation/{theirs.id}').status_code == 403
+    assert client.get('/tutor/get_conversation/9999').status_code == 404
@@ -0,0 +1,48 @@
+# tests/test_document_processor.py
+from docx import Document
+from PyPDF2 import PdfReader
+from benchmarks.pdf_extraction import synthetic_textbook
+from utils.document_processor import DocumentProcessor, ExtractionBudget
+
+def _pdf(tmp_path, pages):
+    path = str(tmp_path / 'textbook.pdf')
+    synthetic_textbook(path, pages, lines_per_page=3)
+    return path
+
+def test_pdf_pages_are_streamed_in_order(tmp_path):
+    path = _pdf(tmp_path, 5)
+    expected = [page.extract_text() for page in PdfReader(path).pages]
+
+    assert list(DocumentProcessor.iter_pdf_pages(path)) == expected
+    text, doc_type = DocumentProcessor.process_path(path)
+    assert (text, doc_type) == (''.join(f'{page}\n' for page in expected), 'pdf')
+
+def test_parallel_extraction_matches_sequential(tmp_path):
+    path = _pdf(tmp_path, 70)
+    sequential, _ = DocumentProcessor.process_path(path)
+    parallel, _ = DocumentProcessor.process_path(path, workers=2, parallel_min_pages=1)
+    assert parallel == sequential
+
+def test_budget_truncates_extraction(tmp_path):
+    path = _pdf(tmp_path, 5)
+
+    budget = ExtractionBudget(max_pages=2)
+    assert len(list(DocumentProcessor.iter_pdf_pages(path, budget))) == 2
+    assert budget.truncated
+
+    budget = ExtractionBudget(max_seconds=0)
+    assert list(DocumentProcessor.iter_pdf_pages(path, budget)) == []
+    assert budget.truncated
+
+    budget = ExtractionBudget(max_pages=10, max_seconds=60)
+    assert len(list(DocumentProcessor.iter_pdf_pages(path, budget))) == 5
+    assert not budget.truncated
+
+def test_docx_paragraphs_are_joined(tmp_path):
+    path = str(tmp_path / 'notes.docx')
+    doc = Document()
+    for text in ('Loops', 'repeat', 'code'):
+        doc.add_paragraph(text)
+    doc.save(path)
+
+    assert DocumentProcessor.process_path(path) == ('Loops\nrepeat\ncode\n', 'docx')
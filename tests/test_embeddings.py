@@ -0,0 +1,231 @@
+# tests/test_embeddings.py
+import json
+import threading
+import time
+import numpy as np
+import pytest
+from sqlalchemy import inspect, text
+from models import db, KnowledgeBaseEntry, KnowledgeChunk, KnowledgeEmbedding
+from utils.embedding_cache import EmbeddingCache
+from utils.embeddings import pack_embedding, unpack_embedding, load_knowledge_matrix, store_chunk_embedding
+from utils.tokens import get_encoding
+
+def _tokenizer_available():
+    try:
+        get_encoding("text-embedding-ada-002")
+        return True
+    except Exception:
+        return False
+
+requires_tokenizer = pytest.mark.skipif(not _tokenizer_available(), reason="tiktoken encoding files unavailable")
+
+def test_pack_round_trip(app):
+    vector = np.linspace(-1, 1, 1536)
+    packed, dimension, dtype = pack_embedding(vector, 'float32')
+    assert dimension == 1536 and dtype == 'float32'
+    assert len(packed) == 1536 * 4
+    assert np.allclose(unpack_embedding(packed, dtype), vector, atol=1e-7)
+
+    half, _, _ = pack_embedding(vector, 'float16')
+    assert len(half) == 1536 * 2
+    assert np.allclose(unpack_embedding(half, 'float16'), vector, atol=1e-3)
+
+def test_store_replaces_existing_embedding(app):
+    entry = KnowledgeBaseEntry(title='Loops', content='for and while')
+    chunk = KnowledgeChunk(chunk_index=0, content='for and while', token_count=3)
+    entry.chunks.append(chunk)
+    db.session.add(entry)
+    db.session.flush()
+    store_chunk_embedding(chunk, [1.0, 0.0], model='test-model')
+    db.session.commit()
+    store_chunk_embedding(chunk, [0.0, 1.0], model='test-model')
+    db.session.commit()
+
+    assert KnowledgeEmbedding.query.count() == 1
+    ids, matrix = load_knowledge_matrix('test-model')
+    assert ids == [chunk.id]
+    assert matrix.tolist() == [[0.0, 1.0]]
+
+    db.session.delete(entry)
+    db.session.commit()
+    assert KnowledgeChunk.query.count() == 0
+    assert KnowledgeEmbedding.query.count() == 0
+
+@requires_tokenizer
+def test_migrate_embeddings_converts_json_rows(app, runner):
+    db.session.execute(text('ALTER TABLE knowledge_base ADD COLUMN embedding JSON'))
+    db.session.execute(
+        text("INSERT INTO knowledge_base (id, title, content, entry_type, embedding) "
+             "VALUES (1, 'a', 'a', 'text', :first), (2, 'b', 'b', 'text', NULL)"),
+        {'first': json.dumps([0.5, 0.25, 0.125])}
+    )
+    db.session.commit()
+
+    result = runner.invoke(args=['migrate-embeddings', '--model', 'legacy-model'])
+    assert result.exit_code == 0, result.output
+
+    ids, matrix = load_knowledge_matrix('legacy-model')
+    chunk = KnowledgeChunk.query.one()
+    assert chunk.entry_id == 1 and chunk.content == 'a'
+    assert ids == [chunk.id]
+    assert matrix.tolist() == [[0.5, 0.25, 0.125]]
+    columns = {column['name'] for column in inspect(db.engine).get_columns('knowledge_base')}
+    assert 'embedding' not in columns
+
+def test_embedding_cache_lru_and_normalization():
+    calls = []
+    def compute(text):
+        calls.append(text)
+        return np.array([float(len(text)), 1.0])
+
+    cache = EmbeddingCache(max_size=2)
+    cache.get('What is a  for loop?', 'm', compute)
+    cache.get('what is a for loop?', 'm', compute)
+    assert calls == ['what is a for loop?']
+
+    cache.get('b', 'm', compute)
+    cache.get('c', 'm', compute)  # Evicts the loop question
+    cache.get('what is a for loop?', 'm', compute)
+    assert len(calls) == 4
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 4
+
+def test_embedding_cache_coalesces_concurrent_misses():
+    release = threading.Event()
+    calls = []
+    def compute(text):
+        calls.append(text)
+        release.wait(5)
+        return np.array([1.0, 2.0])
+
+    cache = EmbeddingCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('same question', 'm', compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8 and all(r.tolist() == [1.0, 2.0] for r in results)
+
+def test_embedding_cache_persistent_tier(app):
+    first = EmbeddingCache(persistent=True)
+    first.get('shared question', 'm', lambda text: np.array([0.5, 0.5]))
+
+    # A fresh worker finds the vector in the table instead of calling compute
+    second = EmbeddingCache(persistent=True)
+    vector = second.get('shared question', 'm', lambda text: pytest.fail('should not recompute'))
+    assert vector.tolist() == [0.5, 0.5]
+    assert second.stats()['persistent_hits'] == 1
+
+def _make_chunks(count):
+    entry = KnowledgeBaseEntry(title='Textbook', content='...')
+    for index in range(count):
+        entry.chunks.append(KnowledgeChunk(chunk_index=index, content=f'page {index}', token_count=2))
+    db.session.add(entry)
+    db.session.commit()
+    return [chunk.id for chunk in entry.chunks]
+
+def test_reembed_writes_every_chunk_in_batches(app, runner, monkeypatch, tmp_path):
+    chunk_ids = _make_chunks(7)
+    calls = []
+    def fake_create_embeddings(texts, model, batch_size):
+        calls.append(len(texts))
+        return [np.array([float(text.split()[-1]), 1.0]) for text in texts]
+    monkeypatch.setattr('commands.create_embeddings', fake_create_embeddings)
+
+    checkpoint = tmp_path / 'reembed.json'
+    result = runner.invoke(args=['reembed', '--model', 'new-model', '--batch-size', '3',
+                                 '--concurrency', '2', '--checkpoint', str(checkpoint)])
+    assert result.exit_code == 0, result.output
+    assert calls == [3, 3, 1]
+    ids, matrix = load_knowledge_matrix('new-model')
+    assert ids == chunk_ids
+    assert matrix[:, 0].tolist() == [float(i) for i in range(7)]
+    assert not checkpoint.exists()
+
+def test_reembed_resumes_from_checkpoint(app, runner, monkeypatch, tmp_path):
+    chunk_ids = _make_chunks(6)
+    seen = []
+    def flaky_create_embeddings(texts, model, batch_size):
+        seen.extend(texts)
+        if 'page 4' in texts[0]:
+            raise RuntimeError('rate limited')
+        return [np.array([1.0, 0.0]) for _ in texts]
+    monkeypatch.setattr('commands.create_embeddings', flaky_create_embeddings)
+
+    checkpoint = tmp_path / 'reembed.json'
+    args = ['reembed', '--model', 'new-model', '--batch-size', '2', '--concurrency', '1', '--checkpoint', str(checkpoint)]
+    result = runner.invoke(args=args)
+    assert result.exit_code != 0
+    assert json.loads(checkpoint.read_text())['last_chunk_id'] == chunk_ids[3]
+    assert KnowledgeEmbedding.query.count() == 4
+
+    monkeypatch.setattr('commands.create_embeddings',
+                        lambda texts, model, batch_size: [np.array([1.0, 0.0]) for _ in texts])
+    result = runner.invoke(args=args)
+    assert result.exit_code == 0, result.output
+    assert 'Resuming after chunk' in result.output
+    assert KnowledgeEmbedding.query.count() == 6
+
+@pytest.mark.parametrize('index_kind', ['exact', 'ivf'])
+def test_knowledge_index_syncs_with_table(app, index_kind, tmp_path):
+    from utils.embeddings import KnowledgeIndex
+    app.config.update(KNOWLEDGE_INDEX=index_kind, KNOWLEDGE_INDEX_NLIST=2,
+                      KNOWLEDGE_INDEX_PATH=str(tmp_path / 'index.npz'), EMBEDDING_MODEL='test-model')
+    try:
+        entry = KnowledgeBaseEntry(title='Loops', content='...')
+        for index in range(3):
+            entry.chunks.append(KnowledgeChunk(chunk_index=index, content=f'part {index}', token_count=2))
+        db.session.add(entry)
+        db.session.flush()
+        for index, chunk in enumerate(entry.chunks):
+            store_chunk_embedding(chunk, [float(index == 0), float(index == 1), float(index == 2)])
+        db.session.commit()
+
+        knowledge_index = KnowledgeIndex()
+        assert len(knowledge_index.get()) == 3
+
+        # Replace one vector and delete another chunk; the next get() applies both
+        first, second, third = entry.chunks
+        store_chunk_embedding(first, [0.0, 0.0, 5.0])
+        entry.chunks.remove(second)
+        db.session.commit()
+
+        index = knowledge_index.get()
+        assert sorted(index.ids().tolist()) == [first.id, third.id]
+        assert index.search([0.0, 0.0, 1.0], 1)[0][0] == first.id
+
+        if index_kind == 'ivf':
+            # A fresh worker resumes from the persisted file
+            assert (tmp_path / 'index.npz').exists()
+            assert len(KnowledgeIndex().get()) == 2
+    finally:
+        app.config.update(KNOWLEDGE_INDEX='exact', KNOWLEDGE_INDEX_PATH=None,
+                          EMBEDDING_MODEL='text-embedding-ada-002')
+
+def test_removed_chunks_leave_the_index_without_a_sync(app):
+    from utils.embeddings import KnowledgeIndex
+    app.config.update(EMBEDDING_MODEL='test-model')
+    try:
+        entry = KnowledgeBaseEntry(title='Loops', content='...')
+        for index in range(3):
+            entry.chunks.append(KnowledgeChunk(chunk_index=index, content=f'part {index}', token_count=2))
+        db.session.add(entry)
+        db.session.flush()
+        for index, chunk in enumerate(entry.chunks):
+            store_chunk_embedding(chunk, [float(index == 0), float(index == 1), float(index == 2)])
+        db.session.commit()
+
+        knowledge_index = KnowledgeIndex()
+        index = knowledge_index.get()
+        first, second, third = [chunk.id for chunk in entry.chunks]
+        knowledge_index.remove([second, 999])
+        assert sorted(index.ids().tolist()) == [first, third]
+    finally:
+        app.config.update(EMBEDDING_MODEL='text-embedding-ada-002')
@@ -0,0 +1,117 @@
+# tests/test_feedback.py
+import json
+import threading
+import pytest
+from models import db, FeedbackEvent, Message, SenderType, StudentProfile, TopicProficiency
+from commands import backfill_topic_proficiency
+from utils.feedback import record_feedback
+from utils.llm import FakeBackend, set_backend
+
+@pytest.fixture
+def student(make_user):
+    return make_user('student1', profile={'total_questions': 0, 'successful_interactions': 0,
+                                          'consecutive_successes': 0, 'consecutive_failures': 0}).id
+
+def _profile(user_id):
+    profile = db.session.get(StudentProfile, user_id)
+    db.session.refresh(profile)
+    return profile
+
+def test_feedback_is_logged_and_counted(app, client, login, student):
+    login(student)
+    for understood in (True, True, False):
+        response = client.post('/tutor/interaction_feedback', json={
+            'message_id': '7', 'was_helpful': True, 'understood_concept': understood, 'topic': 'Loops'
+        })
+        assert response.status_code == 200
+
+    profile = _profile(student)
+    assert (profile.total_questions, profile.successful_interactions) == (3, 2)
+    assert (profile.consecutive_successes, profile.consecutive_failures) == (0, 1)
+    topic = db.session.get(TopicProficiency, (student, 'loops'))
+    assert (topic.attempts, topic.successes) == (3, 2)
+    assert [(event.message_id, event.understood) for event in FeedbackEvent.query.order_by(FeedbackEvent.id)] == [
+        (7, True), (7, True), (7, False)
+    ]
+
+def test_feedback_without_a_message_id(app, client, login, student):
+    login(student)
+    # The page sends a blank id for replies it has no id for
+    response = client.post('/tutor/interaction_feedback', json={
+        'message_id': '', 'was_helpful': True, 'understood_concept': True
+    })
+    assert response.status_code == 200
+    assert [event.message_id for event in FeedbackEvent.query] == [None]
+
+def test_feedback_links_to_the_streamed_reply(app, client, login, student):
+    set_backend(FakeBackend())
+    try:
+        login(student)
+        response = client.post('/tutor/send_message_stream', data={'message': 'What is a list?'})
+        events = [json.loads(line[6:]) for line in response.get_data(as_text=True).split('\n\n') if line]
+    finally:
+        set_backend(None)
+    done = events[-1]
+    assert done['type'] == 'done'
+    reply = db.session.get(Message, done['message_id'])
+    assert (reply.conversation_id, reply.sender_type) == (done['conversation_id'], SenderType.AI_TUTOR)
+
+    response = client.post('/tutor/interaction_feedback', json={
+        'message_id': done['message_id'], 'was_helpful': True, 'understood_concept': False
+    })
+    assert response.status_code == 200
+    assert [event.message_id for event in FeedbackEvent.query] == [done['message_id']]
+
+def test_skill_level_follows_the_profile_rules(app, student):
+    levels = []
+    for _ in range(5):
+        record_feedback(student, understood=True)
+        levels.append(_profile(student).skill_level)
+    assert levels == ['beginner', 'beginner', 'intermediate', 'intermediate', 'advanced']
+
+    record_feedback(student, understood=False)
+    profile = _profile(student)
+    assert profile.skill_level == 'beginner'
+    # The SQL expression and update_skill_level agree
+    profile.update_skill_level()
+    assert profile.skill_level == 'beginner'
+
+def test_concurrent_feedback_loses_no_updates(app, student):
+    workers = 10
+    barrier = threading.Barrier(workers)
+    errors = []
+
+    def click(number):
+        with app.app_context():
+            barrier.wait()
+            try:
+                record_feedback(student, understood=number % 2 == 0, topic='functions')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=click, args=(number,)) for number in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert _profile(student).total_questions == workers
+    topic = db.session.get(TopicProficiency, (student, 'functions'))
+    assert (topic.attempts, topic.successes) == (workers, workers // 2)
+    assert FeedbackEvent.query.count() == workers
+
+def test_backfill_topic_proficiency(app, runner, student):
+    StudentProfile.query.filter_by(user_id=student).update({'topic_proficiency': {
+        'loops': {'attempts': 4, 'successes': 3}, 'classes': {'attempts': 1, 'successes': 0}
+    }})
+    db.session.add(TopicProficiency(user_id=student, topic='loops', attempts=9, successes=9))
+    db.session.commit()
+
+    for _ in range(2):
+        result = runner.invoke(backfill_topic_proficiency)
+        assert result.exit_code == 0, result.output
+    rows = {row.topic: (row.attempts, row.successes) for row in TopicProficiency.query}
+    assert rows == {'loops': (9, 9), 'classes': (1, 0)}
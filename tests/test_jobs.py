@@ -0,0 +1,120 @@
+# tests/test_jobs.py
+from datetime import datetime, timedelta, timezone
+import pytest
+from flask import g
+from models import db, Job, JobStatus, KnowledgeBaseEntry, UserRole
+from utils.chunking import Chunk
+from utils.ingest import INGEST_KNOWLEDGE
+from utils.llm import FakeBackend, set_backend
+import utils.embeddings as embeddings
+import utils.jobs as jobs
+
+@pytest.fixture
+def fake_llm(app, monkeypatch):
+    set_backend(FakeBackend())
+    # Chunking needs tiktoken's encoding files; split on blank lines instead
+    monkeypatch.setattr(embeddings, 'split_entry', lambda entry: [
+        Chunk(index, piece, len(piece.split())) for index, piece in enumerate(entry.content.split('\n\n'))
+    ])
+    app.config['JOB_RETRY_DELAY'] = 0
+    yield
+    set_backend(None)
+
+def _entry(content='Loops repeat code.\n\nFunctions group code.'):
+    entry = KnowledgeBaseEntry(title='Basics', content=content, category='python', tags=[], entry_type='text')
+    db.session.add(entry)
+    db.session.flush()
+    return entry
+
+def test_ingest_job_chunks_and_embeds_entry(app, fake_llm):
+    entry = _entry()
+    job_id = jobs.enqueue(INGEST_KNOWLEDGE, entry_id=entry.id).id
+    entry_id = entry.id
+    db.session.commit()
+
+    assert jobs.run_pending('test-worker') == 1
+    job = db.session.get(Job, job_id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert (job.progress, job.attempts, job.message) == (1.0, 1, 'Indexed 2 chunks')
+    entry = db.session.get(KnowledgeBaseEntry, entry_id)
+    assert [len(chunk.embeddings) for chunk in entry.chunks] == [1, 1]
+
+def test_failed_job_is_retried_then_marked_failed(app, fake_llm):
+    calls = []
+
+    @jobs.job_handler('flaky')
+    def flaky(job):
+        calls.append(job.attempts)
+        raise RuntimeError('boom')
+
+    job_id = jobs.enqueue('flaky', max_attempts=2).id
+    db.session.commit()
+
+    assert jobs.run_pending('test-worker') == 2
+    job = db.session.get(Job, job_id)
+    assert calls == [1, 2]
+    assert job.status == JobStatus.FAILED
+    assert job.error == 'boom'
+    assert job.locked_by is None
+
+def test_stale_running_job_is_reclaimed(app, fake_llm):
+    entry = _entry()
+    job = jobs.enqueue(INGEST_KNOWLEDGE, entry_id=entry.id)
+    job.status = JobStatus.RUNNING
+    job.locked_by = 'dead-worker'
+    job.locked_at = datetime.now(timezone.utc)
+    db.session.commit()
+
+    # A live lock is left alone
+    assert jobs.claim_next('test-worker') is None
+
+    job.locked_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    db.session.commit()
+    claimed = jobs.claim_next('test-worker')
+    assert (claimed.id, claimed.locked_by, claimed.attempts) == (job.id, 'test-worker', 1)
+
+def test_stale_running_job_is_reclaimed_under_load(app, fake_llm):
+    @jobs.job_handler('busy')
+    def busy(job):
+        # Every job queues another, so the queue is never empty
+        jobs.enqueue('busy')
+
+    jobs.enqueue('busy')
+    orphan = jobs.enqueue('busy')
+    orphan.status = JobStatus.RUNNING
+    orphan.locked_by = 'dead-worker'
+    orphan.locked_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    orphan_id = orphan.id
+    db.session.commit()
+
+    claimed = []
+    for _ in range(3):
+        job = jobs.claim_next('test-worker')
+        claimed.append(job.id)
+        jobs.run_job(job)
+    # Its lock expired before the queued job became runnable, so it goes first
+    assert claimed[0] == orphan_id
+    assert db.session.get(Job, orphan_id).status == JobStatus.SUCCEEDED
+    assert Job.query.filter_by(status=JobStatus.QUEUED).count() == 2
+
+def test_deleted_entry_job_succeeds_without_work(app, fake_llm):
+    job_id = jobs.enqueue(INGEST_KNOWLEDGE, entry_id=None).id
+    db.session.commit()
+
+    jobs.run_pending('test-worker')
+    assert db.session.get(Job, job_id).status == JobStatus.SUCCEEDED
+
+def test_add_entry_returns_job_for_polling(app, client, make_user, login, fake_llm):
+    login(make_user('teacher1', UserRole.TEACHER))
+
+    response = client.post('/knowledge/add', headers={'Accept': 'application/json'}, data={
+        'title': 'Loops', 'category': 'python', 'entry_type': 'text', 'content': 'Loops repeat code.'
+    })
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert client.get(f'/knowledge/jobs/{job_id}').get_json()['status'] == 'queued'
+
+    jobs.run_pending('test-worker')
+    g.pop('_login_user', None)  # run_pending expunged the cached user
+    status = client.get(f'/knowledge/jobs/{job_id}').get_json()
+    assert (status['status'], status['progress']) == ('succeeded', 1.0)
@@ -0,0 +1,91 @@
+# tests/test_llm.py
+import json
+import types
+import openai
+import pytest
+from models import Conversation, Message, SenderType, StudentProfile, db
+from utils.llm import FakeBackend, chat_completion, embed_texts, set_backend
+
+@pytest.fixture
+def fake_llm(app):
+    app.config['LLM_RETRY_BASE_DELAY'] = 0
+    backend = FakeBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(None)
+
+@pytest.fixture
+def student_client(client, make_user, login):
+    login(make_user('student1'))
+    return client
+
+def _api_error(error_class, status):
+    response = types.SimpleNamespace(status_code=status, headers={}, request=None)
+    return error_class('error', response=response, body=None)
+
+class FlakyBackend(FakeBackend):
+    def __init__(self, errors):
+        super().__init__(reply='ok')
+        self.errors = list(errors)
+
+    def chat(self, messages, model, max_tokens=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().chat(messages, model, max_tokens)
+
+def test_retries_rate_limits_and_server_errors(fake_llm):
+    backend = FlakyBackend([_api_error(openai.RateLimitError, 429), _api_error(openai.InternalServerError, 503)])
+    set_backend(backend)
+    assert chat_completion([{'role': 'user', 'content': 'hi'}], model='gpt-3.5-turbo') == 'ok'
+    assert backend.calls == [('chat', 'gpt-3.5-turbo')]
+
+def test_client_errors_are_not_retried(fake_llm):
+    backend = FlakyBackend([_api_error(openai.BadRequestError, 400)])
+    set_backend(backend)
+    with pytest.raises(openai.BadRequestError):
+        chat_completion([{'role': 'user', 'content': 'hi'}], model='gpt-3.5-turbo')
+    assert backend.errors == []
+
+def test_fake_embeddings_are_deterministic(fake_llm):
+    first, second, again = embed_texts(['loops', 'functions', 'loops'], model='test-model')
+    assert first == again and first != second
+    assert abs(sum(value * value for value in first) - 1.0) < 1e-9
+
+def test_send_message_uses_gateway(fake_llm, student_client):
+    response = student_client.post('/tutor/send_message', data={'message': 'Why does my loop never end?'})
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()
+    assert data['messages'][1]['content'].startswith('What do you think happens here')
+    assert ('chat', 'gpt-3.5-turbo') in fake_llm.calls
+    assert Message.query.filter_by(conversation_id=data['conversation_id']).count() == 2
+
+def test_send_message_stream_persists_reply(fake_llm, student_client):
+    response = student_client.post('/tutor/send_message_stream', data={'message': 'What is a list?'})
+    events = [json.loads(line[6:]) for line in response.get_data(as_text=True).split('\n\n') if line]
+    assert [event['type'] for event in events][0] == 'start'
+    assert events[-1]['type'] == 'done'
+
+    reply = ''.join(event['content'] for event in events if event['type'] == 'token')
+    conversation = db.session.get(Conversation, events[-1]['conversation_id'])
+    assert [m.message_content for m in conversation.messages] == ['What is a list?', reply]
+    assert conversation.messages[1].sender_type == SenderType.AI_TUTOR
+
+def test_aborted_stream_keeps_the_partial_reply(fake_llm, student_client):
+    set_backend(FakeBackend(reply='Think about what the loop condition checks'))
+    response = student_client.post('/tutor/send_message_stream', data={'message': 'Why does it loop?'},
+                                   buffered=False)
+    chunks = iter(response.response)
+    seen = []
+    while len(seen) < 3:
+        seen.extend(json.loads(line[6:]) for line in next(chunks).decode().split('\n\n') if line)
+    # The student hits stop after two tokens
+    response.close()
+
+    assert [event['type'] for event in seen[:3]] == ['start', 'token', 'token']
+    messages = Message.query.order_by(Message.id).all()
+    assert [(m.sender_type, m.message_content) for m in messages] == [
+        (SenderType.STUDENT, 'Why does it loop?'),
+        (SenderType.AI_TUTOR, 'Think about ')
+    ]
+    # Part of a reply reached the student, so the question stays used
+    assert db.session.get(StudentProfile, messages[0].sender_id).questions_asked_today == 1
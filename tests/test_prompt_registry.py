@@ -0,0 +1,53 @@
+# tests/test_prompt_registry.py
+import os
+from types import SimpleNamespace
+from models import db, PromptCustomization, ReadingLevel
+from utils.adaptive_prompt import AdaptivePromptManager
+from utils.prompt_registry import PromptRegistry, SOCRATIC_REMINDERS
+
+def _profile(skill_level='beginner', reading_level=ReadingLevel.G6, consecutive_failures=0):
+    return SimpleNamespace(skill_level=skill_level, reading_level=reading_level,
+                           consecutive_failures=consecutive_failures)
+
+def test_variants_match_adaptive_prompt(app, tmp_path):
+    path = tmp_path / 'prompt.md'
+    path.write_text('Base prompt.')
+    registry = PromptRegistry('socratic', str(path), check_interval=60)
+
+    for profile in (_profile(), _profile('advanced', ReadingLevel.K, 4), _profile('intermediate', ReadingLevel.G9)):
+        expected = AdaptivePromptManager(_profile(profile.skill_level, profile.reading_level.value,
+                                                  profile.consecutive_failures))
+        prompt = registry.get(profile)
+        assert prompt == expected.generate_adaptive_prompt('Base prompt.') + '\n\n' + SOCRATIC_REMINDERS
+        assert registry.get(profile) is prompt
+
+    assert len(registry._variants) == 3 * len(ReadingLevel) * 2
+
+def test_file_change_recompiles(app, tmp_path):
+    path = tmp_path / 'prompt.md'
+    path.write_text('First version.')
+    registry = PromptRegistry('socratic', str(path), check_interval=0)
+    assert registry.get(_profile()).startswith('First version.')
+
+    path.write_text('Second version.')
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert registry.get(_profile()).startswith('Second version.')
+
+def test_active_row_overrides_file_and_invalidates(app, tmp_path):
+    path = tmp_path / 'prompt.md'
+    path.write_text('From file.')
+    registry = PromptRegistry('socratic', str(path), check_interval=0)
+
+    row = PromptCustomization(prompt_name='socratic', prompt_text='From database.')
+    db.session.add(row)
+    db.session.commit()
+    assert registry.get(_profile()).startswith('From database.')
+
+    row.prompt_text = 'Edited in database.'
+    db.session.commit()
+    assert registry.get(_profile()).startswith('Edited in database.')
+
+    row.is_active = False
+    db.session.commit()
+    assert registry.get(_profile()).startswith('From file.')
@@ -0,0 +1,105 @@
+# tests/test_query_plans.py
+"""EXPLAIN QUERY PLAN checks for the hot queries.
+
+Each case runs a query the app issues on a hot path, through the same helper
+the app calls where there is one, captures the SQL that reached SQLite and fails if its plan scans a whole table (SCAN) or sorts in a
+temporary B-tree instead of reading rows in index order. Add a case here when
+adding a query that runs per request.
+"""
+from datetime import date, datetime, timezone
+import pytest
+from sqlalchemy import event, or_, and_, select
+from models import (db, AuditLog, Conversation, DocumentBlob, KnowledgeChunk, KnowledgeDocument,
+                    KnowledgeEmbedding, Message, StudentProfile, TopicProficiency, User, UserRole)
+from routes.admin_routes import student_page, student_query
+from utils.analytics import report
+from utils.chat import build_history, summary_queued
+from utils.history import HistoryPage
+from utils.jobs import claim_next
+from utils.pagination import encode_cursor
+from utils.response_cache import ResponseCache
+from utils.roster_import import ImportReport, RosterRow, _drop_duplicates
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+HOT_QUERIES = {
+    # Conversation.messages and build_history
+    'messages by conversation in time order': lambda: Message.query
+        .filter_by(conversation_id=1).order_by(Message.timestamp).all(),
+    'message page before cursor': lambda: db.session.query(Message.id, Message.message_content)
+        .filter(Message.conversation_id == 1, Message.id < 100).order_by(Message.id.desc()).limit(51).all(),
+    'history after the summary': lambda: build_history(Conversation(id=1, summary_through_id=100), 100),
+    'pending summary jobs': lambda: summary_queued(1),
+    # Sidebar and history pages
+    'sidebar keyset page': lambda: db.session.query(Conversation.id, Conversation.title)
+        .filter(Conversation.user_id == 1, or_(
+            Conversation.last_message_at < NOW,
+            and_(Conversation.last_message_at == NOW, Conversation.id < 10)
+        ))
+        .order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).limit(21).all(),
+    'conversations by creation': lambda: Conversation.query
+        .filter_by(user_id=1).order_by(Conversation.created_at.desc()).all(),
+    'history keyset page': lambda: list(HistoryPage(1, 20, 5, encode_cursor(NOW.isoformat(), 10),
+                                                    start=date(2024, 1, 1))),
+    'conversations by last update': lambda: Conversation.query
+        .filter_by(user_id=1).order_by(Conversation.updated_at.desc()).all(),
+    # Admin dashboard
+    'students of a teacher': lambda: StudentProfile.query.filter_by(teacher_id=1).all(),
+    'student table page': lambda: student_page(student_query(1, 'ada'), 'last_name', False, 2, 25).all(),
+    'users by role': lambda: User.query.filter_by(role=UserRole.STUDENT).all(),
+    'roster duplicate check': lambda: _drop_duplicates(
+        [RosterRow(1, 'Ada', 'Lovelace', 'ada@example.com', 'secret')], set(), ImportReport()),
+    'audit log of a user': lambda: AuditLog.query
+        .filter_by(user_id=1).order_by(AuditLog.timestamp.desc()).all(),
+    # Analytics rollups and feedback
+    'class analytics report': lambda: report(
+        select(StudentProfile.user_id).where(StudentProfile.teacher_id == 1),
+        date(2024, 1, 1), date(2024, 1, 30), per_student=True),
+    'student analytics report': lambda: report([1], date(2024, 1, 1), date(2024, 1, 30)),
+    'topic proficiency row': lambda: db.session.get(TopicProficiency, (1, 'loops')),
+    # Background jobs and knowledge base
+    'job to claim': lambda: claim_next('plan-worker'),
+    'chunks by content hash': lambda: db.session.query(KnowledgeChunk.id)
+        .filter(KnowledgeChunk.content_hash.in_(['a' * 64, 'b' * 64])).all(),
+    'embeddings of a chunk': lambda: KnowledgeEmbedding.query.filter_by(chunk_id=1).all(),
+    'blob by hash': lambda: DocumentBlob.query.filter_by(sha256='a' * 64).first(),
+    'documents sharing a blob': lambda: KnowledgeDocument.query.filter_by(blob_id=1).first(),
+    'response cache partition': lambda: ResponseCache().lookup([1.0, 0.0], 'gpt-3.5-turbo', 'beginner', '6'),
+}
+
+# Queries over rows already narrowed by an index to one class (its students, or them over
+# a range of days); sorting that bounded set to group or order it is expected
+BOUNDED_AGGREGATES = {'class analytics report', 'student analytics report', 'student table page'}
+
+def query_plans(run):
+    """Run a callable and return the EXPLAIN QUERY PLAN details of every SELECT it issued."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    with db.engine.connect() as conn:
+        return [(statement, [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)])
+                for statement, parameters in statements]
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(app, name):
+    if db.engine.dialect.name != 'sqlite':
+        pytest.skip('EXPLAIN QUERY PLAN output is SQLite specific')
+
+    plans = query_plans(HOT_QUERIES[name])
+    assert plans, f'{name} issued no SELECT'
+    for statement, details in plans:
+        # Reading back a subquery's own (already limited) rows is not a table scan
+        subqueries = {detail.split()[-1] for detail in details if detail.startswith(('CO-ROUTINE', 'MATERIALIZE'))}
+        problems = [detail for detail in details
+                    if detail.startswith('SCAN') and detail.split()[1] not in subqueries
+                    or 'TEMP B-TREE' in detail and name not in BOUNDED_AGGREGATES]
+        assert not problems, f'{name} is not served by an index: {problems}\n{statement}'
@@ -0,0 +1,116 @@
+# tests/test_question_quota.py
+import json
+import threading
+from datetime import date, timedelta
+import pytest
+from models import db, StudentProfile
+import routes.tutor_routes as tutor_routes
+from utils.llm import FakeBackend, set_backend
+
+@pytest.fixture
+def backend():
+    backend = FakeBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(None)
+
+def _profile(user_id):
+    profile = db.session.get(StudentProfile, user_id)
+    db.session.refresh(profile)
+    return profile
+
+def test_send_message_stops_at_the_daily_limit(app, client, make_user, login, backend):
+    user_id = make_user('student1', profile={'daily_question_limit': 2}).id
+    login(user_id)
+    for number in range(2):
+        assert client.post('/tutor/send_message', data={'message': f'Question {number}?'}).status_code == 200
+
+    response = client.post('/tutor/send_message', data={'message': 'One more?'})
+    assert response.status_code == 429
+    assert response.get_json()['limit_reached'] is True
+    assert client.post('/tutor/send_message_stream', data={'message': 'One more?'}).status_code == 429
+    # Refused before any model call: two questions, each one retrieval embedding and one reply
+    assert len(backend.calls) == 4
+    assert _profile(user_id).questions_asked_today == 2
+
+def test_a_new_day_resets_the_count(app, client, make_user, login, backend):
+    user_id = make_user('student1', profile={'daily_question_limit': 2, 'questions_asked_today': 2,
+                                              'last_question_reset': date.today() - timedelta(days=1)}).id
+    assert _profile(user_id).can_ask_question()
+    login(user_id)
+    assert client.post('/tutor/send_message', data={'message': 'Good morning?'}).status_code == 200
+
+    profile = _profile(user_id)
+    assert (profile.questions_asked_today, profile.last_question_reset) == (1, date.today())
+
+def test_failed_model_call_refunds_the_question(app, client, make_user, login, monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise RuntimeError('service unavailable')
+
+    monkeypatch.setattr(tutor_routes, 'chat_completion', unavailable)
+    user_id = make_user('student1', profile={'daily_question_limit': 2}).id
+    login(user_id)
+    assert client.post('/tutor/send_message', data={'message': 'Hello?'}).status_code == 500
+    assert _profile(user_id).questions_asked_today == 0
+
+def _raise(*args, **kwargs):
+    raise RuntimeError('unavailable')
+
+def _events(response):
+    return [json.loads(line[6:]) for line in response.get_data(as_text=True).split('\n\n') if line]
+
+@pytest.mark.parametrize('endpoint', ['/tutor/send_message', '/tutor/send_message_stream'])
+def test_failed_turn_preparation_refunds_the_question(app, client, make_user, login, backend, monkeypatch, endpoint):
+    monkeypatch.setattr(tutor_routes, 'prepare_turn', _raise)
+    user_id = make_user('student1', profile={'daily_question_limit': 2}).id
+    login(user_id)
+    assert client.post(endpoint, data={'message': 'Hello?'}).status_code == 500
+    assert _profile(user_id).questions_asked_today == 0
+
+def test_stream_failing_before_its_first_token_refunds_the_question(app, client, make_user, login, backend, monkeypatch):
+    def broken_stream(*args, **kwargs):
+        yield from ()
+        raise RuntimeError('connection reset')
+
+    monkeypatch.setattr(tutor_routes, 'stream_chat_completion', broken_stream)
+    user_id = make_user('student1', profile={'daily_question_limit': 2}).id
+    login(user_id)
+    events = _events(client.post('/tutor/send_message_stream', data={'message': 'Hello?'}))
+    assert [event['type'] for event in events] == ['start', 'error']
+    assert _profile(user_id).questions_asked_today == 0
+
+@pytest.mark.parametrize('endpoint', ['/tutor/send_message', '/tutor/send_message_stream'])
+def test_failed_save_after_a_reply_keeps_the_question(app, client, make_user, login, backend, monkeypatch, endpoint):
+    # The model has already answered, so the question was used
+    monkeypatch.setattr(tutor_routes, 'save_turn', _raise)
+    user_id = make_user('student1', profile={'daily_question_limit': 2}).id
+    login(user_id)
+    client.post(endpoint, data={'message': 'Hello?'}).get_data()
+    assert any(method in ('chat', 'stream_chat') for method, model in backend.calls)
+    assert _profile(user_id).questions_asked_today == 1
+
+def test_concurrent_requests_are_not_over_admitted(app, make_user):
+    user_id = make_user('student1', profile={'daily_question_limit': 5}).id
+    workers = 20
+    barrier = threading.Barrier(workers)
+    admitted = []
+
+    def ask():
+        # Each thread has its own app context, so its own session and connection,
+        # like requests in separate gunicorn workers
+        with app.app_context():
+            profile = db.session.get(StudentProfile, user_id)
+            db.session.commit()  # Hand the connection back; the pool has fewer than there are threads
+            barrier.wait()
+            admitted.append(profile.increment_question_count())
+            db.session.remove()
+
+    threads = [threading.Thread(target=ask) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert admitted.count(True) == 5
+    assert len(admitted) == workers
+    assert _profile(user_id).questions_asked_today == 5
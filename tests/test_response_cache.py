@@ -0,0 +1,86 @@
+# tests/test_response_cache.py
+import numpy as np
+import pytest
+from models import db, ResponseCacheEntry, UserRole
+from utils.llm import FakeBackend, set_backend
+from utils.response_cache import ResponseCache
+
+def test_lookup_matches_similar_questions_within_partition(app):
+    cache = ResponseCache(threshold=0.9)
+    question = np.array([1.0, 0.0, 0.0])
+    cache.store('What is a loop?', question, 'What do you think repeats?', 'gpt-3.5-turbo', 'beginner', '6')
+
+    assert cache.lookup([0.98, 0.1, 0.0], 'gpt-3.5-turbo', 'beginner', '6') == 'What do you think repeats?'
+    assert cache.lookup([0.0, 1.0, 0.0], 'gpt-3.5-turbo', 'beginner', '6') is None
+    assert cache.lookup(question, 'gpt-3.5-turbo', 'advanced', '6') is None
+    assert cache.lookup(question, 'gpt-4o-mini', 'beginner', '6') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 3, 1)
+    assert db.session.query(ResponseCacheEntry.hits).scalar() == 1
+
+def test_expired_entries_are_ignored(app):
+    cache = ResponseCache(threshold=0.9, ttl=-1)
+    cache.store('q', [1.0, 0.0], 'a', 'gpt-3.5-turbo', 'beginner', '6')
+    assert cache.lookup([1.0, 0.0], 'gpt-3.5-turbo', 'beginner', '6') is None
+
+def test_least_recently_used_entries_are_evicted(app):
+    cache = ResponseCache(threshold=0.9, max_entries=2)
+    cache.store('first', [1.0, 0.0, 0.0], 'one', 'gpt-3.5-turbo', 'beginner', '6')
+    cache.store('second', [0.0, 1.0, 0.0], 'two', 'gpt-3.5-turbo', 'beginner', '6')
+    assert cache.lookup([1.0, 0.0, 0.0], 'gpt-3.5-turbo', 'beginner', '6') == 'one'
+    cache.store('third', [0.0, 0.0, 1.0], 'three', 'gpt-3.5-turbo', 'beginner', '6')
+
+    assert {entry.question for entry in ResponseCacheEntry.query} == {'first', 'third'}
+    assert cache.stats()['evictions'] == 1
+    assert cache.flush() == 2
+
+def test_partitions_keep_their_newest_entries(app):
+    cache = ResponseCache(threshold=0.9, partition_size=2)
+    for n, question in enumerate(['first', 'second', 'third']):
+        cache.store(question, np.eye(3)[n], question, 'gpt-3.5-turbo', 'beginner', '6')
+    cache.store('other', [1.0, 0.0, 0.0], 'other', 'gpt-3.5-turbo', 'advanced', '6')
+
+    assert {entry.question for entry in ResponseCacheEntry.query} == {'second', 'third', 'other'}
+    assert cache.stats()['evictions'] == 1
+    assert cache.lookup([1.0, 0.0, 0.0], 'gpt-3.5-turbo', 'beginner', '6') is None
+    assert cache.lookup([0.0, 0.0, 1.0], 'gpt-3.5-turbo', 'beginner', '6') == 'third'
+
+@pytest.fixture
+def cache_enabled(app):
+    backend = FakeBackend()
+    set_backend(backend)
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    yield backend
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    set_backend(None)
+
+def test_repeated_first_question_is_served_from_cache(app, client, make_user, login, cache_enabled):
+    login(make_user('student1'))
+
+    first = client.post('/tutor/send_message', data={'message': 'How do for loops work?'}).get_json()
+    assert 'cached' not in first
+    chat_calls = [call for call in cache_enabled.calls if call[0] == 'chat']
+
+    second = client.post('/tutor/send_message', data={'message': 'how do  for loops work?'}).get_json()
+    assert second['cached'] is True
+    assert second['messages'][1]['content'] == first['messages'][1]['content']
+    assert second['conversation_id'] != first['conversation_id']
+    assert [call for call in cache_enabled.calls if call[0] == 'chat'] == chat_calls
+
+    # Follow-up turns always go to the model
+    follow_up = client.post('/tutor/send_message', data={
+        'message': 'How do for loops work?',
+        'conversation_id': second['conversation_id']
+    }).get_json()
+    assert 'cached' not in follow_up
+
+def test_teacher_can_flush_cache(app, client, make_user, login, cache_enabled):
+    ResponseCache().store('q', [1.0, 0.0], 'a', 'gpt-3.5-turbo', 'beginner', '6')
+    login(make_user('student1'))
+    assert client.post('/admin/response_cache/flush').status_code == 403
+
+    login(make_user('teacher1', UserRole.TEACHER))
+    response = client.post('/admin/response_cache/flush')
+    assert response.get_json() == {'success': True, 'flushed': 1}
+    assert client.get('/admin/cache_stats').get_json()['response_cache']['entries'] == 0
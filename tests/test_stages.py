@@ -0,0 +1,48 @@
+# tests/test_stages.py
+import threading
+import time
+from flask import current_app
+from utils.llm import FakeBackend, set_backend
+from utils.stages import stage_result, submit_stage
+
+def test_stage_runs_in_app_context(app):
+    future = submit_stage(lambda: current_app.name)
+    assert stage_result(future, timeout=5, default=None, name='name') == app.name
+
+def test_stage_timeout_and_failure_fall_back_to_default(app):
+    release = threading.Event()
+    slow = submit_stage(release.wait, 5)
+    assert stage_result(slow, timeout=0.05, default='fallback', name='slow') == 'fallback'
+    release.set()
+
+    def broken():
+        raise RuntimeError('boom')
+    assert stage_result(submit_stage(broken), timeout=5, default='', name='broken') == ''
+
+class StalledEmbeddings(FakeBackend):
+    """Embedding calls hang until released, then fail."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def embed(self, texts, model):
+        self.release.wait(5)
+        raise RuntimeError('embedding service unavailable')
+
+def test_slow_retrieval_does_not_block_the_turn(app, client, make_user, login):
+    backend = StalledEmbeddings()
+    set_backend(backend)
+    app.config['RETRIEVAL_TIMEOUT'] = 0.1
+    login(make_user('student1'))
+
+    try:
+        started = time.perf_counter()
+        response = client.post('/tutor/send_message', data={'message': 'What is recursion?'})
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.get_json()
+        assert elapsed < 2
+    finally:
+        backend.release.set()
+        set_backend(None)
+        app.config['RETRIEVAL_TIMEOUT'] = 3.0
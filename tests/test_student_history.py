@@ -0,0 +1,70 @@
+# tests/test_student_history.py
+import re
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from models import db, Conversation, Message, SenderType, UserRole
+
+@pytest.fixture
+def student(make_user, login):
+    teacher = make_user('teacher1', UserRole.TEACHER)
+    student = make_user('student1', first_name='Ada', last_name='Lovelace')
+    # One conversation a day from Jan 1st to Jan 7th, three messages each
+    for day in range(1, 8):
+        conversation = Conversation(user_id=student.id, created_at=datetime(2024, 1, day, 9, 0))
+        db.session.add(conversation)
+        db.session.flush()
+        for number in range(3):
+            db.session.add(Message(conversation_id=conversation.id, sender_type=SenderType.STUDENT,
+                                   sender_id=student.id, message_content=f'day {day} message {number}',
+                                   timestamp=datetime(2024, 1, day, 9, number)))
+    db.session.commit()
+    login(teacher)
+    return student
+
+def _days(html):
+    return [int(day) for day in re.findall(r'Conversation from 2024-01-0(\d)', html)]
+
+@pytest.mark.parametrize('url', ['/student/history/{}', '/admin/student/history/{}'])
+def test_history_streams_pages_of_conversations(app, client, student, monkeypatch, url):
+    monkeypatch.setitem(app.config, 'HISTORY_PAGE_SIZE', 3)
+    monkeypatch.setitem(app.config, 'HISTORY_FETCH_SIZE', 2)
+    response = client.get(url.format(student.id))
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert _days(html) == [7, 6, 5]
+    assert 'day 7 message 2' in html
+
+    days = []
+    while True:
+        older = re.search(r'href="([^"]*before=[^"]*)"', html)
+        if not older:
+            break
+        html = client.get(older.group(1).replace('&amp;', '&')).get_data(as_text=True)
+        days.append(_days(html))
+    assert days == [[4, 3, 2], [1]]
+
+def test_history_filters_by_date_range(app, client, student):
+    html = client.get(f'/student/history/{student.id}',
+                      query_string={'start': '2024-01-03', 'end': '2024-01-05'}).get_data(as_text=True)
+    assert _days(html) == [5, 4, 3]
+
+    html = client.get(f'/student/history/{student.id}', query_string={'start': 'January'}).get_data(as_text=True)
+    assert 'YYYY-MM-DD' in html
+    assert _days(html) == [7, 6, 5, 4, 3, 2, 1]
+
+def test_history_query_count_does_not_grow_with_conversations(app, client, student, monkeypatch):
+    monkeypatch.setitem(app.config, 'HISTORY_FETCH_SIZE', 10)
+    client.get(f'/student/history/{student.id}')  # Warm up the login and mapper configuration
+
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        client.get(f'/student/history/{student.id}').get_data()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    # One query for the conversations and one for all of their messages
+    assert len([s for s in statements if 'FROM conversations' in s]) == 1
+    assert len([s for s in statements if 'FROM messages' in s]) == 1
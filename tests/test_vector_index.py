@@ -0,0 +1,55 @@
+# tests/test_vector_index.py
+import numpy as np
+import pytest
+from utils.vector_index import VectorIndex
+
+def test_search_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 32)).astype(np.float32)
+    ids = list(range(1000, 1500))
+    query = rng.standard_normal(32).astype(np.float32)
+
+    index = VectorIndex()
+    index.build(ids, vectors)
+    results = index.search(query, 5)
+
+    expected = np.argsort(-(vectors @ query))[:5]
+    assert [item_id for item_id, _ in results] == [ids[i] for i in expected]
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+def test_upsert_and_remove_keep_index_dense():
+    index = VectorIndex()
+    index.upsert(1, [1.0, 0.0])
+    index.upsert(2, [0.0, 1.0])
+    index.upsert(3, [0.7, 0.7])
+
+    assert index.remove(1)
+    assert not index.remove(1)
+    assert len(index) == 2
+    assert sorted(index.ids().tolist()) == [2, 3]
+
+    # Overwriting an id replaces its vector rather than adding a row
+    index.upsert(2, [1.0, 0.0])
+    assert len(index) == 2
+    assert index.search([1.0, 0.0], 1)[0][0] == 2
+
+def test_grows_past_initial_capacity():
+    index = VectorIndex(capacity=2)
+    for item_id in range(10):
+        index.upsert(item_id, [float(item_id), 1.0])
+    assert len(index) == 10
+    assert index.search([1.0, 0.0], 3) == [(9, 9.0), (8, 8.0), (7, 7.0)]
+
+def test_rejects_mismatched_dimensions():
+    index = VectorIndex()
+    index.upsert(1, [1.0, 0.0, 0.0])
+    with pytest.raises(ValueError):
+        index.upsert(2, [1.0, 0.0])
+    with pytest.raises(ValueError):
+        index.search([1.0, 0.0], 1)
+
+def test_empty_index_returns_no_matches():
+    index = VectorIndex()
+    index.build([], [])
+    assert index.search([1.0, 0.0], 3) == []
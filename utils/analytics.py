@@ -0,0 +1,178 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+from sqlalchemy import case, delete, func, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Conversation, FeedbackEvent, Message, SenderType, StudentDailyStats, StudentModelUsage, User
+
+# Message.model for replies served from the response cache; they cost no tokens
+CACHED_MODEL = 'cache'
+# Rollup model for replies saved before Message.model was recorded
+UNKNOWN_MODEL = 'unknown'
+
+# Longest range a report may cover
+MAX_REPORT_DAYS = 366
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+def increment(model_cls, key: Dict, **deltas) -> None:
+    """Add deltas to the counters of the row with primary key `key`, creating it if needed.
+
+    A relative UPDATE first; if no row exists it is inserted in a savepoint, and
+    if a concurrent request inserted it meanwhile the UPDATE is simply retried.
+    Runs in the caller's transaction.
+    """
+    criteria = [getattr(model_cls, name) == value for name, value in key.items()]
+    values = {name: getattr(model_cls, name) + delta for name, delta in deltas.items()}
+
+    def bump():
+        return db.session.execute(
+            update(model_cls).where(*criteria).values(**values).execution_options(synchronize_session=False)
+        ).rowcount
+
+    if bump():
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(model_cls(**key, **deltas))
+    except IntegrityError:
+        bump()
+
+def record_turn(user_id: int, model: Optional[str], new_conversation: bool, tokens: int) -> None:
+    """Count a saved question and reply in today's rollups. The caller commits."""
+    day = utc_today()
+    model = model or UNKNOWN_MODEL
+    tokens = 0 if model == CACHED_MODEL else tokens
+    increment(StudentDailyStats, {'user_id': user_id, 'day': day},
+              questions=1, conversations=1 if new_conversation else 0, tokens=tokens)
+    increment(StudentModelUsage, {'user_id': user_id, 'day': day, 'model': model}, replies=1, tokens=tokens)
+
+def record_feedback(user_id: int, understood: bool) -> None:
+    """Count a feedback click in today's rollup. The caller commits."""
+    increment(StudentDailyStats, {'user_id': user_id, 'day': utc_today()},
+              feedback=1, understood=1 if understood else 0)
+
+def _day(column):
+    # DATE() of the stored UTC timestamp; SQLite returns text, which the Date type parses
+    return func.date(column, type_=db.Date)
+
+def _in_range(column, start: Optional[date], end: Optional[date]):
+    criteria = []
+    if start:
+        criteria.append(column >= datetime.combine(start, datetime.min.time()))
+    if end:
+        criteria.append(column < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return criteria
+
+def rebuild_rollups(start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Recompute the rollup rows for days in [start, end] (all days by default) from the raw tables.
+
+    Each source is read with one grouped query. Existing rows in the range are
+    replaced, so re-running is safe. Returns the number of student-days written.
+    Commits.
+    """
+    daily = defaultdict(lambda: defaultdict(int))
+    usage = defaultdict(lambda: defaultdict(int))
+
+    model = func.coalesce(Message.model, UNKNOWN_MODEL)
+    tokens = func.sum(case((model == CACHED_MODEL, 0), else_=func.coalesce(Message.token_count, 0)))
+    message_day = _day(Message.timestamp)
+    rows = db.session.query(Conversation.user_id, message_day, Message.sender_type, model,
+                            func.count(Message.id), tokens)\
+        .join(Conversation, Conversation.id == Message.conversation_id)\
+        .filter(Message.sender_type.in_([SenderType.STUDENT, SenderType.AI_TUTOR]),
+                *_in_range(Message.timestamp, start, end))\
+        .group_by(Conversation.user_id, message_day, Message.sender_type, model)
+    for user_id, day, sender_type, model_name, count, token_sum in rows:
+        token_sum = token_sum or 0
+        daily[(user_id, day)]['tokens'] += token_sum
+        # A question's tokens count toward the model that answered it, as in record_turn
+        usage[(user_id, day, model_name)]['tokens'] += token_sum
+        if sender_type == SenderType.STUDENT:
+            daily[(user_id, day)]['questions'] += count
+        else:
+            usage[(user_id, day, model_name)]['replies'] += count
+
+    conversation_day = _day(Conversation.created_at)
+    for user_id, day, count in db.session.query(Conversation.user_id, conversation_day, func.count(Conversation.id))\
+            .filter(*_in_range(Conversation.created_at, start, end))\
+            .group_by(Conversation.user_id, conversation_day):
+        daily[(user_id, day)]['conversations'] += count
+
+    feedback_day = _day(FeedbackEvent.created_at)
+    for user_id, day, count, understood in db.session.query(
+                FeedbackEvent.user_id, feedback_day, func.count(FeedbackEvent.id),
+                func.sum(case((FeedbackEvent.understood, 1), else_=0)))\
+            .filter(*_in_range(FeedbackEvent.created_at, start, end))\
+            .group_by(FeedbackEvent.user_id, feedback_day):
+        daily[(user_id, day)]['feedback'] += count
+        daily[(user_id, day)]['understood'] += understood or 0
+
+    for model_cls in (StudentDailyStats, StudentModelUsage):
+        criteria = []
+        if start:
+            criteria.append(model_cls.day >= start)
+        if end:
+            criteria.append(model_cls.day <= end)
+        db.session.execute(delete(model_cls).where(*criteria))
+    db.session.add_all([StudentDailyStats(user_id=user_id, day=day, **counts)
+                        for (user_id, day), counts in daily.items()])
+    db.session.add_all([StudentModelUsage(user_id=user_id, day=day, model=model_name, **counts)
+                        for (user_id, day, model_name), counts in usage.items()])
+    db.session.commit()
+    return len(daily)
+
+def _rates(row: Dict) -> Dict:
+    row['understood_rate'] = round(row['understood'] / row['feedback'], 3) if row['feedback'] else None
+    row['turns_per_conversation'] = round(row['questions'] / row['conversations'], 2) if row['conversations'] else None
+    return row
+
+COUNTERS = ('questions', 'conversations', 'tokens', 'feedback', 'understood')
+
+def report(user_ids, start: date, end: date, per_student: bool = False) -> Dict:
+    """Totals, a per-day series and the model mix for the students in user_ids over [start, end].
+
+    user_ids may be a list or a select() of ids. Reads only the rollup tables, so
+    the cost depends on the number of students and days, not on history size.
+    Turns per conversation divides questions by conversations started in the range.
+    """
+    sums = [func.coalesce(func.sum(getattr(StudentDailyStats, name)), 0) for name in COUNTERS]
+    in_range = [StudentDailyStats.user_id.in_(user_ids), StudentDailyStats.day.between(start, end)]
+
+    days = [_rates(dict(zip(('day',) + COUNTERS, row)))
+            for row in db.session.query(StudentDailyStats.day, *sums)
+            .filter(*in_range).group_by(StudentDailyStats.day).order_by(StudentDailyStats.day)]
+    totals = _rates({name: sum(day[name] for day in days) for name in COUNTERS})
+    for day in days:
+        day['day'] = day['day'].isoformat()
+
+    models = {model_name: {'replies': replies, 'tokens': tokens}
+              for model_name, replies, tokens in db.session.query(
+                  StudentModelUsage.model, func.sum(StudentModelUsage.replies), func.sum(StudentModelUsage.tokens))
+              .filter(StudentModelUsage.user_id.in_(user_ids), StudentModelUsage.day.between(start, end))
+              .group_by(StudentModelUsage.model)}
+
+    result = {'start': start.isoformat(), 'end': end.isoformat(), 'totals': totals, 'days': days, 'models': models}
+    if per_student:
+        result['students'] = [
+            _rates({'id': user_id, 'name': f"{first_name or ''} {last_name or ''}".strip(),
+                    **dict(zip(COUNTERS, counts))})
+            for user_id, first_name, last_name, *counts in db.session.query(
+                StudentDailyStats.user_id, User.first_name, User.last_name, *sums)
+            .join(User, User.id == StudentDailyStats.user_id)
+            .filter(*in_range)
+            .group_by(StudentDailyStats.user_id, User.first_name, User.last_name)
+            .order_by(StudentDailyStats.user_id)
+        ]
+    return result
+
+def report_range(start_arg: Optional[str], end_arg: Optional[str], default_days: int):
+    """Parse a report's start/end query arguments. Raises ValueError for bad or oversized ranges."""
+    end = date.fromisoformat(end_arg) if end_arg else utc_today()
+    start = date.fromisoformat(start_arg) if start_arg else end - timedelta(days=default_days - 1)
+    if start > end:
+        raise ValueError('start is after end')
+    if (end - start).days >= MAX_REPORT_DAYS:
+        raise ValueError(f'Reports cover at most {MAX_REPORT_DAYS} days')
+    return start, end
@@ -0,0 +1,198 @@
+import heapq
+import os
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.vector_index import VectorIndex
+
+class IVFIndex:
+    """Approximate search with an inverted-file (IVF-flat) index.
+
+    Vectors are bucketed by their nearest centroid from a spherical k-means run,
+    and each bucket is an exact VectorIndex. A search scores the query against the
+    centroids and only scans the nprobe closest buckets, so raising nprobe trades
+    latency for recall. Vectors added after training go straight into their
+    nearest bucket; once the index has grown well past its training set,
+    needs_retrain() tells the owner to rebuild it.
+    """
+
+    def __init__(self, nlist: int = 256, nprobe: int = 8, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.dim = None
+        self.centroids = None  # (nlist, dim) float32, or None while untrained
+        self.trained_size = 0
+        self._lists: List[VectorIndex] = [VectorIndex()]
+        self._assignments = {}  # id -> list number
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._assignments)
+
+    def __contains__(self, item_id):
+        return item_id in self._assignments
+
+    def ids(self) -> np.ndarray:
+        with self._lock:
+            return np.fromiter(self._assignments.keys(), dtype=np.int64, count=len(self._assignments))
+
+    def build(self, ids: Iterable[int], vectors) -> None:
+        """Train centroids on vectors and replace the index contents."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if not len(ids):
+                self.dim, self.centroids, self.trained_size = None, None, 0
+                self._lists, self._assignments = [VectorIndex()], {}
+                return
+            self.dim = vectors.shape[1]
+            self.centroids = _spherical_kmeans(vectors, min(self.nlist, len(ids)), np.random.default_rng(self.seed))
+            self.trained_size = len(ids)
+            self._fill(ids, vectors, self._nearest_lists(vectors))
+
+    def upsert(self, item_id: int, vector) -> None:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        with self._lock:
+            if self.dim is None:
+                self.dim = vector.shape[0]
+            elif vector.shape[0] != self.dim:
+                raise ValueError(f"Expected a {self.dim}-dimension vector, got {vector.shape[0]}")
+            target = int(self._nearest_lists(vector[None, :])[0])
+            current = self._assignments.get(item_id)
+            if current is not None and current != target:
+                self._lists[current].remove(item_id)
+            self._lists[target].upsert(item_id, vector)
+            self._assignments[item_id] = target
+
+    def remove(self, item_id: int) -> bool:
+        with self._lock:
+            current = self._assignments.pop(item_id, None)
+            if current is None:
+                return False
+            return self._lists[current].remove(item_id)
+
+    def search(self, query, k: int, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return up to k approximate (id, score) pairs by descending dot product."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            if not self._assignments or k <= 0:
+                return []
+            if self.centroids is None:
+                return self._lists[0].search(query, k)
+
+            nprobe = min(nprobe or self.nprobe, len(self._lists))
+            centroid_scores = self.centroids @ query
+            probes = np.argpartition(centroid_scores, -nprobe)[-nprobe:]
+            candidates = []
+            for probe in probes:
+                candidates.extend(self._lists[probe].search(query, k))
+            return heapq.nlargest(k, candidates, key=lambda match: match[1])
+
+    def needs_retrain(self, min_train_size: int = 1024, growth: float = 4.0) -> bool:
+        """True when the centroids no longer describe the data well enough."""
+        if self.centroids is None:
+            return len(self) >= min(min_train_size, self.nlist * 4)
+        return len(self) > self.trained_size * growth
+
+    def retrain(self) -> None:
+        """Rebuild centroids and buckets from the vectors already held."""
+        with self._lock:
+            ids, vectors = self._snapshot()
+            self.build(ids, vectors)
+
+    def save(self, path: str, **metadata) -> None:
+        """Write the index to an .npz file. Extra keyword arguments are stored as metadata."""
+        with self._lock:
+            ids, vectors = self._snapshot()
+            assignments = np.array([self._assignments[int(i)] for i in ids], dtype=np.int32)
+            payload = {
+                'ids': ids,
+                'vectors': vectors,
+                'assignments': assignments,
+                'centroids': self.centroids if self.centroids is not None else np.empty((0, 0), dtype=np.float32),
+                'params': np.array([self.nlist, self.nprobe, self.seed, self.trained_size], dtype=np.int64)
+            }
+        payload.update({f'meta_{key}': np.asarray(value) for key, value in metadata.items()})
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **payload)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple['IVFIndex', dict]:
+        """Read an index written by save(). Returns (index, metadata)."""
+        with np.load(path) as data:
+            nlist, nprobe, seed, trained_size = (int(value) for value in data['params'])
+            index = cls(nlist=nlist, nprobe=nprobe, seed=seed)
+            ids, vectors, assignments = data['ids'], data['vectors'], data['assignments']
+            if data['centroids'].size:
+                index.centroids = data['centroids'].astype(np.float32)
+            index.trained_size = trained_size
+            if len(ids):
+                index.dim = vectors.shape[1]
+                index._fill(ids, vectors, assignments)
+            metadata = {key[5:]: data[key].item() for key in data.files if key.startswith('meta_')}
+        return index, metadata
+
+    def _nearest_lists(self, vectors: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.zeros(len(vectors), dtype=np.int64)
+        return _assign(vectors, self.centroids)
+
+    def _fill(self, ids, vectors, assignments) -> None:
+        list_count = len(self.centroids) if self.centroids is not None else 1
+        self._lists = [VectorIndex(dim=self.dim) for _ in range(list_count)]
+        order = np.argsort(assignments, kind='stable')
+        boundaries = np.searchsorted(assignments[order], np.arange(list_count + 1))
+        for list_number in range(list_count):
+            members = order[boundaries[list_number]:boundaries[list_number + 1]]
+            self._lists[list_number].build(ids[members], vectors[members])
+        self._assignments = {int(item_id): int(list_number) for item_id, list_number in zip(ids, assignments)}
+
+    def _snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        ids, blocks = [], []
+        for bucket in self._lists:
+            bucket_ids, bucket_vectors = bucket.snapshot()
+            if len(bucket_ids):
+                ids.append(bucket_ids)
+                blocks.append(bucket_vectors)
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.concatenate(ids), np.vstack(blocks)
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 4096) -> np.ndarray:
+    """Nearest centroid by dot product, computed in blocks to bound memory."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        assignments[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return assignments
+
+def _spherical_kmeans(vectors: np.ndarray, k: int, rng, iterations: int = 20, sample_per_centroid: int = 64) -> np.ndarray:
+    """Unit-norm k-means centroids trained on a random sample of vectors."""
+    if len(vectors) > k * sample_per_centroid:
+        vectors = vectors[rng.choice(len(vectors), k * sample_per_centroid, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=k)
+
+        empty = counts == 0
+        if empty.any():
+            # Reseed empty clusters from random points so every bucket stays useful
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        norms = np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        updated = sums / norms
+        if np.allclose(updated, centroids, atol=1e-6):
+            break
+        centroids = updated
+    return centroids.astype(np.float32)
@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, DocumentBlob
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1 << 20
+
+def blob_dir() -> str:
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'blobs')
+
+def blob_path(sha256: str, document_type: str) -> str:
+    # Two levels of fan-out keep directories small when many documents are stored
+    return os.path.join(blob_dir(), sha256[:2], sha256[2:4], f"{sha256}.{document_type}")
+
+def _add_reference(sha256: str) -> int:
+    return db.session.execute(
+        update(DocumentBlob)
+        .where(DocumentBlob.sha256 == sha256)
+        .values(ref_count=DocumentBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def store_upload(file, document_type: str) -> DocumentBlob:
+    """Save an uploaded file under its content hash and return its blob row.
+
+    The upload is hashed while it is copied to a temporary file, so it is read
+    once. A file already stored is not written again; the existing row (with any
+    text already extracted from it) is returned instead. Either way the blob's
+    reference count is raised for the document the caller attaches; the caller
+    commits.
+    """
+    os.makedirs(blob_dir(), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=blob_dir(), suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for block in iter(lambda: file.read(READ_SIZE), b''):
+                digest.update(block)
+                out.write(block)
+                size += len(block)
+
+        sha256 = digest.hexdigest()
+        if _add_reference(sha256):
+            blob = DocumentBlob.query.filter_by(sha256=sha256).one()
+            if os.path.exists(blob.path):
+                return blob
+        else:
+            blob = None
+
+        path = blob_path(sha256, document_type)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        temp_path = None
+        if blob is None:
+            try:
+                with db.session.begin_nested():
+                    blob = DocumentBlob(sha256=sha256, size=size, document_type=document_type,
+                                        path=path, ref_count=1)
+                    db.session.add(blob)
+            except IntegrityError:
+                # Another upload of the same file created the row first; share it
+                _add_reference(sha256)
+                blob = DocumentBlob.query.filter_by(sha256=sha256).one()
+        else:
+            # The row outlived its file; restore the file in place
+            blob.path = path
+        return blob
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+
+def release_blob(blob_id: int) -> Optional[str]:
+    """Drop one reference to a blob, deleting it with its last. Returns the removed path, if any.
+
+    Call once for each KnowledgeDocument removed. The count is decremented and
+    the row deleted by conditional UPDATE and DELETE, so concurrent uploads and
+    deletes cannot remove a file still in use; the file is removed only once
+    the deletion is committed.
+    """
+    db.session.execute(
+        update(DocumentBlob)
+        .where(DocumentBlob.id == blob_id, DocumentBlob.ref_count > 0)
+        .values(ref_count=DocumentBlob.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    path = db.session.scalar(select(DocumentBlob.path).where(DocumentBlob.id == blob_id))
+    deleted = db.session.execute(
+        delete(DocumentBlob)
+        .where(DocumentBlob.id == blob_id, DocumentBlob.ref_count == 0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not deleted:
+        return None
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"Could not remove blob file {path}: {e}")
+    return path
@@ -1,48 +1,198 @@
-from typing import List, Dict
-from models import Message, SenderType
-from openai import OpenAI
-import os
-import tiktoken
+from datetime import datetime, timezone
+from typing import List, Dict, Optional
+from flask import current_app
+from sqlalchemy import func
+from models import db, Conversation, Job, JobStatus, Message, SenderType
+from utils.jobs import enqueue, job_handler
+from utils.llm import chat_completion
+from utils.tokens import count_text_tokens, get_encoding
+
+DEFAULT_CONTEXT_TOKENS = 3000
+TOKENS_PER_MESSAGE = 4  # Format tax per message
+REPLY_PRIMING_TOKENS = 2  # Every reply is primed with <im_start>assistant
+CHARS_PER_TOKEN = 4  # Rough size of a token, for estimates when the tokenizer is unavailable
+
+SUMMARIZE_CONVERSATION = 'summarize_conversation'
 
 def count_tokens(messages: List[Dict]) -> int:
     """Count tokens in a list of messages."""
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+    encoding = get_encoding("gpt-3.5-turbo")
     num_tokens = 0
     for message in messages:
         # Every message follows {role: ..., content: ...} format
-        num_tokens += 4  # Format tax per message
+        num_tokens += TOKENS_PER_MESSAGE
         for key, value in message.items():
-            num_tokens += len(encoding.encode(str(value)))
-    num_tokens += 2  # Every reply is primed with <im_start>assistant
+            num_tokens += len(encoding.encode(str(value), disallowed_special=()))
+    num_tokens += REPLY_PRIMING_TOKENS
     return num_tokens
 
-def create_summary(conversation_id: int) -> str:
-    """Create a summary of older messages in the conversation."""
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    
-    # Get all messages except the 10 most recent
-    older_messages = Message.query.filter_by(conversation_id=conversation_id)\
-        .order_by(Message.timestamp.desc())\
-        .offset(10)\
-        .limit(50)\
-        .all()
-    
-    if not older_messages:
+def message_token_count(content: str) -> Optional[int]:
+    """Token count to store on a new Message, or None if the tokenizer is unavailable.
+
+    A missing count is filled in later by `flask backfill-token-counts`; it must
+    never stop a message from being saved.
+    """
+    try:
+        return count_text_tokens(content)
+    except Exception as e:
+        print(f"Error counting message tokens: {str(e)}")
         return None
-        
-    # Format messages for summarization
-    messages_text = "\n".join([
+
+def conversation_title(first_message: str) -> str:
+    return first_message[:30] + "..."
+
+def record_messages(conversation_id: int, count: int, first_message: str) -> None:
+    """Bump a conversation's denormalized sidebar fields after saving count messages.
+
+    A single UPDATE with a relative increment, so concurrent turns on the same
+    conversation cannot lose a count. The title is only set if it is still empty.
+    """
+    db.session.query(Conversation).filter_by(id=conversation_id).update({
+        Conversation.message_count: func.coalesce(Conversation.message_count, 0) + count,
+        Conversation.last_message_at: datetime.now(timezone.utc),
+        Conversation.title: func.coalesce(Conversation.title, conversation_title(first_message))
+    }, synchronize_session=False)
+
+def message_tokens(msg: Message) -> int:
+    """Prompt tokens used by a stored message, from its persisted count when present.
+
+    Without a stored count the message is tokenized, and if the tokenizer is
+    unavailable its size is estimated from its length rather than failing the turn.
+    """
+    if msg.token_count is not None:
+        return msg.token_count + TOKENS_PER_MESSAGE + 1  # +1 for the role
+    try:
+        return count_tokens([message_dict(msg)]) - REPLY_PRIMING_TOKENS
+    except Exception:
+        return len(msg.message_content or "") // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE + 1
+
+def format_transcript(messages: List[Message]) -> str:
+    return "\n".join([
         f"{'Student' if msg.sender_type == SenderType.STUDENT else 'Tutor'}: {msg.message_content}"
-        for msg in older_messages
+        for msg in messages
     ])
-    
-    # Get summary from OpenAI
-    summary_response = client.chat.completions.create(
+
+def create_summary(messages: List[Message], previous_summary: Optional[str] = None) -> str:
+    """Summarize messages, folding them into previous_summary when there is one."""
+    instructions = ("Summarize the key points of this tutoring conversation, focusing on the main "
+                    "concepts discussed and questions asked.")
+    transcript = format_transcript(messages)
+    if previous_summary:
+        instructions += (" You are given the summary so far followed by newer messages; "
+                         "return one updated summary covering both.")
+        transcript = f"Summary so far:\n{previous_summary}\n\nNewer messages:\n{transcript}"
+
+    # Get summary from the model
+    return chat_completion(
+        [
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": transcript}
+        ],
         model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "Summarize the key points of this tutoring conversation, focusing on the main concepts discussed and questions asked."},
-            {"role": "user", "content": messages_text}
-        ]
+        max_tokens=300
     )
-    
-    return summary_response.choices[0].message.content
+
+def message_dict(msg: Message) -> Dict:
+    role = "assistant" if msg.sender_type == SenderType.AI_TUTOR else "user"
+    return {"role": role, "content": msg.message_content}
+
+def build_context(conversation: Optional[Conversation], system_prompt: str,
+                  max_tokens: Optional[int] = None) -> List[Dict]:
+    """Return the system prompt followed by build_history(conversation, max_tokens)."""
+    return [{"role": "system", "content": system_prompt}] + build_history(conversation, max_tokens)
+
+def summary_queued(conversation_id: int) -> bool:
+    """Whether a summary job for the conversation is waiting or running."""
+    pending = db.session.query(Job.payload).filter(
+        Job.kind == SUMMARIZE_CONVERSATION,
+        Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])
+    )
+    return any((payload or {}).get('conversation_id') == conversation_id for (payload,) in pending)
+
+def build_history(conversation: Optional[Conversation], max_tokens: Optional[int] = None) -> List[Dict]:
+    """Return as much recent history as fits in max_tokens, led by the rolling summary.
+
+    Messages that no longer fit are dropped from the window and folded into
+    conversation.summary by a background job, so the turn never waits on the
+    summary call; until the job has run they are simply left out. Once the window
+    overflows it is trimmed to half the budget, so the summary is refreshed every
+    few turns rather than on every one, and each refresh only sends the newly
+    dropped messages plus the old summary.
+    """
+    if max_tokens is None:
+        max_tokens = current_app.config.get('CONVERSATION_CONTEXT_TOKENS', DEFAULT_CONTEXT_TOKENS)
+    messages = []
+    if conversation is None:
+        return messages
+
+    # Only messages newer than the summary are candidates for the window; older ones are never loaded
+    query = Message.query.filter(Message.conversation_id == conversation.id)
+    if conversation.summary_through_id is not None:
+        query = query.filter(Message.id > conversation.summary_through_id)
+    pending = query.order_by(Message.id).all()
+    sizes = [message_tokens(msg) for msg in pending]
+    total = sum(sizes)
+
+    if total > max_tokens:
+        target = max_tokens // 2
+        dropped = 0
+        while dropped < len(pending) - 1 and total > target:
+            total -= sizes[dropped]
+            dropped += 1
+        # Never start the window on a tutor reply without the question that prompted it
+        while dropped < len(pending) - 1 and pending[dropped].sender_type == SenderType.AI_TUTOR:
+            total -= sizes[dropped]
+            dropped += 1
+
+        folded, pending = pending[:dropped], pending[dropped:]
+        try:
+            if not summary_queued(conversation.id):
+                enqueue(SUMMARIZE_CONVERSATION, payload={
+                    'conversation_id': conversation.id,
+                    'through_id': folded[-1].id
+                })
+                db.session.commit()
+        except Exception as e:
+            # Keep the turn going on a truncated window; the next overflow queues the summary again
+            db.session.rollback()
+            print(f"Error queueing summary of conversation {conversation.id}: {str(e)}")
+
+    if conversation.summary:
+        messages.append({
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{conversation.summary}"
+        })
+    messages.extend(message_dict(msg) for msg in pending)
+    return messages
+
+@job_handler(SUMMARIZE_CONVERSATION)
+def summarize_conversation(job: Job) -> str:
+    """Fold a conversation's messages up to payload['through_id'] into its rolling summary.
+
+    Nothing is locked while the model writes the summary; it is saved with a
+    conditional UPDATE, so a summary that moved on meanwhile is not overwritten.
+    """
+    conversation = db.session.get(Conversation, job.payload['conversation_id'])
+    if conversation is None:
+        return 'Conversation was deleted'
+    previous_through_id = conversation.summary_through_id
+    through_id = job.payload['through_id']
+    if previous_through_id is not None and previous_through_id >= through_id:
+        return 'Already summarized'
+
+    query = Message.query.filter(Message.conversation_id == conversation.id, Message.id <= through_id)
+    if previous_through_id is not None:
+        query = query.filter(Message.id > previous_through_id)
+    folded = query.order_by(Message.id).all()
+    summary = create_summary(folded, conversation.summary)
+
+    unchanged = Conversation.summary_through_id.is_(None) if previous_through_id is None \
+        else Conversation.summary_through_id == previous_through_id
+    updated = db.session.query(Conversation)\
+        .filter(Conversation.id == conversation.id, unchanged)\
+        .update({
+            Conversation.summary: summary,
+            Conversation.summary_through_id: through_id
+        }, synchronize_session=False)
+    db.session.commit()
+    return f'Summarized {len(folded)} messages' if updated else 'Summary moved on meanwhile'
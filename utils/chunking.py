@@ -0,0 +1,66 @@
+import re
+from typing import List, NamedTuple
+from utils.tokens import get_encoding
+
+# Split after paragraph breaks and sentence ends, keeping the separators with the text
+_UNIT_BOUNDARY = re.compile(r'(?<=\n\n)|(?<=[.!?])(?=\s+[A-Z0-9"\'(])')
+
+class Chunk(NamedTuple):
+    index: int
+    content: str
+    token_count: int
+
+def chunk_text(text: str, max_tokens: int = 400, overlap: int = 50, model: str = "text-embedding-ada-002") -> List[Chunk]:
+    """Split text into overlapping chunks of at most max_tokens tokens.
+
+    Paragraphs and sentences are packed greedily so chunks break on natural
+    boundaries; a single sentence longer than max_tokens is cut on token
+    boundaries. Each chunk after the first repeats up to overlap tokens from
+    the end of the previous one so context spanning a boundary is not lost.
+    """
+    if overlap >= max_tokens:
+        raise ValueError("overlap must be smaller than max_tokens")
+
+    encoding = get_encoding(model)
+    units = []
+    pending = ""
+    for unit in _UNIT_BOUNDARY.split(text or ""):
+        if not unit.strip():
+            pending += unit  # Keep paragraph breaks attached to the following sentence
+            continue
+        tokens = encoding.encode(pending + unit, disallowed_special=())
+        pending = ""
+        # Hard-split anything that cannot fit in a chunk on its own
+        for start in range(0, len(tokens), max_tokens - overlap):
+            units.append(tokens[start:start + max_tokens - overlap])
+
+    chunks = []
+    current: List[list] = []
+    current_tokens = 0
+    for unit in units:
+        if current and current_tokens + len(unit) > max_tokens:
+            chunks.append(_make_chunk(len(chunks), current, encoding))
+            current, current_tokens = _overlap_tail(current, overlap)
+        current.append(unit)
+        current_tokens += len(unit)
+    if current:
+        chunks.append(_make_chunk(len(chunks), current, encoding))
+    return chunks
+
+def _make_chunk(index, units, encoding) -> Chunk:
+    tokens = [token for unit in units for token in unit]
+    return Chunk(index, encoding.decode(tokens).strip(), len(tokens))
+
+def _overlap_tail(units, overlap):
+    """Trailing units of the previous chunk to carry into the next one."""
+    tail, size = [], 0
+    for unit in reversed(units):
+        if size + len(unit) > overlap:
+            break
+        tail.insert(0, unit)
+        size += len(unit)
+    if not tail and overlap and units:
+        # Last unit is bigger than the overlap window; carry its final tokens instead
+        tail = [units[-1][-overlap:]]
+        size = len(tail[0])
+    return tail, size
@@ -1,44 +1,182 @@
 from PyPDF2 import PdfReader
 from docx import Document
-import os
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
 from werkzeug.utils import secure_filename
-from typing import Tuple
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Each pool task reopens the PDF, which costs about as much as extracting a few dozen
+# pages, so a task covers at least this many pages
+MIN_PAGES_PER_TASK = 32
+# Tasks per worker; more than one lets a fast worker pick up the slack of a slow range
+TASKS_PER_WORKER = 4
+
+class ExtractionBudget:
+    """Page and wall-clock limits for extracting one document.
+
+    Extraction stops at whichever limit is hit first and keeps the text read so
+    far; `truncated` records that it did.
+    """
+
+    def __init__(self, max_pages: Optional[int] = None, max_seconds: Optional[float] = None):
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self.started = time.monotonic()
+        self.truncated = False
+
+    def page_limit(self, page_count: int) -> int:
+        if self.max_pages is not None and page_count > self.max_pages:
+            self.truncated = True
+            return self.max_pages
+        return page_count
+
+    def remaining(self) -> Optional[float]:
+        if self.max_seconds is None:
+            return None
+        return max(self.max_seconds - (time.monotonic() - self.started), 0.0)
+
+    def expired(self) -> bool:
+        if self.remaining() == 0.0:
+            self.truncated = True
+            return True
+        return False
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Pool task: extract pages [start, stop) of the PDF at path."""
+    reader = PdfReader(path)
+    return [reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+# Per-process pool, created on the first large PDF
+_pool = None
+_pool_workers = None
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        # Spawn rather than fork: the parent holds database connections and threads
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _pool_workers = workers
+    return _pool
 
 class DocumentProcessor:
     ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt'}
-    
+
     @staticmethod
     def allowed_file(filename):
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in DocumentProcessor.ALLOWED_EXTENSIONS
-    
+
     @staticmethod
-    def process_document(file) -> Tuple[str, str]:
+    def process_document(file, budget: ExtractionBudget = None) -> Tuple[str, str]:
         """Process uploaded document and return content and document type"""
         filename = secure_filename(file.filename)
         file_ext = filename.rsplit('.', 1)[1].lower()
-        
+
         if file_ext == 'pdf':
-            return DocumentProcessor._process_pdf(file), file_ext
+            return DocumentProcessor._process_pdf(file, budget), file_ext
         elif file_ext == 'docx':
             return DocumentProcessor._process_docx(file), file_ext
         elif file_ext == 'txt':
             return file.read().decode('utf-8'), file_ext
-        
+
+        raise ValueError(f"Unsupported file type: {file_ext}")
+
+    @staticmethod
+    def process_path(path: str, budget: ExtractionBudget = None, workers: int = 1,
+                     parallel_min_pages: int = 64) -> Tuple[str, str]:
+        """Process a document already saved to disk and return content and document type.
+
+        PDFs with at least parallel_min_pages pages are extracted across a pool of
+        `workers` processes.
+        """
+        file_ext = path.rsplit('.', 1)[-1].lower()
+        if file_ext == 'pdf':
+            pages = DocumentProcessor.iter_pdf_pages(path, budget, workers, parallel_min_pages)
+            return DocumentProcessor._join(pages), file_ext
+        with open(path, 'rb') as f:
+            if file_ext == 'docx':
+                return DocumentProcessor._process_docx(f), file_ext
+            elif file_ext == 'txt':
+                return f.read().decode('utf-8'), file_ext
+
         raise ValueError(f"Unsupported file type: {file_ext}")
-    
+
+    @staticmethod
+    def iter_pdf_pages(source, budget: ExtractionBudget = None, workers: int = 1,
+                       parallel_min_pages: int = 64) -> Iterator[str]:
+        """Yield the text of each page of a PDF in order, within budget.
+
+        source is a path or a file object; only a path can be fanned out to the
+        process pool, since each worker opens the file itself.
+        """
+        budget = budget or ExtractionBudget()
+        reader = PdfReader(source)
+        page_count = budget.page_limit(len(reader.pages))
+        if budget.truncated:
+            logger.warning(f"PDF has {len(reader.pages)} pages; extracting only the first {page_count}")
+
+        if workers > 1 and isinstance(source, str) and page_count >= parallel_min_pages:
+            yield from DocumentProcessor._iter_pdf_pages_parallel(source, page_count, budget, workers)
+            return
+
+        for index in range(page_count):
+            if budget.expired():
+                logger.warning(f"PDF extraction stopped at the time budget after {index} pages")
+                break
+            yield reader.pages[index].extract_text() or ""
+
     @staticmethod
-    def _process_pdf(file) -> str:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    
+    def _iter_pdf_pages_parallel(path: str, page_count: int, budget: ExtractionBudget,
+                                 workers: int) -> Iterator[str]:
+        # Keep at most two ranges per worker in flight, so finished pages never pile up
+        # far ahead of the consumer
+        pool = _get_pool(workers)
+        step = max(MIN_PAGES_PER_TASK, -(-page_count // (workers * TASKS_PER_WORKER)))
+        ranges = iter(range(0, page_count, step))
+        pending = deque()
+
+        def submit_next():
+            start = next(ranges, None)
+            if start is not None:
+                pending.append(pool.submit(_extract_page_range, path, start,
+                                           min(start + step, page_count)))
+
+        for _ in range(workers * 2):
+            submit_next()
+        try:
+            while pending:
+                # Waiting in submission order keeps the pages in order
+                pages = pending.popleft().result(timeout=budget.remaining())
+                submit_next()
+                yield from pages
+        except TimeoutError:
+            budget.truncated = True
+            logger.warning(f"PDF extraction of {path} stopped at the time budget")
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def iter_docx_paragraphs(file) -> Iterator[str]:
+        for para in Document(file).paragraphs:
+            yield para.text
+
+    @staticmethod
+    def _join(parts: Iterator[str]) -> str:
+        # One join over the whole document instead of repeated concatenation
+        return "".join(f"{part}\n" for part in parts)
+
+    @staticmethod
+    def _process_pdf(file, budget: ExtractionBudget = None) -> str:
+        return DocumentProcessor._join(DocumentProcessor.iter_pdf_pages(file, budget))
+
     @staticmethod
     def _process_docx(file) -> str:
-        doc = Document(file)
-        text = ""
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        return text 
\ No newline at end of file
+        return DocumentProcessor._join(DocumentProcessor.iter_docx_paragraphs(file))
@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import EmbeddingCacheEntry, db
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, case-folded, whitespace collapsed."""
+    text = unicodedata.normalize('NFC', text or '')
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """Two-tier cache for query embeddings with in-flight request coalescing.
+
+    The first tier is a bounded in-memory LRU. The optional second tier is the
+    embedding_cache table, shared by every worker. Concurrent lookups of the same
+    key while it is being computed wait on the leader's call instead of issuing
+    their own.
+    """
+
+    def __init__(self, max_size: int = 2048, persistent: bool = False, wait_timeout: float = 30.0):
+        self.max_size = max_size
+        self.persistent = persistent
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, text: str, model: str, compute: Callable[[str], np.ndarray]) -> np.ndarray:
+        """Return the embedding of text, calling compute(normalized_text) only on a full miss."""
+        key = cache_key(text, model)
+
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(timeout=self.wait_timeout)
+
+        try:
+            vector = self._load_persistent(key) if self.persistent else None
+            if vector is not None:
+                with self._lock:
+                    self.persistent_hits += 1
+            else:
+                with self._lock:
+                    self.misses += 1
+                vector = np.asarray(compute(normalize_text(text)), dtype=np.float32)
+                if self.persistent:
+                    self._store_persistent(key, model, vector)
+            vector.setflags(write=False)  # Shared between callers, so keep it immutable
+            self._put(key, vector)
+            future.set_result(vector)
+            return vector
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses + self.coalesced
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': (lookups - self.misses) / lookups if lookups else 0.0
+            }
+
+    def _put(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load_persistent(self, key: str) -> Optional[np.ndarray]:
+        # Use a dedicated connection so cache traffic never touches the request's session
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    db.select(EmbeddingCacheEntry.dtype, EmbeddingCacheEntry.vector)
+                    .where(EmbeddingCacheEntry.key == key)
+                ).first()
+        except SQLAlchemyError as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        return np.frombuffer(row.vector, dtype=np.dtype(row.dtype).newbyteorder('<')).astype(np.float32)
+
+    def _store_persistent(self, key: str, model: str, vector: np.ndarray) -> None:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(EmbeddingCacheEntry.__table__.insert().values(
+                    key=key,
+                    model=model,
+                    dimension=vector.shape[0],
+                    dtype='float32',
+                    vector=vector.astype('<f4').tobytes()
+                ))
+        except SQLAlchemyError as e:
+            # Most likely another worker stored the same key first
+            logger.debug(f"Embedding cache write skipped: {e}")
@@ -1,53 +1,352 @@
-from typing import List
+from typing import Callable, Dict, List, Tuple
+import hashlib
+import threading
 import numpy as np
-from models import KnowledgeBaseEntry
+from models import KnowledgeBaseEntry, KnowledgeChunk, KnowledgeEmbedding
 import os
-from openai import OpenAI
 from flask import current_app
+from werkzeug.utils import secure_filename
 import logging
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from models import db
+from utils.vector_index import VectorIndex
+from utils.ann_index import IVFIndex
+from utils.embedding_cache import EmbeddingCache
+from utils.chunking import Chunk, chunk_text
+from utils.llm import embed_texts
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def find_relevant_knowledge(query: str, limit: int = 3) -> List[KnowledgeBaseEntry]:
-    """Find relevant knowledge base entries for the given query."""
-    query_embedding = create_embedding(query)
-    
-    # Get all knowledge base entries and their embeddings
-    entries = KnowledgeBaseEntry.query.all()
-    
-    # Calculate similarities
-    similarities = []
-    for entry in entries:
-        entry_embedding = np.array(entry.embedding)
-        similarity = np.dot(query_embedding, entry_embedding)
-        similarities.append((similarity, entry))
-    
-    # Sort by similarity and return top matches
-    sorted_entries = sorted(similarities, key=lambda x: x[0], reverse=True)
-    return [entry for _, entry in sorted_entries[:limit]]
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_BATCH_SIZE = 96  # Inputs sent per embeddings.create call
+
+# Per-worker cache of query embeddings, created from app config on first use
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def embedding_model() -> str:
+    return current_app.config.get('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL)
+
+def pack_embedding(embedding, dtype: str = None) -> Tuple[bytes, int, str]:
+    """Pack a vector into raw bytes. Returns (bytes, dimension, dtype)."""
+    dtype = dtype or current_app.config.get('EMBEDDING_DTYPE', 'float32')
+    array = np.asarray(embedding, dtype=np.dtype(dtype).newbyteorder('<')).ravel()
+    return array.tobytes(), array.shape[0], dtype
+
+def unpack_embedding(vector: bytes, dtype: str = 'float32') -> np.ndarray:
+    """Unpack raw bytes written by pack_embedding into a float32 vector."""
+    return np.frombuffer(vector, dtype=np.dtype(dtype).newbyteorder('<')).astype(np.float32)
+
+def _knowledge_signature(model: str):
+    """Cheap fingerprint of the stored embeddings, used to spot changes made by other workers.
+
+    Embedding rows are replaced rather than updated, so count and max id change on every write.
+    """
+    return (model,) + tuple(db.session.query(
+        func.count(KnowledgeEmbedding.id),
+        func.max(KnowledgeEmbedding.id)
+    ).filter(KnowledgeEmbedding.model == model).one())
+
+def load_knowledge_matrix(model: str) -> Tuple[List[int], np.ndarray]:
+    """Read every stored embedding for model as one (n, dim) float32 matrix keyed by chunk id."""
+    rows = db.session.query(
+        KnowledgeEmbedding.chunk_id,
+        KnowledgeEmbedding.dimension,
+        KnowledgeEmbedding.dtype,
+        KnowledgeEmbedding.vector
+    ).filter(KnowledgeEmbedding.model == model).all()
+    if not rows:
+        return [], np.empty((0, 0), dtype=np.float32)
+
+    dimension, dtype = rows[0].dimension, rows[0].dtype
+    if all(row.dimension == dimension and row.dtype == dtype for row in rows):
+        # Fast path: one contiguous buffer decoded in a single call
+        buffer = b''.join(row.vector for row in rows)
+        matrix = np.frombuffer(buffer, dtype=np.dtype(dtype).newbyteorder('<'))\
+            .reshape(len(rows), dimension)\
+            .astype(np.float32)
+        return [row.chunk_id for row in rows], matrix
+
+    rows = [row for row in rows if row.dimension == dimension]
+    matrix = np.vstack([unpack_embedding(row.vector, row.dtype) for row in rows])
+    return [row.chunk_id for row in rows], matrix
+
+class KnowledgeIndex:
+    """This worker's search index over stored chunk embeddings.
+
+    The index type comes from KNOWLEDGE_INDEX: 'exact' (VectorIndex) or 'ivf'
+    (IVFIndex, persisted to KNOWLEDGE_INDEX_PATH). It is loaded on first use and
+    then kept in sync incrementally: a cheap count/max-id fingerprint detects
+    changes made by any process, new or replaced embedding rows are applied past
+    a high-water mark, and deleted chunks are dropped.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.model = None
+        self.signature = None
+        self.last_embedding_id = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        model = embedding_model()
+        signature = _knowledge_signature(model)
+        if self.index is not None and self.model == model and signature == self.signature:
+            return self.index
+
+        with self._lock:
+            if self.index is None or self.model != model:
+                self._load(model)
+            self._apply_changes(signature)
+            self.signature = signature
+
+            if isinstance(self.index, IVFIndex) and self.index.needs_retrain():
+                logger.info(f"Retraining IVF knowledge index on {len(self.index)} vectors")
+                self.index.retrain()
+                self.save()
+        return self.index
+
+    def remove(self, chunk_ids: List[int]) -> None:
+        """Drop chunks from a loaded index without waiting for the next sync to notice."""
+        with self._lock:
+            if self.index is None:
+                return
+            for chunk_id in chunk_ids:
+                self.index.remove(chunk_id)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.index, self.model, self.signature, self.last_embedding_id = None, None, None, 0
+
+    def build(self, model: str = None):
+        """Rebuild the index from scratch from the embeddings table (and persist it)."""
+        with self._lock:
+            self._build(model or embedding_model())
+        return self.index
+
+    def save(self) -> None:
+        if isinstance(self.index, IVFIndex):
+            self.index.save(index_path(self.model), model=self.model, last_embedding_id=self.last_embedding_id)
+
+    def _load(self, model: str) -> None:
+        path = index_path(model)
+        if index_type() == 'ivf' and os.path.exists(path):
+            index, metadata = IVFIndex.load(path)
+            if metadata.get('model') == model:
+                index.nprobe = current_app.config.get('KNOWLEDGE_INDEX_NPROBE', index.nprobe)
+                self.index, self.model = index, model
+                self.last_embedding_id = int(metadata.get('last_embedding_id', 0))
+                logger.info(f"Loaded IVF knowledge index with {len(index)} vectors from {path}")
+                return
+        self._build(model)
+
+    def _build(self, model: str) -> None:
+        self.model = model
+        self.index = _new_index()
+        # Read the high-water mark first; rows landing during the load are re-applied later
+        self.last_embedding_id = db.session.query(func.max(KnowledgeEmbedding.id))\
+            .filter(KnowledgeEmbedding.model == model).scalar() or 0
+        ids, matrix = load_knowledge_matrix(model)
+        self.index.build(ids, matrix)
+        self.signature = None
+        self.save()
+        logger.info(f"Loaded {len(ids)} knowledge base embeddings into the {index_type()} index")
+
+    def _apply_changes(self, signature) -> None:
+        rows = db.session.query(
+            KnowledgeEmbedding.id,
+            KnowledgeEmbedding.chunk_id,
+            KnowledgeEmbedding.dtype,
+            KnowledgeEmbedding.vector
+        ).filter(
+            KnowledgeEmbedding.model == self.model,
+            KnowledgeEmbedding.id > self.last_embedding_id
+        ).order_by(KnowledgeEmbedding.id).yield_per(1000)
+        for row in rows:
+            self.index.upsert(row.chunk_id, unpack_embedding(row.vector, row.dtype))
+            self.last_embedding_id = row.id
+
+        # Only scan for deleted chunks when the row count says something went away
+        if len(self.index) != signature[1]:
+            live = {chunk_id for (chunk_id,) in db.session.query(KnowledgeEmbedding.chunk_id)
+                    .filter(KnowledgeEmbedding.model == self.model)}
+            for chunk_id in set(self.index.ids().tolist()) - live:
+                self.index.remove(chunk_id)
+
+_knowledge_index = KnowledgeIndex()
+
+def index_type() -> str:
+    return current_app.config.get('KNOWLEDGE_INDEX', 'exact')
+
+def index_path(model: str) -> str:
+    path = current_app.config.get('KNOWLEDGE_INDEX_PATH')
+    if path:
+        return path
+    return os.path.join(current_app.instance_path, f"knowledge-index-{secure_filename(model)}.npz")
+
+def _new_index():
+    if index_type() == 'ivf':
+        return IVFIndex(
+            nlist=current_app.config.get('KNOWLEDGE_INDEX_NLIST', 256),
+            nprobe=current_app.config.get('KNOWLEDGE_INDEX_NPROBE', 8)
+        )
+    return VectorIndex()
+
+def get_knowledge_index():
+    """Return this worker's knowledge index, synced with the embeddings table."""
+    return _knowledge_index.get()
+
+def rebuild_knowledge_index(model: str = None):
+    """Rebuild (and, for IVF, retrain and persist) this process's knowledge index."""
+    return _knowledge_index.build(model)
+
+def unindex_chunks(chunk_ids: List[int]) -> None:
+    """Drop deleted chunks from this worker's index right away."""
+    _knowledge_index.remove(chunk_ids)
+
+def get_query_cache() -> EmbeddingCache:
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = EmbeddingCache(
+                    max_size=current_app.config.get('EMBEDDING_CACHE_SIZE', 2048),
+                    persistent=current_app.config.get('EMBEDDING_CACHE_PERSIST', False)
+                )
+    return _query_cache
+
+def embed_query(text: str) -> np.ndarray:
+    """Embed a short user query through the query-embedding cache."""
+    return get_query_cache().get(text, embedding_model(), create_embedding)
+
+def find_relevant_knowledge(query: str, limit: int = 3) -> List[KnowledgeChunk]:
+    """Find the knowledge base chunks most relevant to the given query."""
+    query_embedding = embed_query(query)
+
+    matches = get_knowledge_index().search(query_embedding, limit)
+    if not matches:
+        return []
+
+    # Fetch only the winning chunks, with their parent entry for the title
+    ids = [chunk_id for chunk_id, _ in matches]
+    chunks = KnowledgeChunk.query\
+        .options(joinedload(KnowledgeChunk.entry))\
+        .filter(KnowledgeChunk.id.in_(ids))\
+        .all()
+    by_id = {chunk.id: chunk for chunk in chunks}
+    return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
 
 def create_embedding(text: str) -> np.ndarray:
-    """Create an embedding for the given text using OpenAI's API."""
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    """Create an embedding for the given text."""
+    return create_embeddings([text])[0]
+
+def create_embeddings(texts: List[str], model: str = None, batch_size: int = EMBEDDING_BATCH_SIZE) -> List[np.ndarray]:
+    """Embed several texts, sending up to batch_size inputs per API call.
+
+    Pass model explicitly when calling from a thread without an app context.
+    """
+    model = model or embedding_model()
+    embeddings = []
     try:
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        return np.array(response.data[0].embedding)
+        for start in range(0, len(texts), batch_size):
+            vectors = embed_texts(texts[start:start + batch_size], model)
+            embeddings.extend(np.array(vector) for vector in vectors)
+        return embeddings
     except Exception as e:
         logger.error(f"Error creating embedding: {e}")
         raise
 
-def update_entry_embedding(entry: KnowledgeBaseEntry) -> None:
-    """Update the embedding for a knowledge base entry."""
+def split_entry(entry: KnowledgeBaseEntry) -> List[Chunk]:
+    """Split the entry's content into chunks without touching the database."""
+    return chunk_text(
+        entry.content,
+        max_tokens=current_app.config.get('KNOWLEDGE_CHUNK_TOKENS', 400),
+        overlap=current_app.config.get('KNOWLEDGE_CHUNK_OVERLAP', 50),
+        model=embedding_model()
+    )
+
+def chunk_entry(entry: KnowledgeBaseEntry, pieces: List[Chunk] = None) -> List[KnowledgeChunk]:
+    """Replace the entry's chunks with pieces, or a fresh split of its content."""
+    if pieces is None:
+        pieces = split_entry(entry)
+    entry.chunks = []
+    db.session.flush()  # Free the (entry_id, chunk_index) slots before inserting replacements
+
+    for chunk in pieces:
+        entry.chunks.append(KnowledgeChunk(
+            chunk_index=chunk.index,
+            content=chunk.content,
+            token_count=chunk.token_count,
+            content_hash=text_hash(embedding_text(entry.title, chunk.content))
+        ))
+    return entry.chunks
+
+def embedding_text(title: str, content: str) -> str:
+    # Prefix the title so short chunks keep the context of their document
+    return f"{title}\n{content}"
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def stored_embeddings(hashes: List[str], model: str = None, batch_size: int = 500) -> Dict[str, np.ndarray]:
+    """Embeddings already stored for chunks whose embedded text has one of these hashes."""
+    model = model or embedding_model()
+    found = {}
+    unique = sorted(set(hashes))
+    for start in range(0, len(unique), batch_size):
+        rows = db.session.query(KnowledgeChunk.content_hash, KnowledgeEmbedding.vector, KnowledgeEmbedding.dtype)\
+            .join(KnowledgeEmbedding, KnowledgeEmbedding.chunk_id == KnowledgeChunk.id)\
+            .filter(KnowledgeChunk.content_hash.in_(unique[start:start + batch_size]),
+                    KnowledgeEmbedding.model == model)
+        for content_hash, vector, dtype in rows:
+            found.setdefault(content_hash, unpack_embedding(vector, dtype))
+    return found
+
+def chunk_embedding_text(chunk: KnowledgeChunk) -> str:
+    return embedding_text(chunk.entry.title, chunk.content)
+
+def store_chunk_embedding(chunk: KnowledgeChunk, embedding, model: str = None) -> KnowledgeEmbedding:
+    """Replace the chunk's stored embedding for model with a packed copy of embedding."""
+    model = model or embedding_model()
+    vector, dimension, dtype = pack_embedding(embedding)
+    for existing in [e for e in chunk.embeddings if e.model == model]:
+        chunk.embeddings.remove(existing)
+    db.session.flush()  # Free the (chunk_id, model) slot before inserting the replacement
+
+    stored = KnowledgeEmbedding(model=model, dimension=dimension, dtype=dtype, vector=vector)
+    chunk.embeddings.append(stored)
+    return stored
+
+def update_entry_embedding(entry: KnowledgeBaseEntry, progress: Callable[[int, int], None] = None) -> None:
+    """Re-chunk a knowledge base entry and embed every chunk.
+
+    A chunk whose text (title included) matches one already embedded with the
+    current model reuses that vector, so shared handouts and re-ingested entries
+    cost no embedding calls. All new embeddings are fetched before any chunk row
+    is written, so progress(done, total) may commit the session after each batch
+    without exposing a half-built set of chunks.
+    """
     try:
-        # Combine title and content for better context
-        text = f"{entry.title}\n{entry.content}"
-        embedding = create_embedding(text)
-        entry.embedding = embedding.tolist()  # Convert to list for JSON storage
+        pieces = split_entry(entry)
+        texts = [embedding_text(entry.title, piece.content) for piece in pieces]
+        embeddings = stored_embeddings([text_hash(text) for text in texts])
+        embeddings = [embeddings.get(text_hash(text)) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if progress:
+            progress(len(texts) - len(missing), len(texts))
+
+        for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+            batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+            for i, embedding in zip(batch, create_embeddings([texts[i] for i in batch])):
+                embeddings[i] = embedding
+            if progress:
+                progress(len(texts) - len(missing) + start + len(batch), len(texts))
+
+        chunks = chunk_entry(entry, pieces)
+        for chunk, embedding in zip(chunks, embeddings):
+            store_chunk_embedding(chunk, embedding)
         db.session.commit()
     except Exception as e:
         logger.error(f"Error updating entry embedding: {e}")
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import func, literal, update
+from sqlalchemy.exc import IntegrityError
+from models import db, FeedbackEvent, StudentProfile, TopicProficiency
+import utils.analytics as analytics
+
+TOPIC_LENGTH = 64
+
+def normalize_topic(topic) -> Optional[str]:
+    if not isinstance(topic, str) or not topic.strip():
+        return None
+    return topic.strip().lower()[:TOPIC_LENGTH]
+
+def _bump_topic(user_id: int, topic: str, understood: bool):
+    return db.session.execute(
+        update(TopicProficiency)
+        .where(TopicProficiency.user_id == user_id, TopicProficiency.topic == topic)
+        .values(
+            attempts=TopicProficiency.attempts + 1,
+            successes=TopicProficiency.successes + (1 if understood else 0),
+            updated_at=datetime.now(timezone.utc)
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def record_topic(user_id: int, topic: str, understood: bool) -> None:
+    """Count one attempt at a topic, creating the student's row for it on first use."""
+    if _bump_topic(user_id, topic, understood):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(TopicProficiency(user_id=user_id, topic=topic, attempts=1,
+                                            successes=1 if understood else 0))
+    except IntegrityError:
+        # Another request created the row first; it exists now
+        _bump_topic(user_id, topic, understood)
+
+def record_feedback(user_id: int, understood: bool, helpful: bool = False,
+                    message_id: Optional[int] = None, topic: Optional[str] = None) -> bool:
+    """Log one feedback click and fold it into the student's profile and topic counts.
+
+    The event is a plain insert. The profile counters and skill level are
+    recomputed inside a single UPDATE from the row's current values, so
+    concurrent clicks neither lose increments nor hold the row while Python
+    decides. Returns False, writing nothing, when the student has no profile.
+    Commits.
+    """
+    profile = StudentProfile
+    total = func.coalesce(profile.total_questions, 0) + 1
+    successes = func.coalesce(profile.successful_interactions, 0) + (1 if understood else 0)
+    streak = func.coalesce(profile.consecutive_successes, 0) + 1 if understood else literal(0)
+    updated = db.session.execute(
+        update(profile)
+        .where(profile.user_id == user_id)
+        .values(
+            total_questions=total,
+            successful_interactions=successes,
+            consecutive_successes=streak,
+            consecutive_failures=0 if understood else func.coalesce(profile.consecutive_failures, 0) + 1,
+            skill_level=profile.skill_level_expression(successes, total, streak)
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.session.rollback()
+        return False
+
+    topic = normalize_topic(topic)
+    db.session.add(FeedbackEvent(user_id=user_id, message_id=message_id, topic=topic,
+                                 understood=understood, helpful=helpful))
+    if topic:
+        record_topic(user_id, topic, understood)
+    analytics.record_feedback(user_id, understood)
+    db.session.commit()
+    return True
@@ -0,0 +1,84 @@
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional
+from flask import current_app, request, stream_template
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import selectinload
+from models import Conversation, User
+from utils.pagination import decode_cursor, encode_cursor, page_size
+
+class HistoryPage:
+    """One page of a student's conversations, newest first, with their messages.
+
+    Iterating runs the queries lazily, `fetch_size` conversations at a time, so a
+    streamed template can send the first conversations before the rest are read.
+    Each fetch is two queries whatever the number of messages: the conversations,
+    then all of their messages. `next_cursor` is known once iteration finishes.
+    """
+
+    def __init__(self, user_id: int, limit: int, fetch_size: int, before: Optional[str] = None,
+                 start: Optional[date] = None, end: Optional[date] = None):
+        self.user_id = user_id
+        self.limit = limit
+        self.fetch_size = max(min(fetch_size, limit), 1)
+        self.start = start
+        self.end = end
+        self.after = decode_cursor(before)  # raises ValueError on a malformed cursor
+        if self.after:
+            self.after = (datetime.fromisoformat(self.after[0]), int(self.after[1]))
+        self.next_cursor = None
+
+    def _query(self, after, limit):
+        query = Conversation.query.filter(Conversation.user_id == self.user_id)
+        if self.start:
+            query = query.filter(Conversation.created_at >= datetime.combine(self.start, datetime.min.time()))
+        if self.end:
+            # The end date is inclusive
+            query = query.filter(Conversation.created_at < datetime.combine(self.end + timedelta(days=1),
+                                                                            datetime.min.time()))
+        if after:
+            query = query.filter(or_(
+                Conversation.created_at < after[0],
+                and_(Conversation.created_at == after[0], Conversation.id < after[1])
+            ))
+        return (query.options(selectinload(Conversation.messages))
+                .order_by(Conversation.created_at.desc(), Conversation.id.desc())
+                .limit(limit).all())
+
+    def __iter__(self) -> Iterator[Conversation]:
+        after = self.after
+        remaining = self.limit
+        while remaining > 0:
+            fetch = min(self.fetch_size, remaining)
+            # One extra row tells whether anything older exists
+            rows = self._query(after, fetch + 1)
+            yield from rows[:fetch]
+            if len(rows) <= fetch:
+                return
+            after = (rows[fetch - 1].created_at, rows[fetch - 1].id)
+            remaining -= fetch
+        self.next_cursor = encode_cursor(*after)
+
+def _parse_date(name: str) -> Optional[date]:
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+def stream_history(student: User, template: str = 'student_history.html'):
+    """Stream a student's conversation history, honouring the start, end and before query arguments.
+
+    Nothing after this point may touch the session: the response headers, and
+    with them the session cookie, go out before the template has finished.
+    """
+    notice = None
+    try:
+        start, end = _parse_date('start'), _parse_date('end')
+    except ValueError:
+        notice = 'Dates must be in YYYY-MM-DD format; showing all conversations.'
+        start = end = None
+    limit = page_size(request.args.get('limit', type=int), current_app.config.get('HISTORY_PAGE_SIZE', 20))
+    fetch_size = current_app.config.get('HISTORY_FETCH_SIZE', 5)
+    try:
+        page = HistoryPage(student.id, limit, fetch_size, request.args.get('before'), start, end)
+    except (ValueError, TypeError, IndexError):
+        notice = 'That page of history is not valid; showing the latest conversations.'
+        page = HistoryPage(student.id, limit, fetch_size, None, start, end)
+    return stream_template(template, student=student, conversations=page, start=start, end=end, notice=notice)
@@ -0,0 +1,48 @@
+from flask import current_app
+from models import db, Job, KnowledgeBaseEntry
+from utils.document_processor import DocumentProcessor, ExtractionBudget
+from utils.embeddings import update_entry_embedding
+from utils.jobs import job_handler, report_progress
+
+INGEST_KNOWLEDGE = 'ingest_knowledge'
+
+@job_handler(INGEST_KNOWLEDGE)
+def ingest_knowledge(job: Job) -> str:
+    """Extract a knowledge base entry's document (if any), chunk it and embed the chunks.
+
+    Every step overwrites what a previous attempt left behind, so a retry after a
+    crash or API error starts cleanly.
+    """
+    entry = db.session.get(KnowledgeBaseEntry, job.entry_id) if job.entry_id else None
+    if entry is None:
+        return 'Entry was deleted before it was processed'
+
+    truncated = False
+    blob = entry.document.blob if entry.document else None
+    if blob is not None and blob.extracted_text is not None:
+        # The same file was uploaded before; reuse its text
+        entry.content = blob.extracted_text
+    elif entry.entry_type == 'document':
+        report_progress(job, 0.05, 'Extracting text')
+        budget = ExtractionBudget(
+            max_pages=current_app.config.get('DOCUMENT_MAX_PAGES'),
+            max_seconds=current_app.config.get('DOCUMENT_EXTRACT_TIMEOUT')
+        )
+        entry.content, entry.document_type = DocumentProcessor.process_path(
+            entry.document_path,
+            budget,
+            workers=current_app.config.get('PDF_EXTRACT_WORKERS', 1),
+            parallel_min_pages=current_app.config.get('PDF_PARALLEL_MIN_PAGES', 64)
+        )
+        truncated = budget.truncated
+        if blob is not None and not truncated:
+            blob.extracted_text = entry.content
+
+    report_progress(job, 0.2, 'Embedding chunks')
+
+    def embedded(done, total):
+        report_progress(job, 0.2 + 0.75 * done / max(total, 1), f'Embedded {done} of {total} chunks')
+
+    update_entry_embedding(entry, progress=embedded)
+    message = f'Indexed {len(entry.chunks)} chunks'
+    return f'{message} (document truncated at the extraction budget)' if truncated else message
@@ -0,0 +1,139 @@
+import logging
+import os
+import random
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+from flask import current_app
+from sqlalchemy import and_, or_, select, union_all
+from models import db, Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# kind -> handler(job); handlers must be safe to run again after a partial failure
+_handlers: Dict[str, Callable[[Job], Optional[str]]] = {}
+
+def job_handler(kind: str):
+    """Register the function that runs jobs of the given kind.
+
+    The handler may return a short completion message. Raising marks the attempt as
+    failed; the job is retried with backoff until max_attempts is reached.
+    """
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+def enqueue(kind: str, entry_id: Optional[int] = None, payload: Optional[dict] = None,
+            max_attempts: Optional[int] = None) -> Job:
+    """Add a job to the queue. The caller commits, so the job lands with the data it refers to."""
+    job = Job(
+        kind=kind,
+        entry_id=entry_id,
+        payload=payload or {},
+        max_attempts=max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 3),
+        message='Waiting for a worker'
+    )
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def claim_next(worker: str) -> Optional[Job]:
+    """Atomically take the job that has been runnable longest, or return None if there is none.
+
+    Running jobs whose lock is older than JOB_LOCK_TIMEOUT belonged to a worker that
+    died, so they are claimable again, from the moment their lock expired; they
+    compete with queued jobs in the same order, so a busy queue cannot starve them.
+    The claim is a conditional UPDATE, so two workers racing for the same row
+    cannot both win.
+    """
+    now = datetime.now(timezone.utc)
+    timeout = timedelta(seconds=current_app.config.get('JOB_LOCK_TIMEOUT', 600))
+    queued = and_(Job.status == JobStatus.QUEUED, Job.run_after <= now)
+    orphaned = and_(Job.status == JobStatus.RUNNING, Job.locked_at < now - timeout)
+    columns = (Job.id, Job.status, Job.run_after, Job.locked_at)
+    # The oldest candidate of each kind, each read off its index in order, in one statement
+    candidates = union_all(
+        select(*select(*columns).where(queued).order_by(Job.run_after, Job.id).limit(1).subquery().c),
+        select(*select(*columns).where(orphaned).order_by(Job.locked_at, Job.id).limit(1).subquery().c)
+    )
+
+    def runnable_since(row):
+        return (row.run_after if row.status == JobStatus.QUEUED else row.locked_at + timeout, row.id)
+
+    for _ in range(5):
+        rows = db.session.execute(candidates).all()
+        if not rows:
+            return None
+        job_id = min(rows, key=runnable_since).id
+        claimed = db.session.query(Job)\
+            .filter(Job.id == job_id, or_(queued, orphaned))\
+            .update({
+                Job.status: JobStatus.RUNNING,
+                Job.locked_by: worker,
+                Job.locked_at: now,
+                Job.attempts: Job.attempts + 1
+            }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+        # Another worker got there first; try the next job
+    return None
+
+def report_progress(job: Job, progress: float, message: str) -> None:
+    """Record progress and refresh the job's lock. Commits the session."""
+    job.progress = max(0.0, min(progress, 1.0))
+    job.message = message[:256]
+    job.locked_at = datetime.now(timezone.utc)
+    db.session.commit()
+
+def run_job(job: Job) -> None:
+    """Run a claimed job and record the outcome."""
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job kind '{job.kind}'")
+        message = handler(job)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {e}")
+        job = db.session.get(Job, job.id)
+        job.error = str(e)
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            job.message = f'Failed after {job.attempts} attempts'
+            job.finished_at = datetime.now(timezone.utc)
+        else:
+            base = current_app.config.get('JOB_RETRY_DELAY', 30)
+            delay = random.uniform(base, base * 2) * 2 ** (job.attempts - 1)
+            job.status = JobStatus.QUEUED
+            job.message = f'Retrying (attempt {job.attempts + 1} of {job.max_attempts})'
+            job.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        db.session.commit()
+        return
+
+    job.status = JobStatus.SUCCEEDED
+    job.progress = 1.0
+    job.message = (message or 'Done')[:256]
+    job.error = None
+    job.locked_by = None
+    job.locked_at = None
+    job.finished_at = datetime.now(timezone.utc)
+    db.session.commit()
+
+def run_pending(worker: str, limit: Optional[int] = None) -> int:
+    """Run queued jobs until none are runnable (or limit is reached). Returns the count run."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next(worker)
+        if job is None:
+            break
+        run_job(job)
+        db.session.expunge_all()
+        count += 1
+    return count
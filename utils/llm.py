@@ -0,0 +1,207 @@
+"""Single entry point for every call to the language model provider.
+
+Each worker process keeps one long-lived backend, so HTTP keep-alive connections
+are reused across requests. Calls get the configured timeouts, and rate limits,
+timeouts and 5xx responses are retried with jittered exponential backoff.
+Setting LLM_BACKEND=fake swaps OpenAI for a deterministic offline backend for
+tests and benchmarks.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import openai
+from flask import current_app, has_app_context
+from openai import OpenAI, Timeout
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+class OpenAIBackend:
+    """Calls the OpenAI API through one long-lived client.
+
+    The client owns a keep-alive connection pool, so keeping a single instance per
+    process saves a TCP and TLS handshake on every call.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, timeout: float = 30.0, connect_timeout: float = 5.0):
+        # Retries are handled by the gateway so every call site gets the same policy
+        self.client = OpenAI(
+            api_key=api_key or os.getenv('OPENAI_API_KEY'),
+            timeout=Timeout(timeout, connect=connect_timeout),
+            max_retries=0
+        )
+
+    def chat(self, messages: List[Dict], model: str, max_tokens: Optional[int] = None) -> str:
+        response = self.client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens)
+        return response.choices[0].message.content
+
+    def stream_chat(self, messages: List[Dict], model: str, max_tokens: Optional[int] = None) -> Iterator[str]:
+        response = self.client.chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, stream=True
+        )
+        return _openai_deltas(response)
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        response = self.client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def close(self) -> None:
+        self.client.close()
+
+def _openai_deltas(response) -> Iterator[str]:
+    try:
+        for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+    finally:
+        # Closing mid-stream (client went away) drops the upstream connection too
+        response.close()
+
+
+class FakeBackend:
+    """Offline stand-in for OpenAI with deterministic output and optional latency.
+
+    Replies echo the last user message, and embeddings are unit vectors seeded from
+    a hash of the text, so equal inputs always get equal outputs. latency is added
+    once per call and token_latency once per streamed token.
+    """
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0, dimension: int = 64,
+                 reply: Optional[str] = None):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.dimension = dimension
+        self.reply = reply
+        self.calls = []  # (method, model) for every call, for assertions in tests
+
+    def chat(self, messages: List[Dict], model: str, max_tokens: Optional[int] = None) -> str:
+        self.calls.append(('chat', model))
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    def stream_chat(self, messages: List[Dict], model: str, max_tokens: Optional[int] = None) -> Iterator[str]:
+        self.calls.append(('stream_chat', model))
+        time.sleep(self.latency)
+        return self._stream(self._reply(messages))
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        self.calls.append(('embed', model))
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def close(self) -> None:
+        pass
+
+    def _reply(self, messages: List[Dict]) -> str:
+        if self.reply is not None:
+            return self.reply
+        question = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '')
+        if isinstance(question, list):  # Vision messages carry a list of parts
+            question = ' '.join(part.get('text', '') for part in question)
+        return f"What do you think happens here: {question[:200]}?"
+
+    def _stream(self, text: str) -> Iterator[str]:
+        for token in text.split(' '):
+            time.sleep(self.token_latency)
+            yield token + ' '
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _settings() -> Dict:
+    # Embedding batches run in pool threads without an app context, so fall back to Config
+    if has_app_context():
+        return current_app.config
+    return {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+
+def create_backend(settings) -> object:
+    if settings.get('LLM_BACKEND', 'openai') == 'fake':
+        return FakeBackend(latency=settings.get('LLM_FAKE_LATENCY', 0.0),
+                           token_latency=settings.get('LLM_FAKE_TOKEN_LATENCY', 0.0))
+    return OpenAIBackend(
+        timeout=settings.get('LLM_TIMEOUT', 30.0),
+        connect_timeout=settings.get('LLM_CONNECT_TIMEOUT', 5.0)
+    )
+
+def get_backend():
+    """Return this process's backend, creating it on first use (and again after a fork)."""
+    global _backend, _backend_pid
+    if _backend is not None and _backend_pid == os.getpid():
+        return _backend
+    with _backend_lock:
+        if _backend is None or _backend_pid != os.getpid():
+            _backend = create_backend(_settings())
+            _backend_pid = os.getpid()
+        return _backend
+
+def set_backend(backend) -> None:
+    """Install a backend for this process, e.g. a FakeBackend in tests. None resets to config."""
+    global _backend, _backend_pid
+    with _backend_lock:
+        _backend = backend
+        _backend_pid = os.getpid() if backend is not None else None
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after')) if response is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def with_retries(call: Callable, *args, **kwargs):
+    """Run call, retrying retryable errors with full-jitter exponential backoff."""
+    settings = _settings()
+    max_retries = settings.get('LLM_MAX_RETRIES', 3)
+    base_delay = settings.get('LLM_RETRY_BASE_DELAY', 0.5)
+    max_delay = settings.get('LLM_RETRY_MAX_DELAY', 8.0)
+
+    for attempt in range(max_retries + 1):
+        try:
+            return call(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            delay = min(delay, max_delay)
+            logger.warning(f"LLM call failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+def chat_completion(messages: List[Dict], model: str, max_tokens: Optional[int] = None) -> str:
+    """Return the model's full reply to messages."""
+    return with_retries(get_backend().chat, messages, model, max_tokens)
+
+def stream_chat_completion(messages: List[Dict], model: str, max_tokens: Optional[int] = None) -> Iterator[str]:
+    """Open a streamed reply and return an iterator of text deltas.
+
+    The request is made before this returns, so connection and rate limit errors
+    surface (after retries) here rather than part way through the stream. Close the
+    iterator to abandon the reply.
+    """
+    return with_retries(get_backend().stream_chat, messages, model, max_tokens)
+
+def embed_texts(texts: List[str], model: str) -> List[List[float]]:
+    """Embed texts in one request, returning vectors in input order."""
+    return with_retries(get_backend().embed, texts, model)
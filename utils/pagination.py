@@ -0,0 +1,27 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque, URL-safe cursor for the sort key of the last row on a page."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    """Reverse encode_cursor. Datetimes come back as ISO strings; raises ValueError if malformed."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+def page_size(requested: Optional[int], default: int, maximum: int = 100) -> int:
+    """Clamp a client-supplied page size."""
+    if not requested or requested < 1:
+        return default
+    return min(requested, maximum)
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+from flask import current_app
+from models import PromptCustomization, ReadingLevel
+from utils.adaptive_prompt import AdaptivePromptManager
+
+SOCRATIC_PROMPT = 'socratic'
+DEFAULT_BASE_PROMPT = "You are a Socratic-style tutor specializing in Python programming."
+SKILL_LEVELS = ('beginner', 'intermediate', 'advanced')
+STRUGGLING_FAILURES = 3  # AdaptivePromptManager treats more than 2 consecutive failures as struggling
+
+SOCRATIC_REMINDERS = """Remember:
+1. Always ask probing questions instead of giving direct answers
+2. Guide the student to discover the solution themselves
+3. If you have relevant knowledge base information, use it to form questions that lead the student to understand the concept
+4. Break down complex problems into smaller, manageable questions
+5. Validate student's correct thinking and gently correct misconceptions through questions"""
+
+class PromptRegistry:
+    """Compiled system prompts for every student profile variant.
+
+    The base prompt comes from the active PromptCustomization row named `name`,
+    or from the file at `path` when there is no such row. Every (skill_level,
+    reading_level, struggling) variant is compiled up front, so a turn is a dict
+    lookup. The source is checked at most every check_interval seconds and all
+    variants are recompiled when the file's mtime or the row's text changes.
+
+    Each compiled prompt is identical for every turn with the same profile, so it
+    forms a stable prefix that provider-side prompt caching can reuse; per-turn
+    context such as knowledge base matches belongs after the history.
+    """
+
+    def __init__(self, name: str, path: str, check_interval: float = 5.0):
+        self.name = name
+        self.path = path
+        self.check_interval = check_interval
+        self._source = None  # (row text, file mtime) the variants were compiled from
+        self._variants: Dict[Tuple, str] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, profile) -> str:
+        """Return the compiled prompt for a StudentProfile."""
+        self._refresh()
+        key = variant_key(profile)
+        prompt = self._variants.get(key)
+        if prompt is None:
+            # Profile values outside the known levels are compiled on first use
+            with self._lock:
+                prompt = self._variants.setdefault(key, compile_prompt(self._base_prompt, *key))
+        return prompt
+
+    def invalidate(self) -> None:
+        """Force the next get() to re-read the source."""
+        with self._lock:
+            self._checked_at = 0.0
+            self._source = None
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._source is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._source is not None and now - self._checked_at < self.check_interval:
+                return
+            source = (self._row_text(), self._file_mtime())
+            if source != self._source:
+                self._base_prompt = self._load_base(*source)
+                self._variants = {
+                    (skill, reading.value, struggling): compile_prompt(self._base_prompt, skill, reading.value, struggling)
+                    for skill in SKILL_LEVELS
+                    for reading in ReadingLevel
+                    for struggling in (False, True)
+                }
+                self._source = source
+            self._checked_at = now
+
+    def _row_text(self) -> Optional[str]:
+        row = PromptCustomization.query\
+            .filter_by(prompt_name=self.name, is_active=True)\
+            .with_entities(PromptCustomization.prompt_text)\
+            .first()
+        return row.prompt_text if row else None
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _load_base(self, row_text: Optional[str], mtime: Optional[float]) -> str:
+        if row_text is not None:
+            return row_text
+        try:
+            with open(self.path, 'r') as f:
+                return f.read()
+        except Exception as e:
+            print(f"Error loading {self.name} prompt: {str(e)}")
+            return DEFAULT_BASE_PROMPT
+
+def variant_key(profile) -> Tuple:
+    reading_level = getattr(profile.reading_level, 'value', profile.reading_level)
+    return (profile.skill_level, reading_level, (profile.consecutive_failures or 0) > 2)
+
+def compile_prompt(base_prompt: str, skill_level, reading_level, struggling: bool) -> str:
+    """Adapt base_prompt for one profile variant and append the Socratic reminders."""
+    profile = SimpleNamespace(
+        skill_level=skill_level,
+        reading_level=reading_level,
+        consecutive_failures=STRUGGLING_FAILURES if struggling else 0
+    )
+    adapted_prompt = AdaptivePromptManager(profile).generate_adaptive_prompt(base_prompt)
+    return f"{adapted_prompt}\n\n{SOCRATIC_REMINDERS}"
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_prompt_registry() -> PromptRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry(
+                    SOCRATIC_PROMPT,
+                    os.path.join(current_app.root_path, current_app.config.get('SOCRATIC_PROMPT_PATH', 'socratic_prompt.md')),
+                    check_interval=current_app.config.get('PROMPT_REFRESH_INTERVAL', 5.0)
+                )
+    return _registry
+
+def socratic_prompt(profile) -> str:
+    """The compiled Socratic system prompt for a student profile."""
+    return get_prompt_registry().get(profile)
@@ -0,0 +1,162 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import numpy as np
+from flask import current_app
+from sqlalchemy import and_, func
+from models import db, ResponseCacheEntry
+from utils.embeddings import pack_embedding, unpack_embedding
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Semantic cache of tutor replies to the opening question of a conversation.
+
+    Entries are partitioned by (model, skill_level, reading_level), so a student
+    only gets a reply written for the same kind of profile. A lookup scans the
+    newest unexpired entries of one partition and returns the stored reply whose
+    question embedding is most similar to the query, if the cosine similarity
+    reaches threshold. Entries live in the response_cache table so every worker
+    shares them; past max_entries, the least recently used are evicted, and a
+    partition keeps only its newest partition_size entries, which bounds the
+    rows a lookup loads and scores.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: int = 7 * 24 * 3600, max_entries: int = 5000,
+                 partition_size: int = 500):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.partition_size = partition_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def lookup(self, query_vector, model: str, skill_level: str, reading_level: str) -> Optional[str]:
+        """Return the cached reply for the closest matching question, or None."""
+        rows = db.session.query(ResponseCacheEntry.id, ResponseCacheEntry.vector, ResponseCacheEntry.dtype)\
+            .filter(_partition(model, skill_level, reading_level), ResponseCacheEntry.created_at >= self._cutoff())\
+            .order_by(ResponseCacheEntry.created_at.desc())\
+            .limit(self.partition_size).all()
+
+        best_id = None
+        if rows:
+            query = _unit(query_vector)
+            matrix = np.vstack([unpack_embedding(row.vector, row.dtype) for row in rows])
+            if matrix.shape[1] == query.shape[0]:
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    best_id = rows[best].id
+
+        if best_id is None:
+            self._count('misses')
+            return None
+
+        db.session.query(ResponseCacheEntry).filter_by(id=best_id).update({
+            ResponseCacheEntry.hits: ResponseCacheEntry.hits + 1,
+            ResponseCacheEntry.last_hit_at: datetime.now(timezone.utc)
+        }, synchronize_session=False)
+        response = db.session.query(ResponseCacheEntry.response).filter_by(id=best_id).scalar()
+        db.session.commit()
+        self._count('hits')
+        return response
+
+    def store(self, question: str, query_vector, response: str, model: str, skill_level: str,
+              reading_level: str) -> None:
+        """Cache a reply, then drop expired entries and evict down to partition_size and max_entries."""
+        vector, dimension, dtype = pack_embedding(_unit(query_vector), 'float32')
+        db.session.add(ResponseCacheEntry(
+            model=model,
+            skill_level=skill_level,
+            reading_level=reading_level,
+            question=question,
+            response=response,
+            dimension=dimension,
+            dtype=dtype,
+            vector=vector
+        ))
+        db.session.flush()
+
+        evicted = db.session.query(ResponseCacheEntry)\
+            .filter(ResponseCacheEntry.created_at < self._cutoff())\
+            .delete(synchronize_session=False)
+        # Oldest first, read in index order from the partition's created_at index
+        crowded_ids = [entry_id for (entry_id,) in db.session.query(ResponseCacheEntry.id)
+                       .filter(_partition(model, skill_level, reading_level))
+                       .order_by(ResponseCacheEntry.created_at.desc())
+                       .offset(self.partition_size)]
+        if crowded_ids:
+            evicted += db.session.query(ResponseCacheEntry)\
+                .filter(ResponseCacheEntry.id.in_(crowded_ids))\
+                .delete(synchronize_session=False)
+        overflow = db.session.query(func.count(ResponseCacheEntry.id)).scalar() - self.max_entries
+        if overflow > 0:
+            # Least recently used first: entries never hit count from when they were created
+            stale_ids = [entry_id for (entry_id,) in db.session.query(ResponseCacheEntry.id)
+                         .order_by(func.coalesce(ResponseCacheEntry.last_hit_at, ResponseCacheEntry.created_at))
+                         .limit(overflow)]
+            evicted += db.session.query(ResponseCacheEntry)\
+                .filter(ResponseCacheEntry.id.in_(stale_ids))\
+                .delete(synchronize_session=False)
+        db.session.commit()
+        self._count('stores')
+        self._count('evictions', evicted)
+
+    def flush(self) -> int:
+        """Delete every cached reply. Returns the number removed."""
+        removed = db.session.query(ResponseCacheEntry).delete(synchronize_session=False)
+        db.session.commit()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            counters = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+        counters['entries'] = db.session.query(func.count(ResponseCacheEntry.id)).scalar()
+        return counters
+
+    def _cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+def _partition(model: str, skill_level: str, reading_level: str):
+    return and_(ResponseCacheEntry.model == model,
+                ResponseCacheEntry.skill_level == skill_level,
+                ResponseCacheEntry.reading_level == reading_level)
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+# Per-worker instance so hit counters survive across requests
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The shared ResponseCache, or None unless RESPONSE_CACHE_ENABLED is set."""
+    global _response_cache
+    if not current_app.config.get('RESPONSE_CACHE_ENABLED', False):
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    threshold=current_app.config.get('RESPONSE_CACHE_THRESHOLD', 0.95),
+                    ttl=current_app.config.get('RESPONSE_CACHE_TTL', 7 * 24 * 3600),
+                    max_entries=current_app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 5000),
+                    partition_size=current_app.config.get('RESPONSE_CACHE_PARTITION_SIZE', 500)
+                )
+    return _response_cache
@@ -0,0 +1,178 @@
+import csv
+import io
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+from sqlalchemy import func, insert, or_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from models import db, StudentProfile, User, UserRole
+
+logger = logging.getLogger(__name__)
+
+# Columns of a roster row, in order
+ROSTER_FIELDS = ('first_name', 'last_name', 'email', 'password')
+
+# Per-process pool, created on the first import that asks for more than one worker
+_pool = None
+_pool_workers = None
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        # Spawn rather than fork: the parent holds database connections and threads
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _pool_workers = workers
+    return _pool
+
+def hash_passwords(passwords: List[str], workers: int = 1) -> List[str]:
+    """Hash passwords in order. Each hash is deliberately slow, so a batch is spread over processes."""
+    if workers <= 1 or len(passwords) < 2:
+        return [generate_password_hash(password) for password in passwords]
+    chunksize = max(len(passwords) // (workers * 4), 1)
+    return list(_get_pool(workers).map(generate_password_hash, passwords, chunksize=chunksize))
+
+@dataclass
+class RosterRow:
+    line: int
+    first_name: str
+    last_name: str
+    email: str
+    password: str
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    errors: List[Dict] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    def reject(self, line: int, email: str, error: str):
+        self.errors.append({'line': line, 'email': email, 'error': error})
+
+    def to_dict(self) -> Dict:
+        seconds = time.monotonic() - self.started
+        rows = self.created + len(self.errors)
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None
+        }
+
+def read_roster(stream, report: ImportReport) -> Iterator[RosterRow]:
+    """Decode and parse an uploaded CSV one row at a time, rejecting malformed rows.
+
+    Blank lines are skipped. A leading header row (first_name,last_name,...) is
+    accepted and skipped too.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        for row in reader:
+            line = reader.line_num
+            if not any(cell.strip() for cell in row):
+                continue
+            if line == 1 and [cell.strip().lower() for cell in row] == list(ROSTER_FIELDS):
+                continue
+            if len(row) != len(ROSTER_FIELDS):
+                report.reject(line, row[2].strip() if len(row) > 2 else '',
+                              f'Expected {len(ROSTER_FIELDS)} columns, found {len(row)}')
+                continue
+            first_name, last_name, email, password = (cell.strip() for cell in row)
+            # Emails are stored lower-cased, so accounts differing only in case are one account
+            email = email.lower()
+            if '@' not in email:
+                report.reject(line, email, 'Invalid email address')
+            elif not password:
+                report.reject(line, email, 'Password is empty')
+            else:
+                yield RosterRow(line, first_name, last_name, email, password)
+    except UnicodeDecodeError:
+        report.reject(reader.line_num + 1, '', 'File is not UTF-8 encoded; stopped reading')
+    finally:
+        # Leave the upload open for the request to close
+        text.detach()
+
+def _batches(rows: Iterable[RosterRow], size: int) -> Iterator[List[RosterRow]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+def _drop_duplicates(batch: List[RosterRow], seen: set, report: ImportReport) -> List[RosterRow]:
+    """Reject rows whose email repeats an earlier row or belongs to an existing account."""
+    emails = [row.email for row in batch]
+    # One query per batch; usernames are emails for students, so both columns count.
+    # Existing accounts may have been created with mixed-case emails
+    existing = db.session.query(User.username, User.email).filter(
+        or_(func.lower(User.email).in_(emails), func.lower(User.username).in_(emails))
+    )
+    taken = {value.lower() for names in existing for value in names}
+    fresh = []
+    for row in batch:
+        if row.email in seen:
+            report.reject(row.line, row.email, 'Duplicate email in file')
+        elif row.email in taken:
+            report.reject(row.line, row.email, 'A user with this email already exists')
+        else:
+            seen.add(row.email)
+            fresh.append(row)
+    return fresh
+
+def _insert(rows: List[Tuple[RosterRow, str]], teacher_id: int):
+    # RETURNING order is not guaranteed for a multi-row insert (and asking for it makes
+    # SQLite insert row by row); the new ids are not needed in order, only all of them
+    user_ids = db.session.scalars(insert(User).returning(User.id), [{
+        'username': row.email,
+        'email': row.email,
+        'first_name': row.first_name,
+        'last_name': row.last_name,
+        'password_hash': password_hash,
+        'role': UserRole.STUDENT
+    } for row, password_hash in rows]).all()
+    db.session.execute(insert(StudentProfile), [{
+        'user_id': user_id,
+        'teacher_id': teacher_id,
+        'daily_question_limit': 20,
+        'questions_asked_today': 0
+    } for user_id in user_ids])
+
+def import_students(stream, teacher_id: int, batch_size: int = 500, workers: int = 1) -> Dict:
+    """Create a student account and profile for each row of a roster CSV.
+
+    Rows are read, checked, hashed and inserted a batch at a time, and each batch
+    is committed on its own, so a large file never sits in memory and a bad row
+    costs only itself. Returns the per-row error report and throughput.
+    """
+    report = ImportReport()
+    seen = set()
+    for batch in _batches(read_roster(stream, report), batch_size):
+        batch = _drop_duplicates(batch, seen, report)
+        if not batch:
+            continue
+        rows = list(zip(batch, hash_passwords([row.password for row in batch], workers)))
+        try:
+            _insert(rows, teacher_id)
+            db.session.commit()
+            report.created += len(rows)
+        except IntegrityError:
+            # Someone else created one of these accounts meanwhile; find it row by row
+            db.session.rollback()
+            for row, password_hash in rows:
+                try:
+                    _insert([(row, password_hash)], teacher_id)
+                    db.session.commit()
+                    report.created += 1
+                except IntegrityError:
+                    db.session.rollback()
+                    report.reject(row.line, row.email, 'A user with this email already exists')
+    result = report.to_dict()
+    logger.info(f"Imported {result['created']} students ({result['failed']} rejected) "
+                f"in {result['seconds']}s, {result['rows_per_second']} rows/s")
+    return result
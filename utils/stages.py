@@ -0,0 +1,52 @@
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+import logging
+import threading
+import time
+from typing import Any, Callable
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Shared per-worker pool for the I/O-bound stages of a request
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('PIPELINE_WORKERS', 8),
+                    thread_name_prefix='stage'
+                )
+    return _executor
+
+def submit_stage(fn: Callable, *args, **kwargs) -> Future:
+    """Run fn on the stage pool inside an app context of its own.
+
+    The stage gets a separate database session, so it should return plain values
+    rather than ORM objects.
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                logger.debug(f"Stage {fn.__name__} took {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    return get_executor().submit(run)
+
+def stage_result(future: Future, timeout: float, default: Any, name: str) -> Any:
+    """Wait up to timeout seconds for a stage, falling back to default on timeout or error."""
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        # The stage keeps running in the background; its result is simply ignored
+        logger.warning(f"Stage {name} timed out after {timeout:.1f}s")
+    except Exception as e:
+        logger.error(f"Stage {name} failed: {e}")
+    return default
@@ -0,0 +1,33 @@
+from functools import lru_cache
+import logging
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Models whose encoding could not be loaded, with the error, so the download is not retried on every call
+_unavailable = {}
+
+@lru_cache(maxsize=None)
+def _load_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def get_encoding(model: str = "gpt-3.5-turbo"):
+    """Return the tiktoken encoding for model, built once per process.
+
+    A failed load is remembered and raised again without retrying the download.
+    """
+    if model in _unavailable:
+        raise RuntimeError(f"Tokenizer for {model} is unavailable: {_unavailable[model]}")
+    try:
+        return _load_encoding(model)
+    except Exception as e:
+        _unavailable[model] = e
+        logger.warning(f"Could not load the tokenizer for {model}: {e}")
+        raise
+
+def count_text_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Count the tokens in a plain string."""
+    return len(get_encoding(model).encode(text or "", disallowed_special=()))
@@ -0,0 +1,124 @@
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class VectorIndex:
+    """In-memory exact search over a contiguous float32 matrix of embeddings.
+
+    Rows are addressed by integer ids (e.g. knowledge chunk ids). Scoring is a
+    single matrix-vector product and the top k rows are picked with argpartition,
+    so a search never sorts the whole table.
+    """
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 64):
+        self.dim = dim
+        self._capacity = capacity
+        self._size = 0
+        self._matrix = np.empty((capacity, dim or 0), dtype=np.float32)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._rows = {}  # id -> row in self._matrix
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    def ids(self) -> np.ndarray:
+        """Return a copy of the ids currently held by the index."""
+        with self._lock:
+            return self._ids[:self._size].copy()
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return copies of the ids and their (n, dim) vectors."""
+        with self._lock:
+            return self._ids[:self._size].copy(), self._matrix[:self._size].copy()
+
+    def build(self, ids: Iterable[int], vectors) -> None:
+        """Replace the whole index with the given ids and vectors."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(ids):
+            matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+        elif matrix.ndim == 1:
+            matrix = matrix.reshape(len(ids), -1)
+        if len(ids) != matrix.shape[0]:
+            raise ValueError("ids and vectors must have the same length")
+
+        with self._lock:
+            if len(ids):
+                self.dim = matrix.shape[1]
+            self._capacity = max(len(ids), 64)
+            self._matrix = np.empty((self._capacity, self.dim or 0), dtype=np.float32)
+            self._ids = np.empty(self._capacity, dtype=np.int64)
+            self._matrix[:len(ids)] = matrix
+            self._ids[:len(ids)] = ids
+            self._size = len(ids)
+            self._rows = {int(item_id): row for row, item_id in enumerate(ids)}
+
+    def upsert(self, item_id: int, vector) -> None:
+        """Insert a vector for item_id, or overwrite it if already present."""
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+
+        with self._lock:
+            if self.dim is None or (self._size == 0 and self.dim != vector.shape[0]):
+                self.dim = vector.shape[0]
+                self._matrix = np.empty((self._capacity, self.dim), dtype=np.float32)
+            elif vector.shape[0] != self.dim:
+                raise ValueError(f"Expected a {self.dim}-dimension vector, got {vector.shape[0]}")
+
+            row = self._rows.get(item_id)
+            if row is None:
+                self._reserve(self._size + 1)
+                row = self._size
+                self._size += 1
+                self._ids[row] = item_id
+                self._rows[item_id] = row
+            self._matrix[row] = vector
+
+    def remove(self, item_id: int) -> bool:
+        """Drop item_id from the index. Returns False if it was not indexed."""
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return False
+
+            # Keep the matrix dense by moving the last row into the hole
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                moved_id = int(self._ids[last])
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._size = last
+            return True
+
+    def search(self, query, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (id, score) pairs ordered by descending dot product."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+
+        with self._lock:
+            n = self._size
+            if n == 0 or k <= 0:
+                return []
+            if query.shape[0] != self.dim:
+                raise ValueError(f"Expected a {self.dim}-dimension query, got {query.shape[0]}")
+
+            scores = self._matrix[:n] @ query
+            k = min(k, n)
+            top = np.argpartition(scores, n - k)[n - k:] if k < n else np.arange(n)
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(int(self._ids[row]), float(scores[row])) for row in top]
+
+    def _reserve(self, size: int) -> None:
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2)
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids, self._capacity = matrix, ids, capacity